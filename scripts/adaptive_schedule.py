@@ -0,0 +1,202 @@
+"""
+Schedules fetch runs around the time the site actually publishes daily usage.
+
+Every successful fetch reports the latest daily date of each user to
+PublicationHistory. When the date advances, the time of the run that saw it is
+an upper bound of the publication time; a run earlier the same day that still
+saw the old date is a lower bound. Each advance gives one estimate:
+- the middle of the interval when both bounds are known
+- otherwise the upper bound minus the retry interval, so runs that always find
+  new data are moved earlier until a run finds nothing and narrows the interval
+
+AdaptiveScheduler runs at a high quantile of the estimates plus a margin. Once
+every user has the data of the expected day, the remaining runs of the day are
+skipped; before the learned time they are postponed to it, after it a run that
+found nothing is retried every ADAPTIVE_RETRY_MINUTES until ADAPTIVE_LATEST.
+A failed run is always retried after ADAPTIVE_RETRY_MINUTES, and until a user
+has been observed the data is never taken as up to date.
+Runs are never further apart than ADAPTIVE_MAX_INTERVAL_HOURS, so the balance
+is still refreshed when no daily data is published.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import metrics
+import settings as config
+from const import DATA_DIR
+from state_cache import load_json_state, save_json_state
+from storage import normalize_day
+
+MAX_EVENTS = 60
+# users not seen for this long (removed or ignored accounts) no longer hold back the schedule
+ACTIVE_USER_DAYS = 7
+
+
+def _minute_of_day(timestamp: float) -> float:
+    moment = datetime.fromtimestamp(timestamp)
+    return moment.hour * 60 + moment.minute + moment.second / 60
+
+
+def _parse_hhmm(text: str) -> int:
+    parsed = datetime.strptime(text, "%H:%M")
+    return parsed.hour * 60 + parsed.minute
+
+
+class PublicationHistory:
+    """When the latest daily date of each user advanced, persisted in the data directory."""
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls(os.path.join(DATA_DIR, config.current().PUBLICATION_HISTORY_FILE))
+        return cls._instance
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # users: user_id -> {"date": YYYY-MM-DD, "checked_at": unix time}
+        # events: {"user_id", "date", "lower", "upper"}, oldest first
+        data = load_json_state(path, "publication history")
+        self.users = data.get("users", {})
+        self.events = data.get("events", [])
+
+    def observe(self, user_id: str, latest_date, now: float = None) -> bool:
+        """Record the latest daily date read for a user; True when it advanced."""
+        latest_date = normalize_day(latest_date)
+        if latest_date is None:
+            return False
+        now = time.time() if now is None else now
+        with self._lock:
+            previous = self.users.get(user_id)
+            self.users[user_id] = {"date": latest_date, "checked_at": now}
+            advanced = previous is not None and latest_date > previous["date"]
+            if advanced:
+                checked_at = previous["checked_at"]
+                same_day = datetime.fromtimestamp(checked_at).date() == datetime.fromtimestamp(now).date()
+                self.events.append({
+                    "user_id": user_id,
+                    "date": latest_date,
+                    "lower": checked_at if same_day else None,
+                    "upper": now,
+                })
+                del self.events[:-MAX_EVENTS]
+            self._save()
+        return advanced
+
+    def lag_days(self) -> int:
+        """Days between a daily date and the day it is published, 1 until learned."""
+        lags = [
+            (datetime.fromtimestamp(event["upper"]).date() - date.fromisoformat(event["date"])).days
+            for event in self.events
+        ]
+        return max(1, min(lags)) if lags else 1
+
+    def observed(self) -> bool:
+        """True once a successful fetch has reported the latest daily date of a user."""
+        with self._lock:
+            return bool(self.users)
+
+    def stale_users(self, today: date, now: float = None) -> list:
+        """Active users whose latest daily date is older than the one expected today."""
+        now = time.time() if now is None else now
+        expected = (today - timedelta(days=self.lag_days())).strftime("%Y-%m-%d")
+        with self._lock:
+            return [
+                user_id for user_id, state in self.users.items()
+                if state["date"] < expected and now - state["checked_at"] < ACTIVE_USER_DAYS * 86400
+            ]
+
+    def publication_minute(self, retry_minutes: float, quantile: float, min_samples: int):
+        """Estimated minute of the day the site has published, None until enough advances were seen."""
+        estimates = []
+        for event in self.events:
+            upper = _minute_of_day(event["upper"])
+            if event.get("lower") is not None:
+                estimates.append((_minute_of_day(event["lower"]) + upper) / 2)
+            else:
+                estimates.append(max(0.0, upper - retry_minutes))
+        if len(estimates) < max(1, min_samples):
+            return None
+        estimates.sort()
+        return estimates[min(len(estimates) - 1, int(quantile * len(estimates)))]
+
+    def _save(self):
+        save_json_state(self.path, {"users": self.users, "events": self.events}, "publication history")
+
+
+class AdaptiveScheduler:
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            PublicationHistory.instance(),
+            settings.JOB_START_TIME,
+            earliest=settings.ADAPTIVE_EARLIEST,
+            latest=settings.ADAPTIVE_LATEST,
+            margin_minutes=settings.ADAPTIVE_MARGIN_MINUTES,
+            retry_minutes=settings.ADAPTIVE_RETRY_MINUTES,
+            max_interval_hours=settings.ADAPTIVE_MAX_INTERVAL_HOURS,
+            min_samples=settings.ADAPTIVE_MIN_SAMPLES,
+            quantile=settings.ADAPTIVE_QUANTILE,
+        )
+
+    def __init__(self, history: PublicationHistory, default_time: str, earliest: str, latest: str,
+                 margin_minutes: float, retry_minutes: float, max_interval_hours: float,
+                 min_samples: int, quantile: float):
+        self.history = history
+        self.default_minute = _parse_hhmm(default_time)
+        self.earliest_minute = _parse_hhmm(earliest)
+        self.latest_minute = max(_parse_hhmm(latest), self.earliest_minute)
+        self.margin_minutes = margin_minutes
+        self.retry_minutes = max(1.0, retry_minutes)
+        self.max_interval = timedelta(hours=max(1.0, max_interval_hours))
+        self.min_samples = min_samples
+        self.quantile = min(1.0, max(0.0, quantile))
+        self.next_run = None
+
+    def run_minute(self) -> float:
+        """Minute of the day of the first run, JOB_START_TIME until the publication time is learned."""
+        learned = self.history.publication_minute(self.retry_minutes, self.quantile, self.min_samples)
+        if learned is None:
+            return self.default_minute
+        metrics.set_gauge("sgcc_publication_time_minutes", round(learned, 1))
+        return min(max(learned + self.margin_minutes, self.earliest_minute), self.latest_minute)
+
+    def due(self, now: datetime = None) -> bool:
+        return self.next_run is not None and (now or datetime.now()) >= self.next_run
+
+    def plan(self, now: datetime = None, failed: bool = False) -> datetime:
+        """Pick the next run after a run finished (or at startup); failed: the last run did not complete."""
+        now = now or datetime.now()
+        today = datetime.combine(now.date(), datetime.min.time())
+        run_at = today + timedelta(minutes=self.run_minute())
+        latest = today + timedelta(minutes=self.latest_minute)
+        stale = self.history.stale_users(now.date(), now.timestamp())
+        # 运行失败或还没有观察到任何户号时，无法判断数据是否已是最新
+        up_to_date = not stale and not failed and self.history.observed()
+        if failed:
+            next_run, decision = now + timedelta(minutes=self.retry_minutes), "retry"
+        elif up_to_date:
+            next_run, decision = run_at + timedelta(days=1), "skipped_day"
+        elif now < run_at:
+            next_run, decision = run_at, "postponed"
+        elif now + timedelta(minutes=self.retry_minutes) <= latest:
+            next_run, decision = now + timedelta(minutes=self.retry_minutes), "retry"
+        else:
+            next_run, decision = run_at + timedelta(days=1), "next_day"
+        if next_run - now > self.max_interval:
+            next_run, decision = now + self.max_interval, "max_interval"
+        self.next_run = next_run.replace(microsecond=0)
+        metrics.inc("sgcc_scheduled_runs_total", decision=decision)
+        metrics.set_gauge("sgcc_next_run_timestamp_seconds", self.next_run.timestamp())
+        logging.info(
+            "Next run at %s (%s), users without the expected daily data: %s.",
+            self.next_run.strftime("%Y-%m-%d %H:%M"), decision, stale or ("none" if up_to_date else "unknown"),
+        )
+        return self.next_run
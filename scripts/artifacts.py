@@ -0,0 +1,160 @@
+"""
+Bounded store for debugging artifacts (error screenshots, page source dumps).
+
+Artifacts are grouped by run id under ARTIFACT_DIR/<run id>/. The caller only
+captures the bytes (page_source, get_screenshot_as_png); compression and disk
+writes happen on a background thread:
+- HTML is gzipped
+- screenshots are downscaled to ARTIFACT_SCREENSHOT_MAX_WIDTH and stored as
+  JPEG (ARTIFACT_SCREENSHOT_FORMAT=png keeps them lossless)
+After every write, files older than ARTIFACT_MAX_AGE_DAYS are deleted, then the
+oldest files until the total is below ARTIFACT_MAX_MB; 0 disables either limit.
+"""
+
+import gzip
+import io
+import itertools
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import settings as config
+import tracing
+from const import DATA_DIR
+
+
+class ArtifactStore:
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            settings = config.current()
+            cls._instance = cls(
+                settings.ARTIFACT_DIR or os.path.join(DATA_DIR, "artifacts"),
+                max_bytes=settings.ARTIFACT_MAX_MB * 1048576,
+                max_age_seconds=settings.ARTIFACT_MAX_AGE_DAYS * 86400,
+                screenshot_format=settings.ARTIFACT_SCREENSHOT_FORMAT,
+                screenshot_max_width=settings.ARTIFACT_SCREENSHOT_MAX_WIDTH,
+            )
+        return cls._instance
+
+    def __init__(self, root: str, max_bytes: float = 50 * 1048576, max_age_seconds: float = 7 * 86400,
+                 screenshot_format: str = "jpeg", screenshot_max_width: int = 800):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.screenshot_format = screenshot_format
+        self.screenshot_max_width = screenshot_max_width
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifacts")
+        self._lock = threading.Lock()
+        # 同一秒内同名的转储不会互相覆盖
+        self._sequence = itertools.count(1)
+        os.makedirs(root, exist_ok=True)
+        self._executor.submit(self._evict)
+
+    def save_html(self, name: str, html: str) -> str:
+        """Queue a gzipped page source dump, returns the path it will be written to."""
+        stem = self._path(name)
+        self._executor.submit(self._write, stem, lambda: (gzip.compress(html.encode("utf-8"), 6), ".html.gz"))
+        return stem + ".html.gz"
+
+    def save_screenshot(self, name: str, png: bytes) -> str:
+        """
+        Queue a screenshot (PNG bytes from the driver), returns the path it will be
+        written to; it ends in .png instead when the conversion fails.
+        """
+        stem = self._path(name)
+        self._executor.submit(self._write, stem, lambda: self._convert_screenshot(png))
+        return stem + (".png" if self.screenshot_format == "png" else ".jpg")
+
+    def dump_page(self, driver, name: str):
+        """Capture driver.page_source and queue it; never raises, returns the path or None."""
+        try:
+            path = self.save_html(name, driver.page_source)
+            logging.info("Dumped page source to %s", path)
+            return path
+        except Exception as e:
+            logging.debug("Failed to dump page source %s: %s", name, e)
+            return None
+
+    def flush(self):
+        """Wait for the queued writes."""
+        self._executor.submit(lambda: None).result()
+
+    # private methods below
+
+    def _path(self, name: str) -> str:
+        """Path without the extension, which is known once the data is rendered."""
+        run_id = tracing.current_run_id() or "no-run"
+        name = re.sub(r"[^\w.-]", "_", name)
+        return os.path.join(self.root, run_id, f"{datetime.now():%H%M%S}_{next(self._sequence):04d}_{name}")
+
+    def _write(self, stem: str, render):
+        path = stem
+        try:
+            data, extension = render()
+            path = stem + extension
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        except Exception as e:
+            logging.error("Failed to write artifact %s: %s", path, e)
+            return
+        self._evict()
+
+    def _convert_screenshot(self, png: bytes):
+        """(data, extension) of the screenshot in the configured format, the original PNG on failure."""
+        try:
+            from PIL import Image
+
+            image = Image.open(io.BytesIO(png))
+            if image.width > self.screenshot_max_width:
+                height = round(image.height * self.screenshot_max_width / image.width)
+                image = image.resize((self.screenshot_max_width, height), Image.LANCZOS)
+            output = io.BytesIO()
+            if self.screenshot_format == "png":
+                image.save(output, "PNG", optimize=True)
+                return output.getvalue(), ".png"
+            image.convert("RGB").save(output, "JPEG", quality=70, optimize=True)
+            return output.getvalue(), ".jpg"
+        except Exception as e:
+            logging.debug("Screenshot conversion failed, keeping the original PNG: %s", e)
+            return png, ".png"
+
+    def _evict(self):
+        with self._lock:
+            now = time.time()
+            files = []
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for mtime, size, path in files:
+                expired = self.max_age_seconds > 0 and now - mtime > self.max_age_seconds
+                if not expired and (self.max_bytes <= 0 or total <= self.max_bytes):
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            if removed:
+                logging.info("Removed %s old debugging artifacts, %.1f MB kept.", removed, total / 1048576)
+            for entry in os.scandir(self.root):
+                if entry.is_dir() and not os.listdir(entry.path):
+                    shutil.rmtree(entry.path, ignore_errors=True)
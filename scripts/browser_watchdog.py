@@ -0,0 +1,63 @@
+"""
+Samples the resident memory of the browser process tree during a run.
+
+geckodriver and firefox are the only child processes of the daemon, so the
+watchdog sums the RSS of all descendants of this process. The fetcher checks
+`exceeded` between users and restarts the browser when the limit was hit.
+"""
+
+import logging
+import os
+import threading
+
+import metrics
+
+
+class BrowserWatchdog:
+
+    def __init__(self, limit_mb: int = 0, interval: float = 2.0):
+        self.limit_bytes = limit_mb * 1024 * 1024
+        self.interval = interval
+        self.peak_bytes = 0
+        self.current_bytes = 0
+        self.restarts = 0
+        self._exceeded = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def exceeded(self) -> bool:
+        return self._exceeded.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="browser-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+
+    def reset(self):
+        """Called after the browser has been restarted."""
+        self.restarts += 1
+        self._exceeded.clear()
+
+    def sample(self) -> int:
+        rss = metrics.tree_rss(os.getpid(), include_self=False)
+        self.current_bytes = rss
+        self.peak_bytes = max(self.peak_bytes, rss)
+        metrics.set_gauge("sgcc_browser_resident_memory_bytes", rss)
+        if self.limit_bytes and rss > self.limit_bytes and not self._exceeded.is_set():
+            logging.warning(
+                "Browser RSS %.0f MB exceeds the limit of %.0f MB, it will be restarted before the next user.",
+                rss / 1048576, self.limit_bytes / 1048576,
+            )
+            self._exceeded.set()
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
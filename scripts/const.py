@@ -1,8 +1,13 @@
 # 填写普通参数 不要填写密码等敏感信息
-# 国网电力官网
-LOGIN_URL = "https://95598.cn/osgweb/login"
-ELECTRIC_USAGE_URL = "https://95598.cn/osgweb/electricityCharge"
-BALANCE_URL = "https://95598.cn/osgweb/userAcc"
+import os
+
+# 运行时生成的文件（数据库、计时记录、性能报告等）所在目录
+DATA_DIR = "/data" if "PYTHON_IN_DOCKER" in os.environ else "."
+
+# 国网电力官网，可通过同名环境变量指向本地回放服务器（见 fake_sgcc.py）
+LOGIN_URL = os.getenv("LOGIN_URL", "https://95598.cn/osgweb/login")
+ELECTRIC_USAGE_URL = os.getenv("ELECTRIC_USAGE_URL", "https://95598.cn/osgweb/electricityCharge")
+BALANCE_URL = os.getenv("BALANCE_URL", "https://95598.cn/osgweb/userAcc")
 
 
 # Home Assistant
@@ -15,6 +20,11 @@ YEARLY_USAGE_SENSOR_NAME = "sensor.yearly_electricity_usage"
 YEARLY_CHARGE_SENSOR_NAME = "sensor.yearly_electricity_charge"
 MONTH_USAGE_SENSOR_NAME = "sensor.month_electricity_usage"
 MONTH_CHARGE_SENSOR_NAME = "sensor.month_electricity_charge"
+# 由数据库中的历史数据计算，需开启 ENABLE_DATABASE_STORAGE
+AVG_7D_USAGE_SENSOR_NAME = "sensor.avg_7d_electricity_usage"
+AVG_30D_USAGE_SENSOR_NAME = "sensor.avg_30d_electricity_usage"
+PROJECTED_MONTH_USAGE_SENSOR_NAME = "sensor.projected_month_electricity_usage"
+BALANCE_DAYS_SENSOR_NAME = "sensor.electricity_balance_days"
 BALANCE_UNIT = "CNY"
 USAGE_UNIT = "KWH"
 
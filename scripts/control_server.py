@@ -0,0 +1,113 @@
+"""
+Embedded HTTP server to observe and drive the running daemon.
+
+Routes:
+- GET  /healthz  liveness probe
+- GET  /status   JSON summary of the current and last runs
+- GET  /metrics  Prometheus metrics, see metrics.py
+- POST /run-now  queue an immediate fetch run, executed by the main loop
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+import metrics
+
+
+class ControlServer:
+
+    def __init__(self, host: str, port: int, next_run: Optional[Callable] = None):
+        self.host = host
+        self.port = port
+        self.next_run = next_run
+        self.run_now = threading.Event()
+        self.started_at = time.time()
+        self._httpd = None
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        thread = threading.Thread(target=self._httpd.serve_forever, name="control-server", daemon=True)
+        thread.start()
+        logging.info("Control server listening on http://%s:%s", self.host, self.port)
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def status(self) -> dict:
+        registry = metrics.REGISTRY
+        users = {
+            dict(labels)["user_id"]: _iso(value)
+            for labels, value in registry.samples("sgcc_last_success_timestamp_seconds").items()
+        }
+        last_runs = {
+            dict(labels)["result"]: _iso(value)
+            for labels, value in registry.samples("sgcc_last_run_timestamp_seconds").items()
+        }
+        next_run = self.next_run() if self.next_run else None
+        return {
+            "running": bool(registry.get("sgcc_run_in_progress", 0)),
+            "run_now_queued": self.run_now.is_set(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "next_run": next_run.strftime("%Y-%m-%d %H:%M:%S") if next_run else None,
+            "last_run": last_runs,
+            "last_success_by_user": users,
+            "ha_outbox_depth": int(registry.get("sgcc_ha_outbox_depth", 0)),
+        }
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _make_handler(server: ControlServer):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/healthz":
+                self._send(200, "ok\n", "text/plain")
+            elif path == "/status":
+                self._send_json(200, server.status())
+            elif path == "/metrics":
+                self._send(200, metrics.render(), "text/plain; version=0.0.4")
+            elif path == "/run-now":
+                self._send_json(405, {"error": "use POST /run-now"})
+            else:
+                self._send_json(404, {"error": f"unknown path {path}"})
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/run-now":
+                server.run_now.set()
+                logging.info("Run requested through the control server.")
+                self._send_json(202, {"queued": True, "running": server.status()["running"]})
+            else:
+                self._send_json(404, {"error": f"unknown path {path}"})
+
+        def _send_json(self, code: int, body: dict):
+            self._send(code, json.dumps(body, ensure_ascii=False) + "\n", "application/json")
+
+        def _send(self, code: int, body: str, content_type: str):
+            data = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8" if "charset" not in content_type else content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logging.debug("Control server: " + format, *args)
+
+    return Handler
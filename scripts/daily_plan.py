@@ -0,0 +1,66 @@
+"""
+Plans how much of the daily usage table has to be read for one user.
+
+The site shows the latest day (read by _get_yesterday_usage anyway) and a 7 or
+30 day table. Compared with the stored readings, the planner decides:
+- skip:  every day is stored except the latest one, which is already known
+- 7/30:  the smallest view that covers the missing days
+Days missing for longer than the largest view can never be fetched again and
+are reported as lost; days the site left empty in a fetched view are recorded
+as unavailable, so they do not force the larger view on every run. The mark
+expires after a few days (UNAVAILABLE_RECHECK_DAYS in storage.py), so a day
+the site only showed late is still fetched.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+VIEWS = (7, 30)
+
+
+class DailyFetchPlan:
+
+    def __init__(self, view, missing, lost, latest):
+        self.view = view  # None to skip the table, else 7 or 30
+        self.missing = missing  # days to fetch, YYYY-MM-DD
+        self.lost = lost  # days the site no longer provides
+        self.latest = latest
+
+    def __repr__(self):
+        return f"DailyFetchPlan(view={self.view}, missing={len(self.missing)}, lost={len(self.lost)})"
+
+
+def _days(start, end):
+    day = start
+    while day <= end:
+        yield day.strftime("%Y-%m-%d")
+        day += timedelta(days=1)
+
+
+def plan_daily_fetch(store, user_id: str, latest_date, max_view: int) -> DailyFetchPlan:
+    """latest_date: the day shown by _get_yesterday_usage, YYYY-MM-DD or None when unknown."""
+    views = [view for view in VIEWS if view <= max_view] or [max_view]
+    if latest_date is None:
+        return DailyFetchPlan(views[-1], [], [], None)
+    latest = datetime.strptime(latest_date, "%Y-%m-%d")
+    reachable_start = latest - timedelta(days=views[-1] - 1)
+    stored_latest = store.latest_date(user_id)
+    if stored_latest is None:
+        # nothing stored yet, take everything the site offers
+        return DailyFetchPlan(views[-1], list(_days(reachable_start, latest)), [], latest_date)
+
+    known = store.known_dates(user_id, reachable_start.strftime("%Y-%m-%d"), latest_date)
+    # the latest day itself comes from _get_yesterday_usage
+    missing = [day for day in _days(reachable_start, latest - timedelta(days=1)) if day not in known]
+    lost = []
+    gap_start = datetime.strptime(stored_latest, "%Y-%m-%d") + timedelta(days=1)
+    if gap_start < reachable_start:
+        lost = list(_days(gap_start, reachable_start - timedelta(days=1)))
+        logging.warning(
+            "Daily usage of %s from %s to %s (%s days) is no longer provided by the site.", user_id, lost[0], lost[-1], len(lost)
+        )
+    if not missing:
+        return DailyFetchPlan(None, [], lost, latest_date)
+    oldest = datetime.strptime(missing[0], "%Y-%m-%d")
+    view = next(view for view in views if oldest > latest - timedelta(days=view))
+    return DailyFetchPlan(view, missing, lost, latest_date)
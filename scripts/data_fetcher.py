@@ -5,32 +5,40 @@ import time
 
 import random
 import base64
-import sqlite3
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver import ActionChains
-from selenium.webdriver.edge.service import Service as EdgeService
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
 from selenium.webdriver.firefox.service import Service as FirefoxService
-from webdriver_manager.firefox import GeckoDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 from sensor_updator import SensorUpdator
 from error_watcher import ErrorWatcher
+from artifacts import ArtifactStore
+from page_recorder import PageRecorder
+from browser_watchdog import BrowserWatchdog
+import firefox_profile
+from ha_statistics import StatisticsImporter
+from storage import UserStore, normalize_day
+from daily_plan import plan_daily_fetch
+from adaptive_schedule import PublicationHistory
+from probe_cache import ProbeCache
+from pacing import Pacer
+import retention
+import metrics
+import tracing
 
 from const import *
 
-import numpy as np
-
-# import cv2
-from io import BytesIO
-from PIL import Image
-from onnx import ONNX
+# numpy / PIL / onnxruntime / sqlite3 / webdriver_manager 体积较大，
+# 只在真正用到的阶段（验证码识别、写库、Windows 驱动安装）才导入，缩短启动时间
 import platform
 
 
 def base64_to_PLI(base64_str: str):
+    from io import BytesIO
+    from PIL import Image
+
     base64_data = re.sub("^data:image/.+;base64,", "", base64_str)
     byte_data = base64.b64decode(base64_data)
     image_data = BytesIO(byte_data)
@@ -87,32 +95,57 @@ def get_transparency_location(image):
 
 
 class DataFetcher:
-    def __init__(self, username: str, password: str):
-        if "PYTHON_IN_DOCKER" not in os.environ:
-            import dotenv
-
-            dotenv.load_dotenv(verbose=True)
-        self._username = username
-        self._password = password
-        onnx_path = os.path.join(os.path.dirname(__file__), "captcha.onnx")
-        self.onnx = ONNX(onnx_path)
-
-        # 获取 ENABLE_DATABASE_STORAGE 的值，默认为 False
-        self.enable_database_storage = (
-            os.getenv("ENABLE_DATABASE_STORAGE", "false").lower() == "true"
-        )
-        self.DRIVER_IMPLICITY_WAIT_TIME = int(
-            os.getenv("DRIVER_IMPLICITY_WAIT_TIME", 20)
-        )
-        self.RETRY_TIMES_LIMIT = int(os.getenv("RETRY_TIMES_LIMIT", 5))
-        self.LOGIN_EXPECTED_TIME = int(os.getenv("LOGIN_EXPECTED_TIME", 10))
-        self.RETRY_WAIT_TIME_OFFSET_UNIT = int(
-            os.getenv("RETRY_WAIT_TIME_OFFSET_UNIT", 3)
-        )
+    def __init__(self, settings):
+        # 验证码模型在第一次登录时才加载，见 onnx 属性
+        self._onnx = None
         self.POLL_FREQUENCY = (
             0.5  # 针对树莓派平衡：既不过快占用 CPU，又能及时捕捉 UI 变化
         )
-        self.IGNORE_USER_ID = os.getenv("IGNORE_USER_ID", "xxxxx,xxxxx").split(",")
+        self.apply_settings(settings)
+        self._profile_dirs = []
+        self._statistics = None
+        # 开启数据库存储时整次运行共用一个连接，见 storage.py
+        self._store = None
+        # 设置 RECORD_DIR 时录制访问的页面，供 fake_sgcc.py 回放
+        self._recorder = None
+        # 余额和最近一天用电量都未变化时不读取年/月/日用电量，见 probe_cache.py
+        self._probe = None
+        self._page_loads_saved = 0
+        # 防风控的操作间隔，见 pacing.py
+        self._pacer = None
+
+    def apply_settings(self, settings):
+        """Take new settings, also after a reload; the browser and the captcha model are kept."""
+        self.settings = settings
+        self._username = settings.PHONE_NUMBER
+        self._password = settings.PASSWORD
+        # 获取 ENABLE_DATABASE_STORAGE 的值，默认为 False
+        self.enable_database_storage = settings.ENABLE_DATABASE_STORAGE
+        self.DRIVER_IMPLICITY_WAIT_TIME = settings.DRIVER_IMPLICITY_WAIT_TIME
+        self.RETRY_TIMES_LIMIT = settings.RETRY_TIMES_LIMIT
+        self.LOGIN_EXPECTED_TIME = settings.LOGIN_EXPECTED_TIME
+        self.RETRY_WAIT_TIME_OFFSET_UNIT = settings.RETRY_WAIT_TIME_OFFSET_UNIT
+        self.IGNORE_USER_ID = list(settings.IGNORE_USER_ID)
+        # 浏览器进程树内存上限（MB），超过后在切换下一个户号前重启浏览器，0 表示只统计不重启
+        self.BROWSER_RSS_LIMIT_MB = settings.BROWSER_RSS_LIMIT_MB
+        # 使用预先生成的 Firefox 配置模板（复制到 tmpfs），避免每次启动都重复首次运行初始化
+        self.ENABLE_PROFILE_TEMPLATE = settings.ENABLE_PROFILE_TEMPLATE
+        # 是否将历史日/月数据通过 websocket 导入 HA 长期统计
+        self.enable_statistics_import = settings.ENABLE_STATISTICS_IMPORT
+
+    @property
+    def onnx(self):
+        """延迟加载验证码识别模型，加载后常驻以便后续运行复用"""
+        if self._onnx is None:
+            from onnx import ONNX
+
+            onnx_path = os.path.join(os.path.dirname(__file__), "captcha.onnx")
+            self._onnx = ONNX(onnx_path)
+        return self._onnx
+
+    def _record(self, driver, name):
+        if self._recorder is not None:
+            self._recorder.capture(driver, name)
 
     # @staticmethod
     def _click_button(
@@ -138,6 +171,8 @@ class DataFetcher:
             driver, self.DRIVER_IMPLICITY_WAIT_TIME, self.POLL_FREQUENCY
         ).until(EC.element_to_be_clickable(click_element))
         driver.execute_script("arguments[0].click();", click_element)
+        if self._pacer is not None:
+            self._pacer.mark()
 
         return True
 
@@ -156,85 +191,34 @@ class DataFetcher:
         # time.sleep(0.2)
         ActionChains(driver).release().perform()
 
-    def connect_user_db(self, user_id):
-        """创建数据库集合，db_name = electricity_daily_usage_{user_id}
-        :param user_id: 用户ID"""
-        try:
-            # 创建数据库
-            DB_NAME = os.getenv("DB_NAME", "homeassistant.db")
-            if "PYTHON_IN_DOCKER" in os.environ:
-                DB_NAME = "/data/" + DB_NAME
-            self.connect = sqlite3.connect(DB_NAME)
-            self.connect.cursor()
-            logging.info(f"Database of {DB_NAME} created successfully.")
-            # 创建表名
-            self.table_name = f"daily{user_id}"
-            sql = f"""CREATE TABLE IF NOT EXISTS {self.table_name} (
-                    date DATE PRIMARY KEY NOT NULL, 
-                    usage REAL NOT NULL)"""
-            self.connect.execute(sql)
-            logging.info(f"Table {self.table_name} created successfully")
-
-            # 创建data表名
-            self.table_expand_name = f"data{user_id}"
-            sql = f"""CREATE TABLE IF NOT EXISTS {self.table_expand_name} (
-                    name TEXT PRIMARY KEY NOT NULL,
-                    value TEXT NOT NULL)"""
-            self.connect.execute(sql)
-            logging.info(f"Table {self.table_expand_name} created successfully")
-
-        # 如果表已存在，则不会创建
-        except sqlite3.Error as e:
-            logging.debug(f"Create db or Table error:{e}")
-            return False
-        return True
-
-    def insert_data(self, data: dict):
-        if self.connect is None:
-            logging.error("Database connection is not established.")
-            return
-        # 创建索引
-        try:
-            sql = f"INSERT OR REPLACE INTO {self.table_name} VALUES(strftime('%Y-%m-%d','{data['date']}'),{data['usage']});"
-            self.connect.execute(sql)
-            self.connect.commit()
-        except BaseException as e:
-            logging.debug(f"Data update failed: {e}")
-
-    def insert_expand_data(self, data: dict):
-        if self.connect is None:
-            logging.error("Database connection is not established.")
-            return
-        # 创建索引
-        try:
-            sql = f"INSERT OR REPLACE INTO {self.table_expand_name} VALUES('{data['name']}','{data['value']}');"
-            self.connect.execute(sql)
-            self.connect.commit()
-        except BaseException as e:
-            logging.debug(f"Data update failed: {e}")
-
+    @tracing.traced("browser_start")
     def _get_webdriver(self):
         if platform.system() == "Windows":
+            from selenium.webdriver.edge.service import Service as EdgeService
+            from webdriver_manager.microsoft import EdgeChromiumDriverManager
+
             driver = webdriver.Edge(
                 service=EdgeService(EdgeChromiumDriverManager().install())
             )
         else:
             firefox_options = webdriver.FirefoxOptions()
-            firefox_options.add_argument("--incognito")
+            # --no-sandbox / --disable-gpu / --disable-dev-shm-usage 等是 Chrome 参数，Firefox 会直接忽略，
+            # 内存相关的设置改为通过 LOW_MEMORY_FIREFOX_PREFS 实现
             firefox_options.add_argument("--headless")
-            firefox_options.add_argument("--no-sandbox")
-            firefox_options.add_argument("--disable-gpu")
-            firefox_options.add_argument("--disable-dev-shm-usage")
-            firefox_options.add_argument("--window-size=1280,720")
-            firefox_options.add_argument("--disable-software-rasterizer")
-            firefox_options.add_argument("--memory-pressure-thresholds=10,50")
-
-            # 针对树莓派优化：禁用图片加载以节省 CPU 和内存
-            firefox_options.set_preference("permissions.default.image", 2)
-            # 针对树莓派优化：禁用 Flash（如果还存在的话）
-            firefox_options.set_preference(
-                "dom.ipc.plugins.enabled.libflashplayer.so", "false"
-            )
+            firefox_options.add_argument("--width=1280")
+            firefox_options.add_argument("--height=720")
+            for name, value in firefox_profile.LOW_MEMORY_FIREFOX_PREFS.items():
+                firefox_options.set_preference(name, value)
+            if self.ENABLE_PROFILE_TEMPLATE:
+                try:
+                    profile_dir = firefox_profile.prepare_profile()
+                    # 通过 -profile 参数 geckodriver 会直接使用该目录，而不是再新建临时配置
+                    firefox_options.add_argument("-profile")
+                    firefox_options.add_argument(profile_dir)
+                    self._profile_dirs.append(profile_dir)
+                    logging.info("Using Firefox profile copied from template: %s", profile_dir)
+                except Exception as e:
+                    logging.warning("Failed to prepare Firefox profile from template, use a fresh one: %s", e)
 
             logging.info("Open Firefox.\r")
             service = FirefoxService()
@@ -247,7 +231,7 @@ class DataFetcher:
             for gd_path in geckodriver_paths:
                 if os.path.exists(gd_path):
                     service = FirefoxService(executable_path=gd_path)
-                    logging.info(f"Using geckodriver at: {gd_path}")
+                    logging.info("Using geckodriver at: %s", gd_path)
                     break
 
             driver = webdriver.Firefox(options=firefox_options, service=service)
@@ -257,27 +241,29 @@ class DataFetcher:
             driver.implicitly_wait(0)
         return driver
 
+    @tracing.traced("login")
     @ErrorWatcher.watch
     def _login(self, driver, phone_code=False):
         try:
-            logging.info(f"Open LOGIN_URL:{LOGIN_URL} ...\r")
+            logging.info("Open LOGIN_URL:%s ...\r", LOGIN_URL)
             driver.get(LOGIN_URL)
             # 等待核心元素出现
             WebDriverWait(driver, 20, self.POLL_FREQUENCY).until(
                 EC.visibility_of_element_located((By.CLASS_NAME, "user"))
             )
         except Exception as e:
-            logging.error(f"Login timeout or failed: {e}")
+            logging.error("Login timeout or failed: %s", e)
             return False
+        self._record(driver, "login")
 
         self._click_button(driver, By.CLASS_NAME, "user")
         logging.info("Click 'user' button done.\r")
-        time.sleep(1)  # 防风控：模拟人工操作间隔
+        self._pacer.pace("click")  # 防风控：模拟人工操作间隔
         # 仅仅在第一次尝试时点击切换到账号登录，后续重试应直接在原位刷新
         self._click_button(
             driver, By.XPATH, '//*[@id="login_box"]/div[1]/div[1]/div[2]/span'
         )
-        time.sleep(1)  # 防风控：模拟人工操作间隔
+        self._pacer.pace("click")
         # click agree button
         self._click_button(
             driver,
@@ -285,14 +271,14 @@ class DataFetcher:
             '//*[@id="login_box"]/div[2]/div[1]/form/div[1]/div[3]/div/span[2]',
         )
         logging.info("Click the Agree option.\r")
-        time.sleep(1)  # 防风控：模拟人工操作间隔
+        self._pacer.pace("click")
         if phone_code:
             self._click_button(
                 driver, By.XPATH, '//*[@id="login_box"]/div[1]/div[1]/div[3]/span'
             )
             input_elements = driver.find_elements(By.CLASS_NAME, "el-input__inner")
             input_elements[2].send_keys(self._username)
-            logging.info(f"input_elements username : {self._username}\r")
+            logging.info("input_elements username : %s\r", self._username)
             self._click_button(
                 driver,
                 By.XPATH,
@@ -300,7 +286,7 @@ class DataFetcher:
             )
             code = input("Input your phone verification code: ")
             input_elements[3].send_keys(code)
-            logging.info(f"input_elements verification code: {code}.\r")
+            logging.info("input_elements verification code: %s.\r", code)
             # click login button
             self._click_button(
                 driver,
@@ -315,11 +301,13 @@ class DataFetcher:
             # input username and password
             input_elements = driver.find_elements(By.CLASS_NAME, "el-input__inner")
             input_elements[0].send_keys(self._username)
-            logging.info(f"input_elements username : {self._username}\r")
-            time.sleep(0.5)  # 防风控：输入账号后短暂等待
+            self._pacer.mark()
+            logging.info("input_elements username : %s\r", self._username)
+            self._pacer.pace("type")
             input_elements[1].send_keys(self._password)
-            logging.info(f"input_elements password : {self._password}\r")
-            time.sleep(1)  # 防风控：输入密码后等待
+            self._pacer.mark()
+            logging.info("input_elements password : %s\r", "*" * len(self._password))
+            self._pacer.pace("click")
 
             # click login button
             self._click_button(driver, By.CLASS_NAME, "el-button.el-button--primary")
@@ -330,32 +318,39 @@ class DataFetcher:
                 # get canvas image
                 background_JS = 'return document.getElementById("slideVerify").childNodes[0].toDataURL("image/png");'
                 # targe_JS = 'return document.getElementsByClassName("slide-verify-block")[0].toDataURL("image/png");'
-                # get base64 image data
-                im_info = driver.execute_script(background_JS)
-                background = im_info.split(",")[1]
-                background_image = base64_to_PLI(background)
-                logging.info(f"Get electricity canvas image successfully.\r")
-                distance = self.onnx.get_distance(background_image)
-                logging.info(f"Image CaptCHA distance is {distance}.\r")
-
-                self._sliding_track(driver, round(distance * 1.06))  # 1.06是补偿
-
-                # [树莓派优化] 替换原来的 time.sleep(2)。
-                # 给足 10 秒等待后端验证和页面跳转。如果 10 秒内 URL 变了，立即返回成功；
-                # 如果 10 秒后还在老 URL，才判定为失败。
-                try:
-                    WebDriverWait(driver, 10, self.POLL_FREQUENCY).until(
-                        EC.url_changes(LOGIN_URL)
-                    )
-                    return True  # URL 变了，说明登录成功
-                except Exception:
-                    # 获取超时，说明 URL 没变，认定为验证失败
-                    pass
+                with tracing.span("captcha", attempt=retry_times):
+                    # get base64 image data
+                    im_info = driver.execute_script(background_JS)
+                    self._pacer.mark()
+                    if self._recorder is not None:
+                        self._recorder.save_captcha(im_info)
+                    background = im_info.split(",")[1]
+                    background_image = base64_to_PLI(background)
+                    logging.info("Get electricity canvas image successfully.\r")
+                    distance = self.onnx.get_distance(background_image)
+                    logging.info("Image CaptCHA distance is %s.\r", distance)
+
+                    # 识别验证码的时间计入滑动前的思考时间
+                    self._pacer.pace("slide")
+                    self._sliding_track(driver, round(distance * 1.06))  # 1.06是补偿
+
+                    # [树莓派优化] 替换原来的 time.sleep(2)。
+                    # 给足 10 秒等待后端验证和页面跳转。如果 10 秒内 URL 变了，立即返回成功；
+                    # 如果 10 秒后还在老 URL，才判定为失败。
+                    try:
+                        WebDriverWait(driver, 10, self.POLL_FREQUENCY).until(
+                            EC.url_changes(LOGIN_URL)
+                        )
+                        metrics.inc("sgcc_captcha_attempts_total", result="success")
+                        return True  # URL 变了，说明登录成功
+                    except Exception:
+                        # 获取超时，说明 URL 没变，认定为验证失败
+                        metrics.inc("sgcc_captcha_attempts_total", result="failure")
 
                 if driver.current_url == LOGIN_URL:  # if login not success
                     try:
                         logging.info(
-                            f"Sliding CAPTCHA recognition failed and reloaded.\r"
+                            "Sliding CAPTCHA recognition failed and reloaded.\r"
                         )
                         self._click_button(
                             driver, By.CLASS_NAME, "el-button.el-button--primary"
@@ -364,12 +359,12 @@ class DataFetcher:
                         continue
                     except Exception:
                         logging.debug(
-                            f"Login failed, maybe caused by invalid captcha, {self.RETRY_TIMES_LIMIT - retry_times} retry times left."
+                            "Login failed, maybe caused by invalid captcha, %s retry times left.", self.RETRY_TIMES_LIMIT - retry_times
                         )
                 else:
                     return True
             logging.error(
-                f"Login failed, maybe caused by Sliding CAPTCHA recognition failed"
+                "Login failed, maybe caused by Sliding CAPTCHA recognition failed"
             )
         return False
 
@@ -379,37 +374,107 @@ class DataFetcher:
 
     def fetch(self):
         """main logic here"""
+        with tracing.run("fetch") as run_span:
+            self._watchdog = BrowserWatchdog(self.BROWSER_RSS_LIMIT_MB).start()
+            updator = SensorUpdator(self.settings)
+            if self.enable_statistics_import:
+                self._statistics = StatisticsImporter.from_settings(self.settings)
+            if self.enable_database_storage:
+                self._store = UserStore.open(self.settings.DB_NAME)
+            self._recorder = PageRecorder.from_env()
+            self._probe = ProbeCache.from_settings(self.settings)
+            self._page_loads_saved = 0
+            self._pacer = Pacer.from_settings(self.settings)
+            try:
+                self._fetch(updator)
+            finally:
+                self._probe.save()
+                run_span.attrs["pacing_seconds"] = round(self._pacer.slept, 1)
+                metrics.set_gauge("sgcc_run_pacing_seconds", round(self._pacer.slept, 3))
+                logging.info(
+                    "Pacing slept %.1fs over %s actions, %.1fs of think time overlapped with other work.",
+                    self._pacer.slept, self._pacer.actions, self._pacer.overlapped,
+                )
+                run_span.attrs["page_loads_saved"] = self._page_loads_saved
+                metrics.set_gauge("sgcc_run_page_loads_saved", self._page_loads_saved)
+                if self._page_loads_saved:
+                    logging.info("The probe saved %s page loads in this run.", self._page_loads_saved)
+                if self._recorder is not None:
+                    self._recorder.close()
+                    self._recorder = None
+                # 等待后台推送全部完成
+                updator.close()
+                if self._statistics is not None:
+                    self._statistics.close()
+                    self._statistics = None
+                if self._store is not None:
+                    self._store.close()
+                    # 过期数据归档、压缩数据库，在后台执行，不占用抓取时间
+                    retention.start_maintenance(
+                        self._store.path, retention.RetentionPolicy.from_settings(self.settings)
+                    )
+                    self._store = None
+                # 截图和页面转储在后台压缩写入，结束前等待写完
+                ArtifactStore.instance().flush()
+                self._discard_profiles()
+                self._watchdog.stop()
+                peak_mb = round(self._watchdog.peak_bytes / 1048576, 1)
+                run_span.attrs["browser_peak_rss_mb"] = peak_mb
+                metrics.set_gauge("sgcc_browser_peak_resident_memory_bytes", self._watchdog.peak_bytes)
+                logging.info(
+                    "Browser peak RSS of this run is %s MB, restarted %s times.", peak_mb, self._watchdog.restarts
+                )
+
+    def _discard_profiles(self):
+        """删除本次运行复制到 tmpfs 的浏览器配置目录"""
+        while self._profile_dirs:
+            firefox_profile.discard_profile(self._profile_dirs.pop())
+
+    def _restart_webdriver(self, driver):
+        """浏览器内存超限时重启浏览器并重新登录，返回新的 driver"""
+        logging.info("Restarting the browser to release memory.")
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.debug("Failed to quit the old webdriver: %s", e)
+        self._discard_profiles()
+        driver = self._get_webdriver()
+        ErrorWatcher.instance().set_driver(driver)
+        self._watchdog.reset()
+        metrics.inc("sgcc_browser_restarts_total")
+        if not self._login(driver, self.settings.DEBUG_MODE):
+            driver.quit()
+            raise Exception("login unsuccessed after browser restart")
+        return driver
 
+    def _fetch(self, updator):
         driver = self._get_webdriver()
         ErrorWatcher.instance().set_driver(driver)
 
         logging.info("Webdriver initialized.")
-        updator = SensorUpdator()
 
         try:
-            if os.getenv("DEBUG_MODE", "false").lower() == "true":
-                if self._login(driver, phone_code=True):
-                    logging.info("login successed !")
-                else:
-                    logging.info("login unsuccessed !")
-                    raise Exception("login unsuccessed")
+            phone_code = self.settings.DEBUG_MODE
+            logged_in = self._login(driver, phone_code)
+            if logged_in:
+                metrics.inc("sgcc_login_total", result="success")
+                logging.info("login successed !")
             else:
-                if self._login(driver):
-                    logging.info("login successed !")
-                else:
-                    logging.info("login unsuccessed !")
-                    raise Exception("login unsuccessed")
+                metrics.inc("sgcc_login_total", result="failure")
+                logging.info("login unsuccessed !")
+                raise Exception("login unsuccessed")
         except Exception as e:
             logging.error(
-                f"Webdriver quit abnormly, reason: {e}. {self.RETRY_TIMES_LIMIT} retry times left."
+                "Webdriver quit abnormly, reason: %s. %s retry times left.", e, self.RETRY_TIMES_LIMIT
             )
             driver.quit()
-            return
+            # 交给 run_task 重试，并计入失败的运行
+            raise
 
-        logging.info(f"Login successfully on {LOGIN_URL}")
+        logging.info("Login successfully on %s", LOGIN_URL)
 
         # 登录成功后先跳转到余额页面，确保户号下拉菜单可用
-        logging.info(f"Navigating to BALANCE_URL to load user dropdown...")
+        logging.info("Navigating to BALANCE_URL to load user dropdown...")
         try:
             driver.get(BALANCE_URL)
             WebDriverWait(
@@ -417,17 +482,18 @@ class DataFetcher:
             ).until(EC.presence_of_element_located((By.CLASS_NAME, "el-dropdown")))
         except Exception as e:
             logging.warning(
-                f"Failed to navigate to BALANCE_URL: {e}, will try to get userid anyway."
+                "Failed to navigate to BALANCE_URL: %s, will try to get userid anyway.", e
             )
 
-        logging.info(f"Try to get the userid list")
+        logging.info("Try to get the userid list")
         import importlib
         import scraper_utils
 
         # Initial fetch attempt
-        user_id_list = scraper_utils.get_user_ids(
-            driver, self.DRIVER_IMPLICITY_WAIT_TIME, self.POLL_FREQUENCY
-        )
+        with tracing.span("get_user_ids"):
+            user_id_list = scraper_utils.get_user_ids(
+                driver, self.DRIVER_IMPLICITY_WAIT_TIME, self.POLL_FREQUENCY
+            )
 
         # Interactive retry loop to avoid re-login
         while not user_id_list:
@@ -462,15 +528,16 @@ class DataFetcher:
                     driver, self.DRIVER_IMPLICITY_WAIT_TIME, self.POLL_FREQUENCY
                 )
             elif choice == "d":
-                with open("debug_manual.html", "w", encoding="utf-8") as f:
-                    f.write(driver.page_source)
-                print("Saved to debug_manual.html")
+                path = ArtifactStore.instance().dump_page(driver, "debug_manual")
+                ArtifactStore.instance().flush()
+                print(f"Saved to {path}")
             elif choice == "i":
                 print("Waiting 60 seconds... you can inspect the browser if visible.")
                 time.sleep(60)
             elif choice == "q":
                 break
 
+        self._record(driver, "user_ids")
         if not user_id_list:
             logging.error("Failed to get user id list, and user chose to quit.")
             if driver:
@@ -478,10 +545,15 @@ class DataFetcher:
             return
 
         logging.info(
-            f"Here are a total of {len(user_id_list)} userids, which are {user_id_list} among which {self.IGNORE_USER_ID} will be ignored."
+            "Here are a total of %s userids, which are %s among which %s will be ignored.", len(user_id_list), user_id_list, self.IGNORE_USER_ID
         )
 
         for userid_index, user_id in enumerate(user_id_list):
+            if self._watchdog.exceeded:
+                driver = self._restart_webdriver(driver)
+            if userid_index > 0:
+                # 上一个户号写库、推送的时间计入切换户号前的间隔
+                self._pacer.pace("user")
             try:
                 # switch to electricity charge balance page
                 driver.get(BALANCE_URL)
@@ -495,6 +567,7 @@ class DataFetcher:
                     logging.warning(
                         "Main app container not found, page might handle it."
                     )
+                self._record(driver, f"balance_{userid_index}_loaded")
 
                 self._choose_current_userid(driver, userid_index)
                 time.sleep(1)  # 切换用户后的 DOM 更新缓冲
@@ -503,30 +576,31 @@ class DataFetcher:
                 # 如果获取失败，使用已知的 user_id 作为回退
                 if current_userid is None:
                     # 保存调试现场
-                    debug_file = f"debug_failed_userid_{userid_index}.html"
-                    with open(debug_file, "w", encoding="utf-8") as f:
-                        f.write(driver.page_source)
+                    debug_file = ArtifactStore.instance().dump_page(
+                        driver, f"debug_failed_userid_{userid_index}"
+                    )
                     logging.warning(
-                        f"Could not get current user ID from page, fell back to known user_id: {user_id}. Dumped page to {debug_file}"
+                        "Could not get current user ID from page, fell back to known user_id: %s. Dumped page to %s", user_id, debug_file
                     )
                     current_userid = user_id
 
                 if current_userid in self.IGNORE_USER_ID:
                     logging.info(
-                        f"The user ID {current_userid} will be ignored in user_id_list"
+                        "The user ID %s will be ignored in user_id_list", current_userid
                     )
                     continue
                 else:
                     ### get data
-                    (
-                        balance,
-                        last_daily_date,
-                        last_daily_usage,
-                        yearly_charge,
-                        yearly_usage,
-                        month_charge,
-                        month_usage,
-                    ) = self._get_all_data(driver, user_id, userid_index)
+                    with tracing.span("user_fetch", user_id=user_id):
+                        (
+                            balance,
+                            last_daily_date,
+                            last_daily_usage,
+                            yearly_charge,
+                            yearly_usage,
+                            month_charge,
+                            month_usage,
+                        ) = self._get_all_data(driver, user_id, userid_index)
                     updator.update_one_userid(
                         user_id,
                         balance,
@@ -537,29 +611,30 @@ class DataFetcher:
                         month_charge,
                         month_usage,
                     )
-
-                    time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
+                    if self._store is not None:
+                        # 由数据库中已保存的历史计算，不需要额外加载页面
+                        updator.update_derived(user_id, self._store.derived_metrics(user_id))
+                    # 记录最新日用电量日期的变化，用于学习网站发布数据的时间
+                    PublicationHistory.instance().observe(user_id, last_daily_date)
+                    metrics.inc("sgcc_user_fetch_total", user_id=user_id, result="success")
+                    metrics.set_gauge("sgcc_last_success_timestamp_seconds", time.time(), user_id=user_id)
             except Exception as e:
+                metrics.inc("sgcc_user_fetch_total", user_id=user_id, result="failure")
                 # 发生异常时保存页面源码
-                try:
-                    debug_file = f"debug_error_user_{userid_index}.html"
-                    with open(debug_file, "w", encoding="utf-8") as f:
-                        f.write(driver.page_source)
-                    logging.info(f"Dumped page source to {debug_file} due to error.")
-                except Exception:
-                    pass
+                ArtifactStore.instance().dump_page(driver, f"debug_error_user_{userid_index}")
 
                 if userid_index != len(user_id_list):
                     logging.info(
-                        f"The current user {user_id} data fetching failed {e}, the next user data will be fetched."
+                        "The current user %s data fetching failed %s, the next user data will be fetched.", user_id, e
                     )
                 else:
-                    logging.info(f"The user {user_id} data fetching failed, {e}")
+                    logging.info("The user %s data fetching failed, %s", user_id, e)
                     logging.info("Webdriver quit after fetching data successfully.")
                 continue
 
         driver.quit()
 
+    @tracing.traced("get_current_userid")
     def _get_current_userid(self, driver):
         """获取当前选中的用户户号。
 
@@ -581,7 +656,7 @@ class DataFetcher:
             # 从文本中提取用户 ID（数字部分）
             numbers = re.findall(r"[0-9]+", current_text)
             if numbers:
-                logging.debug(f"Got current user ID from select input: {numbers[-1]}")
+                logging.debug("Got current user ID from select input: %s", numbers[-1])
                 return numbers[-1]
 
             # 方案2：如果 input value 为空，尝试从页面其他位置获取
@@ -592,18 +667,19 @@ class DataFetcher:
                 # 户号通常是一串较长的数字
                 all_numbers = re.findall(r"\b\d{10,}\b", page_text)
                 if all_numbers:
-                    logging.debug(f"Got user ID from page text: {all_numbers[0]}")
+                    logging.debug("Got user ID from page text: %s", all_numbers[0])
                     return all_numbers[0]
             except Exception:
                 pass
 
-            logging.warning(f"Could not extract user ID from text: '{current_text}'")
+            logging.warning("Could not extract user ID from text: '%s'", current_text)
             return current_text if current_text else None
 
         except Exception as e:
-            logging.warning(f"Failed to get current user ID: {e}")
+            logging.warning("Failed to get current user ID: %s", e)
             return None
 
+    @tracing.traced("choose_current_userid")
     def _choose_current_userid(self, driver, userid_index):
         elements = driver.find_elements(By.CLASS_NAME, "button_confirm")
         if elements:
@@ -641,74 +717,118 @@ class DataFetcher:
             if userid_index < len(visible_items):
                 target_item = visible_items[userid_index]
                 driver.execute_script("arguments[0].click();", target_item)
-                logging.info(f"Selected user index {userid_index} from dropdown.")
+                logging.info("Selected user index %s from dropdown.", userid_index)
             else:
                 logging.warning(
-                    f"Index {userid_index} out of bounds for user list (size {len(visible_items)})."
+                    "Index %s out of bounds for user list (size %s).", userid_index, len(visible_items)
                 )
 
         except Exception as e:
             # Fallback/Error handling
             if userid_index == 0:
                 logging.warning(
-                    f"Could not select first user (index 0), possibly single user environment. Details: {e}"
+                    "Could not select first user (index 0), possibly single user environment. Details: %s", e
                 )
             else:
-                logging.error(f"Failed to select user at index {userid_index}: {e}")
+                logging.error("Failed to select user at index %s: %s", userid_index, e)
                 raise e
 
     def _get_all_data(self, driver, user_id, userid_index):
         balance = self._get_electric_balance(driver)
+        self._pacer.mark()
         if balance is None:
-            logging.info(f"Get electricity charge balance for {user_id} failed, Pass.")
+            logging.info("Get electricity charge balance for %s failed, Pass.", user_id)
         else:
             logging.info(
-                f"Get electricity charge balance for {user_id} successfully, balance is {balance} CNY."
+                "Get electricity charge balance for %s successfully, balance is %s CNY.", user_id, balance
             )
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
+        self._record(driver, f"balance_{userid_index}")
+        self._pacer.pace("page")
         # swithc to electricity usage page
         driver.get(ELECTRIC_USAGE_URL)
         # 等待页面加载完成
         WebDriverWait(
             driver, self.DRIVER_IMPLICITY_WAIT_TIME, self.POLL_FREQUENCY
         ).until(EC.presence_of_element_located((By.CLASS_NAME, "el-tabs__header")))
+        self._record(driver, f"usage_{userid_index}_loaded")
         self._choose_current_userid(driver, userid_index)
         time.sleep(1)
+        # 探测：先读取最近一天的用电量，与余额一起和上次完整读取的结果比较
+        last_daily_date, last_daily_usage = self._get_yesterday_usage(driver)
+        self._pacer.mark()
+        if last_daily_usage is None:
+            logging.error("Get daily power consumption for %s failed, pass", user_id)
+        else:
+            logging.info(
+                "Get daily power consumption for %s successfully, , %s usage is %s kwh.", user_id, last_daily_date, last_daily_usage
+            )
+        cached = None
+        if self._recorder is None:
+            cached = self._probe.unchanged(user_id, balance, last_daily_date, last_daily_usage)
+        if cached is not None:
+            # 年、月用电量两个标签页，以及完整读取时本会加载的日用电量表格
+            saved = 2 + (1 if self._daily_table_needed(user_id, last_daily_date, last_daily_usage) else 0)
+            self._page_loads_saved += saved
+            metrics.inc("sgcc_page_loads_saved_total", saved)
+            logging.info(
+                "Balance and daily usage of %s are unchanged since the last full fetch, skip the yearly, monthly and daily usage.", user_id
+            )
+            return (
+                balance,
+                last_daily_date,
+                last_daily_usage,
+                cached["yearly_charge"],
+                cached["yearly_usage"],
+                cached["month_charge"],
+                cached["month_usage"],
+            )
+
         # get data for each user id
         yearly_usage, yearly_charge = self._get_yearly_data(driver)
 
         if yearly_usage is None:
-            logging.error(f"Get year power usage for {user_id} failed, pass")
+            logging.error("Get year power usage for %s failed, pass", user_id)
         else:
             logging.info(
-                f"Get year power usage for {user_id} successfully, usage is {yearly_usage} kwh"
+                "Get year power usage for %s successfully, usage is %s kwh", user_id, yearly_usage
             )
         if yearly_charge is None:
-            logging.error(f"Get year power charge for {user_id} failed, pass")
+            logging.error("Get year power charge for %s failed, pass", user_id)
         else:
             logging.info(
-                f"Get year power charge for {user_id} successfully, yealrly charge is {yearly_charge} CNY"
+                "Get year power charge for %s successfully, yealrly charge is %s CNY", user_id, yearly_charge
             )
 
         # 按月获取数据
         month, month_usage, month_charge = self._get_month_usage(driver)
         if month is None:
-            logging.error(f"Get month power usage for {user_id} failed, pass")
+            logging.error("Get month power usage for %s failed, pass", user_id)
         else:
             for m in range(len(month)):
                 logging.info(
-                    f"Get month power charge for {user_id} successfully, {month[m]} usage is {month_usage[m]} KWh, charge is {month_charge[m]} CNY."
+                    "Get month power charge for %s successfully, %s usage is %s KWh, charge is %s CNY.", user_id, month[m], month_usage[m], month_charge[m]
                 )
-        # get yesterday usage
-        last_daily_date, last_daily_usage = self._get_yesterday_usage(driver)
-        if last_daily_usage is None:
-            logging.error(f"Get daily power consumption for {user_id} failed, pass")
-        else:
-            logging.info(
-                f"Get daily power consumption for {user_id} successfully, , {last_daily_date} usage is {last_daily_usage} kwh."
+
+        # 按天获取数据 7天/30天，写库和导入长期统计都需要
+        date, usages = [], []
+        if self._store is not None:
+            # 只读取数据库中缺少的日期
+            date, usages = self._get_missing_daily_usage(
+                driver, user_id, last_daily_date, last_daily_usage
             )
-        if month is None:
-            logging.error(f"Get month power usage for {user_id} failed, pass")
+        elif self._statistics is not None:
+            date, usages = self._get_daily_usage_data(driver) or ([], [])
+        # 以下写库、推送的时间计入切换户号前的间隔
+        self._pacer.mark()
+
+        # 将历史日/月数据导入 HA 长期统计（能源面板）
+        if self._statistics is not None:
+            try:
+                self._statistics.publish(
+                    user_id, date, usages, month, month_usage, month_charge
+                )
+            except Exception as e:
+                logging.error("Import long-term statistics for %s failed: %s", user_id, e)
 
         # 新增储存用电量
         if self.enable_database_storage:
@@ -716,8 +836,6 @@ class DataFetcher:
             logging.info(
                 "enable_database_storage is true, we will store the data to the database."
             )
-            # 按天获取数据 7天/30天
-            date, usages = self._get_daily_usage_data(driver)
             self._save_user_data(
                 user_id,
                 balance,
@@ -736,6 +854,16 @@ class DataFetcher:
                 "enable_database_storage is false, we will not store the data to the database."
             )
 
+        if self._recorder is not None:
+            # 回放页面需要完整的日用电量表格，录制时总是读取
+            days, day_usage = self._get_daily_usage_data(driver) or ([], [])
+            self._pacer.mark()
+            self._recorder.add_user(
+                user_id, balance, yearly_usage, yearly_charge,
+                month, month_usage, month_charge, days, day_usage,
+            )
+            self._record(driver, f"usage_{userid_index}")
+
         if month_charge:
             month_charge = month_charge[-1]
         else:
@@ -745,7 +873,7 @@ class DataFetcher:
         else:
             month_usage = None
 
-        return (
+        result = (
             balance,
             last_daily_date,
             last_daily_usage,
@@ -754,12 +882,14 @@ class DataFetcher:
             month_charge,
             month_usage,
         )
+        self._probe.remember(user_id, result)
+        return result
 
     def _get_user_ids(self, driver):
         for attempt in range(1, 4):
             try:
-                logging.info(f"Trying to get user IDs, attempt {attempt}...")
-                logging.info(f"Current URL: {driver.current_url}")
+                logging.info("Trying to get user IDs, attempt %s...", attempt)
+                logging.info("Current URL: %s", driver.current_url)
                 # 显式等待下拉菜单出现
                 try:
                     WebDriverWait(
@@ -768,20 +898,15 @@ class DataFetcher:
                         EC.visibility_of_element_located((By.CLASS_NAME, "el-dropdown"))
                     )
                 except Exception as wait_e:
-                    logging.warning(f"Wait for el-dropdown failed: {wait_e}")
-                    try:
-                        with open("debug_page_source.html", "w", encoding="utf-8") as f:
-                            f.write(driver.page_source)
-                        logging.info("Dumped page source to debug_page_source.html")
-                    except Exception:
-                        pass
+                    logging.warning("Wait for el-dropdown failed: %s", wait_e)
+                    ArtifactStore.instance().dump_page(driver, "debug_page_source")
                     raise wait_e
                 # click roll down button for user id
                 self._click_button(
                     driver, By.XPATH, "//div[contains(@class, 'el-dropdown')]/span"
                 )
                 logging.debug(
-                    f"""self._click_button(driver, By.XPATH, "//div[contains(@class, 'el-dropdown')]/span")"""
+                    "self._click_button(driver, By.XPATH, \"//div[contains(@class, 'el-dropdown')]/span\")"
                 )
 
                 # 等待下拉内容加载
@@ -811,11 +936,11 @@ class DataFetcher:
                 if userid_list:
                     return userid_list
                 else:
-                    logging.warning(f"Attempt {attempt}: User ID list found empty.")
+                    logging.warning("Attempt %s: User ID list found empty.", attempt)
 
             except Exception as e:
                 logging.warning(
-                    f"Webdriver exception in _get_user_ids (attempt {attempt}): {e}"
+                    "Webdriver exception in _get_user_ids (attempt %s): %s", attempt, e
                 )
 
             # 如果失败，且不是最后一次尝试，则刷新页面重试
@@ -826,11 +951,12 @@ class DataFetcher:
                     # 刷新后需要等待页面重新加载完毕
                     time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
                 except Exception as refresh_error:
-                    logging.error(f"Failed to refresh page: {refresh_error}")
+                    logging.error("Failed to refresh page: %s", refresh_error)
 
         logging.error("Failed to get user id list after 3 attempts.")
         return []
 
+    @tracing.traced("get_electric_balance")
     def _get_electric_balance(self, driver):
         try:
             # 使用包含 "您的账户余额为" 的 XPath 定位 (适应新版页面结构)
@@ -850,17 +976,13 @@ class DataFetcher:
 
         except Exception as e:
             logging.warning(
-                f"Failed to get electric balance (xpath '{xpath}' failed): {e}"
+                "Failed to get electric balance (xpath '%s' failed): %s", xpath, e
             )
             # 尝试保留现场
-            try:
-                with open("debug_balance_fail.html", "w", encoding="utf-8") as f:
-                    f.write(driver.page_source)
-                logging.info("Dumped page source to debug_balance_fail.html")
-            except Exception:
-                pass
+            ArtifactStore.instance().dump_page(driver, "debug_balance_fail")
             return None
 
+    @tracing.traced("get_yearly_data")
     def _get_yearly_data(self, driver):
         try:
             if datetime.now().month == 1:
@@ -882,7 +1004,7 @@ class DataFetcher:
                     time.sleep(1)
                 except Exception as e:
                     logging.warning(
-                        f"Failed to switch to previous year data: {e}. Continuing with current view."
+                        "Failed to switch to previous year data: %s. Continuing with current view.", e
                     )
             self._click_button(
                 driver,
@@ -894,7 +1016,7 @@ class DataFetcher:
                 driver, self.DRIVER_IMPLICITY_WAIT_TIME, self.POLL_FREQUENCY
             ).until(EC.visibility_of_element_located((By.CLASS_NAME, "total")))
         except Exception as e:
-            logging.error(f"The yearly data get failed : {e}")
+            logging.error("The yearly data get failed : %s", e)
             return None, None
 
         # get data
@@ -903,7 +1025,7 @@ class DataFetcher:
                 By.XPATH, "//ul[@class='total']/li[1]/span"
             ).text
         except Exception as e:
-            logging.error(f"The yearly_usage data get failed : {e}")
+            logging.error("The yearly_usage data get failed : %s", e)
             yearly_usage = None
 
         try:
@@ -911,11 +1033,12 @@ class DataFetcher:
                 By.XPATH, "//ul[@class='total']/li[2]/span"
             ).text
         except Exception as e:
-            logging.error(f"The yearly_charge data get failed : {e}")
+            logging.error("The yearly_charge data get failed : %s", e)
             yearly_charge = None
 
         return yearly_usage, yearly_charge
 
+    @tracing.traced("get_yesterday_usage")
     def _get_yesterday_usage(self, driver):
         """获取最近一次用电量"""
         try:
@@ -949,9 +1072,10 @@ class DataFetcher:
             last_daily_date = date_element.text  # 获取最近一次用电量的日期
             return last_daily_date, float(usage_element.text)
         except Exception as e:
-            logging.error(f"The yesterday data get failed : {e}")
-            return None
+            logging.error("The yesterday data get failed : %s", e)
+            return None, None
 
+    @tracing.traced("get_month_usage")
     def _get_month_usage(self, driver):
         """获取每月用电量"""
 
@@ -980,7 +1104,7 @@ class DataFetcher:
                     time.sleep(1)
                 except Exception as e:
                     logging.warning(
-                        f"Failed to switch to previous year for month data: {e}"
+                        "Failed to switch to previous year for month data: %s", e
                     )
             # wait for month displayed
             WebDriverWait(
@@ -992,6 +1116,8 @@ class DataFetcher:
             ).text
             month_element = month_element.split("\n")
             month_element.remove("MAX")
+            import numpy as np
+
             month_element = np.array(month_element).reshape(-1, 3)
             # 将每月的用电量保存为List
             month = []
@@ -1003,13 +1129,57 @@ class DataFetcher:
                 charge.append(month_element[i][2])
             return month, usage, charge
         except Exception as e:
-            logging.error(f"The month data get failed : {e}")
+            logging.error("The month data get failed : %s", e)
             return [], [], []
 
+    def _plan_daily(self, user_id, last_daily_date, last_daily_usage):
+        latest = normalize_day(last_daily_date) if last_daily_usage is not None else None
+        return plan_daily_fetch(
+            self._store, user_id, latest, self.settings.DATA_RETENTION_DAYS
+        )
+
+    def _daily_table_needed(self, user_id, last_daily_date, last_daily_usage):
+        """完整读取时是否会加载日用电量表格：写库时由计划决定，只导入长期统计时总是加载"""
+        if self._store is not None:
+            return self._plan_daily(user_id, last_daily_date, last_daily_usage).view is not None
+        return self._statistics is not None
+
+    def _get_missing_daily_usage(self, driver, user_id, last_daily_date, last_daily_usage):
+        """按数据库中缺少的日期选择最小的表格（7天/30天），只缺最近一天时不读取表格"""
+        plan = self._plan_daily(user_id, last_daily_date, last_daily_usage)
+        latest = plan.latest
+        metrics.inc("sgcc_daily_fetch_total", view=str(plan.view or "skipped"))
+        if plan.lost:
+            metrics.inc("sgcc_daily_days_lost_total", len(plan.lost), user_id=user_id)
+        if plan.view is None:
+            logging.info(
+                "Daily usage of %s is complete up to %s, skip the daily usage table.", user_id, latest
+            )
+            return [latest], [last_daily_usage]
+
+        logging.info(
+            "Daily usage of %s misses %s days, reading the %s days table.", user_id, len(plan.missing), plan.view
+        )
+        date, usages = self._get_daily_usage_data(driver, plan.view) or ([], [])
+        fetched = {normalize_day(day) for day in date}
+        unavailable = [day for day in plan.missing if day not in fetched]
+        if date and unavailable:
+            # 表格中应有但网站没有给出的日期，记录下来，以后不再因此读取表格
+            self._store.mark_unavailable(user_id, unavailable)
+            logging.warning(
+                "Daily usage of %s on %s is not shown by the site.", user_id, ', '.join(unavailable)
+            )
+        if latest is not None and latest not in fetched:
+            date.append(latest)
+            usages.append(last_daily_usage)
+        return date, usages
+
     # 增加获取每日用电量的函数
-    def _get_daily_usage_data(self, driver):
-        """储存指定天数的用电量"""
-        retention_days = int(os.getenv("DATA_RETENTION_DAYS", 7))  # 默认值为7天
+    @tracing.traced("get_daily_usage_data")
+    def _get_daily_usage_data(self, driver, retention_days=None):
+        """储存指定天数的用电量，retention_days 为空时按 DATA_RETENTION_DAYS"""
+        if retention_days is None:
+            retention_days = self.settings.DATA_RETENTION_DAYS  # 默认值为7天
         self._click_button(
             driver,
             By.XPATH,
@@ -1027,7 +1197,7 @@ class DataFetcher:
                 driver, By.XPATH, "//*[@id='pane-second']/div[1]/div/label[2]/span[1]"
             )
         else:
-            logging.error(f"Unsupported retention days value: {retention_days}")
+            logging.error("Unsupported retention days value: %s", retention_days)
             return
 
         # 等待用电量的数据出现
@@ -1057,9 +1227,10 @@ class DataFetcher:
                 usages.append(usage)
                 date.append(day)
             else:
-                logging.info(f"The electricity consumption of {usage} get nothing")
+                logging.info("The electricity consumption of %s get nothing", usage)
         return date, usages
 
+    @tracing.traced("save_user_data")
     def _save_user_data(
         self,
         user_id,
@@ -1074,81 +1245,23 @@ class DataFetcher:
         yearly_charge,
         yearly_usage,
     ):
-        # 连接数据库集合
-        if self.connect_user_db(user_id):
-            # 写入当前户号
-            dic = {"name": "user", "value": f"{user_id}"}
-            self.insert_expand_data(dic)
-            # 写入剩余金额
-            dic = {"name": "balance", "value": f"{balance}"}
-            self.insert_expand_data(dic)
-            # 写入最近一次更新时间
-            dic = {"name": f"daily_date", "value": f"{last_daily_date}"}
-            self.insert_expand_data(dic)
-            # 写入最近一次更新时间用电量
-            dic = {"name": f"daily_usage", "value": f"{last_daily_usage}"}
-            self.insert_expand_data(dic)
-
-            # 写入年用电量
-            dic = {"name": "yearly_usage", "value": f"{yearly_usage}"}
-            self.insert_expand_data(dic)
-            # 写入年用电电费
-            dic = {"name": "yearly_charge", "value": f"{yearly_charge} "}
-            self.insert_expand_data(dic)
-
-            if date:
-                for index in range(len(date)):
-                    dic = {"date": date[index], "usage": float(usages[index])}
-                    # 插入到数据库
-                    try:
-                        self.insert_data(dic)
-                        logging.info(
-                            f"The electricity consumption of {usages[index]}KWh on {date[index]} has been successfully deposited into the database"
-                        )
-                    except Exception as e:
-                        logging.debug(
-                            f"The electricity consumption of {date[index]} failed to save to the database, which may already exist: {str(e)}"
-                        )
-
-            if month:
-                for index in range(len(month)):
-                    try:
-                        dic = {
-                            "name": f"{month[index]}usage",
-                            "value": f"{month_usage[index]}",
-                        }
-                        self.insert_expand_data(dic)
-                        dic = {
-                            "name": f"{month[index]}charge",
-                            "value": f"{month_charge[index]}",
-                        }
-                        self.insert_expand_data(dic)
-                    except Exception as e:
-                        logging.debug(
-                            f"The electricity consumption of {month[index]} failed to save to the database, which may already exist: {str(e)}"
-                        )
-            if month_charge:
-                month_charge = month_charge[-1]
-            else:
-                month_charge = None
-
-            if month_usage:
-                month_usage = month_usage[-1]
-            else:
-                month_usage = None
-            # 写入本月电量
-            dic = {"name": f"month_usage", "value": f"{month_usage}"}
-            self.insert_expand_data(dic)
-            # 写入本月电费
-            dic = {"name": f"month_charge", "value": f"{month_charge}"}
-            self.insert_expand_data(dic)
-            # dic = {'date': month[index], 'usage': float(month_usage[index]), 'charge': float(month_charge[index])}
-            self.connect.close()
-        else:
-            logging.info(
-                "The database creation failed and the data was not written correctly."
+        account = {
+            "balance_cny": balance,
+            "last_daily_date": last_daily_date,
+            "last_daily_usage_kwh": last_daily_usage,
+            "yearly_usage_kwh": yearly_usage,
+            "yearly_charge_cny": yearly_charge,
+        }
+        # 全部数据在一个事务内写入
+        try:
+            self._store.save_user(
+                user_id,
+                zip(date or [], usages or []),
+                zip(month or [], month_usage or [], month_charge or []),
+                account,
             )
-            return
+        except Exception as e:
+            logging.error("Failed to save the data of %s to the database: %s", user_id, e)
 
 
 if __name__ == "__main__":
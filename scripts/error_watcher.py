@@ -2,12 +2,12 @@
 This script provides a wrapper to save screenshots of errors.
 """
 
-import os
 import logging
 import functools
-from datetime import datetime
 from typing import Callable, Optional
 
+from artifacts import ArtifactStore
+
 class ErrorWatcher:
 
     @classmethod
@@ -16,8 +16,7 @@ class ErrorWatcher:
         Initialize the ErrorWatcher singleton instance.
         This method should be called once before using the ErrorWatcher.
         It can take the following keyword arguments:
-        - root_dir: The root directory for saving screenshots (default is current working directory).
-        - screenshot_dir: The directory where screenshots will be saved (default is 'screenshots' in the root directory).
+        - artifacts: The ArtifactStore screenshots are saved to (default is ArtifactStore.instance()).
         - driver: The driver instance used for taking screenshots (default is None).
         """
         if cls._instance is None:
@@ -79,10 +78,7 @@ class ErrorWatcher:
     # private methods below
 
     def __init__(self, **kwargs):
-        self.root_dir = kwargs.get('root_dir', os.getcwd())
-        self.screenshot_dir = kwargs.get('screenshot_dir', os.path.join(self.root_dir, 'screenshots'))
-        if not os.path.exists(self.screenshot_dir):
-            os.makedirs(self.screenshot_dir)
+        self.artifacts = kwargs.get('artifacts') or ArtifactStore.instance()
         self.driver = kwargs.get('driver', None)
 
     _instance = None
@@ -105,14 +101,13 @@ class ErrorWatcher:
             return
 
         error_message = str(error)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        screenshot_path = os.path.join(self.screenshot_dir, f'error_{timestamp}.png')
-        
+
         try:
-            self.driver.save_screenshot(screenshot_path)
-            logging.error(f"Error occurred: {error_message}. Screenshot saved to {screenshot_path}")
+            # only the capture happens here, conversion and writing run in the background
+            screenshot_path = self.artifacts.save_screenshot('error', driver.get_screenshot_as_png())
+            logging.error("Error occurred: %s. Screenshot saved to %s", error_message, screenshot_path)
         except Exception as e:
-            logging.error(f"Failed to save screenshot: {e}")
+            logging.error("Failed to save screenshot: %s", e)
             # do not raise the exception here to avoid masking the original error
         finally:
             pass
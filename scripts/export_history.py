@@ -0,0 +1,204 @@
+"""
+Export the stored history (ENABLE_DATABASE_STORAGE) to CSV, JSON Lines or Parquet.
+
+Rows are streamed from a database cursor in primary key order, so memory use
+does not grow with the size of the history.
+
+    python3 export_history.py --format csv --output history.csv
+    python3 export_history.py --user 3100000000 --from 2024-01-01 --to 2024-12-31 --kind daily --format jsonl
+    python3 export_history.py --format parquet --output history.parquet   # needs pyarrow
+    python3 export_history.py bench --users 20 --years 5
+
+Columns: kind (daily|monthly), user_id, period (YYYY-MM-DD or YYYY-MM), usage_kwh, charge_cny.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from const import DATA_DIR
+
+COLUMNS = ("kind", "user_id", "period", "usage_kwh", "charge_cny")
+BATCH_SIZE = 5000
+
+
+def iter_rows(db, kind: str = "both", user_ids=(), date_from: str = None, date_to: str = None):
+    """Yield export rows from cursors; readings and monthly are each read in primary key order."""
+    queries = []
+    if kind in ("daily", "both"):
+        queries.append(("SELECT 'daily', user_id, date, usage_kwh, NULL FROM readings", "date", date_from, date_to))
+    if kind in ("monthly", "both"):
+        queries.append((
+            "SELECT 'monthly', user_id, month, usage_kwh, charge_cny FROM monthly", "month",
+            date_from[:7] if date_from else None, date_to[:7] if date_to else None,
+        ))
+    for select, period, start, end in queries:
+        conditions, params = [], []
+        if user_ids:
+            conditions.append(f"user_id IN ({', '.join('?' * len(user_ids))})")
+            params.extend(user_ids)
+        if start:
+            conditions.append(f"{period} >= ?")
+            params.append(start)
+        if end:
+            conditions.append(f"{period} <= ?")
+            params.append(end)
+        sql = select + (" WHERE " + " AND ".join(conditions) if conditions else "") + f" ORDER BY user_id, {period}"
+        cursor = db.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+
+def write_csv(rows, output) -> int:
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(rows, output) -> int:
+    count = 0
+    for row in rows:
+        output.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def write_parquet(rows, path: str) -> int:
+    """Write row groups of BATCH_SIZE rows, so only one batch is held in memory."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = pa.schema([
+        ("kind", pa.string()),
+        ("user_id", pa.string()),
+        ("period", pa.string()),
+        ("usage_kwh", pa.float64()),
+        ("charge_cny", pa.float64()),
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema))
+            count += len(batch)
+    return count
+
+
+def export(db_path: str, export_format: str, output: str, **filters) -> int:
+    import sqlite3
+
+    db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = iter_rows(db, **filters)
+        if export_format == "parquet":
+            if output == "-":
+                raise SystemExit("Parquet export needs --output <file>")
+            return write_parquet(rows, output)
+        writer = write_csv if export_format == "csv" else write_jsonl
+        if output == "-":
+            return writer(rows, sys.stdout)
+        with open(output, "w", encoding="utf-8", newline="") as f:
+            return writer(rows, f)
+    finally:
+        db.close()
+
+
+def _build_synthetic_db(path: str, user_count: int, years: int):
+    from storage import UserStore
+
+    store = UserStore(path)
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+    for index in range(user_count):
+        user_id = f"{3100000000 + index}"
+        days = (end - start).days
+        daily = [((start + timedelta(days=offset)).isoformat(), round(4 + (offset * 7 + index) % 13 * 0.6, 2)) for offset in range(days)]
+        months = sorted({day[:7] for day, _ in daily})
+        monthly = [(month, 250.0 + index, 130.0 + index) for month in months]
+        store.save_user(user_id, daily, monthly, {"balance_cny": 50.0})
+    store.close()
+
+
+def benchmark(user_count: int, years: int, formats):
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "history.db")
+        start = time.perf_counter()
+        _build_synthetic_db(db_path, user_count, years)
+        print(f"synthetic database: {user_count} users x {years} years, built in {time.perf_counter() - start:.1f}s, "
+              f"{os.path.getsize(db_path) / 1048576:.1f} MB")
+        print(f"{'format':>8} | {'rows':>9} | {'time [s]':>8} | {'rows/s':>9} | {'peak py mem [MB]':>16} | {'size [MB]':>9}")
+        for export_format in formats:
+            output = os.path.join(workdir, f"history.{export_format}")
+            start = time.perf_counter()
+            try:
+                count = export(db_path, export_format, output)
+            except SystemExit as e:
+                print(f"{export_format:>8} | skipped: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            # second pass only to measure the peak of Python allocations, tracing slows it down
+            tracemalloc.start()
+            export(db_path, export_format, output)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{export_format:>8} | {count:>9} | {elapsed:>8.2f} | {count / elapsed:>9.0f} | {peak / 1048576:>16.1f} | "
+                  f"{os.path.getsize(output) / 1048576:>9.1f}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        parser = argparse.ArgumentParser(description="Benchmark the history export on a synthetic database")
+        parser.add_argument("command", choices=["bench"])
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--years", type=int, default=5)
+        parser.add_argument("--formats", nargs="+", default=["csv", "jsonl", "parquet"])
+        args = parser.parse_args()
+        benchmark(args.users, args.years, args.formats)
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description="Export the stored electricity history")
+    parser.add_argument("--db", help="database path, default DB_NAME in the data directory")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], default="csv")
+    parser.add_argument("--output", default="-", help="file to write, - for stdout (not for parquet)")
+    parser.add_argument("--kind", choices=["daily", "monthly", "both"], default="both")
+    parser.add_argument("--user", action="append", default=[], help="user id, repeat for several users")
+    parser.add_argument("--from", dest="date_from", help="first day, YYYY-MM-DD (months compare by YYYY-MM)")
+    parser.add_argument("--to", dest="date_to", help="last day, YYYY-MM-DD")
+    args = parser.parse_args()
+    if args.db is None:
+        import settings as config
+
+        args.db = os.path.join(DATA_DIR, config.current().DB_NAME)
+    if not os.path.exists(args.db):
+        raise SystemExit(f"Database {args.db} not found, is ENABLE_DATABASE_STORAGE enabled?")
+    # migrate older databases first, the export reads the current schema
+    from storage import UserStore
+
+    UserStore(args.db).close()
+    count = export(args.db, args.format, args.output, kind=args.kind, user_ids=args.user,
+                   date_from=args.date_from, date_to=args.date_to)
+    print(f"Exported {count} rows.", file=sys.stderr)
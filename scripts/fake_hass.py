@@ -0,0 +1,582 @@
+"""
+Local stand-in for Home Assistant, used to benchmark and fault-test the publishers.
+
+Serves the REST state API (/api/states/<entity_id>), service calls
+(/api/services/<domain>/<service>), the websocket statistics API
+(/api/websocket: recorder/import_statistics, list_statistic_ids and
+statistics_during_period) and a PushPlus endpoint (/pushplus/send, point
+PUSHPLUS_URL at it). Every request can be delayed (latency + seeded jitter),
+answered with a 500, or have its connection reset after it was applied, so
+the response is lost although HA has the value.
+
+    python3 fake_hass.py serve --port 8123 --error-rate 0.1 --reset-rate 0.05
+    python3 fake_hass.py bench --users 1 10 50 --latency 0.02
+    python3 fake_hass.py outbox --users 3
+    python3 fake_hass.py faults --users 1 10 50
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+import settings as config
+from const import API_PATH, BALANCE_SENSOR_NAME
+from ha_websocket import OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG, encode_frame, read_frame
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SENSORS_PER_USER = 6
+
+
+class FakeHass:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, reset_rate: float = 0.0, seed: int = 0, token: str = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate  # share of requests answered with 500 before they are applied
+        self.reset_rate = reset_rate  # share of requests applied, then the connection is reset
+        self.token = token  # None accepts any token
+        self.available = True  # False answers every request with 503, like HA while restarting
+        self.states = {}
+        self.history = {}  # entity_id -> [(time, state)] of every applied update
+        self.statistics = {}  # statistic_id -> {"metadata": {...}, "stats": {start: row}}
+        self.services = []
+        self.notifications = []
+        self.requests = 0  # applied state updates
+        self.injected = {"error": 0, "reset": 0}
+        self.websocket_connections = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}/"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, name="fake-hass", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def fault(self) -> str:
+        """Wait for the configured latency and pick what happens to a request: ok, unavailable, error or reset."""
+        with self._lock:
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            draw = self._rng.random()
+        if delay:
+            time.sleep(delay)
+        if not self.available:
+            return "unavailable"
+        if draw < self.error_rate:
+            outcome = "error"
+        elif draw < self.error_rate + self.reset_rate:
+            outcome = "reset"
+        else:
+            return "ok"
+        with self._lock:
+            self.injected[outcome] += 1
+        return outcome
+
+    def record(self, entity_id: str, body: dict):
+        with self._lock:
+            self.requests += 1
+            self.states[entity_id] = body
+            self.history.setdefault(entity_id, []).append((time.time(), body.get("state")))
+
+    def websocket_command(self, message: dict):
+        """Result of one websocket command, raises KeyError for unknown commands."""
+        command = message.get("type")
+        with self._lock:
+            if command == "recorder/import_statistics":
+                metadata = message["metadata"]
+                series = self.statistics.setdefault(metadata["statistic_id"], {"metadata": metadata, "stats": {}})
+                series["metadata"] = metadata
+                for row in message.get("stats", []):
+                    series["stats"][row["start"]] = row
+                return None
+            if command == "recorder/list_statistic_ids":
+                return [series["metadata"] for series in self.statistics.values()]
+            if command == "recorder/statistics_during_period":
+                return {
+                    statistic_id: [self.statistics[statistic_id]["stats"][start] for start in sorted(self.statistics[statistic_id]["stats"])]
+                    for statistic_id in message.get("statistic_ids", []) if statistic_id in self.statistics
+                }
+        raise KeyError(command)
+
+
+def _make_handler(hass: FakeHass):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is measurable
+
+        def setup(self):
+            super().setup()
+            # headers and body are written separately, avoid the Nagle / delayed ACK stall
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.startswith(API_PATH):
+                apply = self._apply_state
+            elif self.path.startswith("/api/services/"):
+                apply = self._apply_service
+            elif self.path.startswith("/pushplus/send"):
+                apply = self._apply_pushplus
+            else:
+                self._send(404, {"message": "not found"})
+                return
+            if not self._authorized():
+                return
+            outcome = hass.fault()
+            if outcome == "unavailable":
+                self._send(503, {"message": "Home Assistant is starting"})
+            elif outcome == "error":
+                self._send(500, {"message": "injected server error"})
+            else:
+                response = apply(json.loads(body or b"{}"))
+                if outcome == "reset":
+                    self._reset()
+                else:
+                    self._send(200, response)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/api/websocket" and self.headers.get("Upgrade", "").lower() == "websocket":
+                self._websocket()
+                return
+            entity_id = self.path[len(API_PATH):]
+            if self.path.startswith(API_PATH) and entity_id in hass.states:
+                self._send(200, hass.states[entity_id])
+            else:
+                self._send(404, {"message": "Entity not found."})
+
+        def _apply_state(self, payload: dict) -> dict:
+            entity_id = self.path[len(API_PATH):]
+            hass.record(entity_id, payload)
+            return {"entity_id": entity_id, "state": str(payload.get("state")), "attributes": payload.get("attributes", {})}
+
+        def _apply_service(self, payload: dict) -> list:
+            with hass._lock:
+                hass.services.append((self.path[len("/api/services/"):], payload))
+            return []
+
+        def _apply_pushplus(self, payload: dict) -> dict:
+            with hass._lock:
+                hass.notifications.append(payload)
+            return {"code": 200, "msg": "请求成功", "data": f"{len(hass.notifications)}"}
+
+        def _authorized(self) -> bool:
+            if hass.token is None or self.path.startswith("/pushplus/"):
+                return True
+            if self.headers.get("Authorization") == "Bearer " + hass.token:
+                return True
+            self._send(401, {"message": "Invalid access token"})
+            return False
+
+        def _websocket(self):
+            accept = base64.b64encode(
+                hashlib.sha1((self.headers.get("Sec-WebSocket-Key", "") + WEBSOCKET_GUID).encode()).digest()
+            ).decode()
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.close_connection = True
+            with hass._lock:
+                hass.websocket_connections += 1
+            try:
+                self._send_ws({"type": "auth_required", "ha_version": "2024.5.0"})
+                auth = self._recv_ws()
+                if auth is None:
+                    return
+                if hass.token is not None and auth.get("access_token") != hass.token:
+                    self._send_ws({"type": "auth_invalid", "message": "Invalid access token"})
+                    return
+                self._send_ws({"type": "auth_ok", "ha_version": "2024.5.0"})
+                while True:
+                    message = self._recv_ws()
+                    if message is None:
+                        return
+                    outcome = hass.fault()
+                    if outcome == "reset":
+                        self._reset()
+                        return
+                    if outcome != "ok":
+                        self._send_ws({"id": message.get("id"), "type": "result", "success": False,
+                                       "error": {"code": "unknown_error", "message": f"injected {outcome}"}})
+                        continue
+                    try:
+                        result = hass.websocket_command(message)
+                    except KeyError:
+                        self._send_ws({"id": message.get("id"), "type": "result", "success": False,
+                                       "error": {"code": "unknown_command", "message": "Unknown command."}})
+                        continue
+                    self._send_ws({"id": message.get("id"), "type": "result", "success": True, "result": result})
+            except (ConnectionError, OSError):
+                return
+
+        def _recv_ws(self):
+            """Next JSON message from the client, None once it closed the connection."""
+            while True:
+                fin, opcode, payload = read_frame(self._recv_exact)
+                if opcode == OPCODE_CLOSE:
+                    return None
+                if opcode == OPCODE_PING:
+                    self.wfile.write(encode_frame(payload, OPCODE_PONG, mask=False))
+                    continue
+                if opcode != OPCODE_PONG:
+                    return json.loads(payload)
+
+        def _recv_exact(self, size: int) -> bytes:
+            data = self.rfile.read(size)
+            if len(data) < size:
+                raise ConnectionError("websocket client went away")
+            return data
+
+        def _send_ws(self, message: dict):
+            self.wfile.write(encode_frame(json.dumps(message, ensure_ascii=False).encode("utf-8"), mask=False))
+
+        def _reset(self):
+            # SO_LINGER 0 makes close() send a RST instead of a FIN
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+            self.close_connection = True
+
+        def _send(self, code: int, body):
+            data = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def fake_settings(**overrides) -> config.Settings:
+    """The current settings with overrides, built for a benchmark without touching the process wide settings."""
+    current = config.current()
+    values = {field.name: getattr(current, field.name) for field in config.FIELDS}
+    values.update(overrides)
+    return config.Settings(values, "fake_hass")
+
+
+def publish_users(settings, user_count: int, balance: float = 58.3, published_at: dict = None):
+    """
+    Publish all sensors of user_count fake users through SensorUpdator, return the wall time.
+    published_at, if given, receives the time each user id was handed to the publisher.
+    """
+    from sensor_updator import SensorUpdator
+
+    updator = SensorUpdator(settings)
+    start = time.monotonic()
+    for index in range(user_count):
+        user_id = f"{3100000000 + index}"
+        if published_at is not None:
+            published_at[user_id] = time.time()
+        updator.update_one_userid(user_id, balance, "2024-05-20", 7.2, 1830.5, 3012.0, 120.6, 210.0)
+    updator.close()
+    return time.monotonic() - start
+
+
+def _use_fake_hass(hass: FakeHass, **overrides):
+    """Settings pointing the publisher at the fake server, with a private cache and outbox."""
+    from outbox import Outbox
+
+    workdir = tempfile.mkdtemp()
+    settings = fake_settings(
+        HASS_URL=hass.url,
+        HASS_TOKEN=config.current().HASS_TOKEN or "benchmark",
+        # every update must reach the server, never skip unchanged states
+        HASS_FORCE_REFRESH_HOURS=0,
+        HASS_STATE_CACHE_FILE=os.path.join(workdir, "ha_state_cache.json"),
+        HASS_OUTBOX_FILE=os.path.join(workdir, "ha_outbox.db"),
+        **overrides,
+    )
+    if Outbox._instance is not None:
+        Outbox._instance.close()
+    # the publisher takes the process wide outbox, replace it with one for these settings
+    Outbox._instance = Outbox(
+        settings.HASS_OUTBOX_FILE, settings.hass_base_url, settings.HASS_TOKEN, **Outbox._options(settings)
+    )
+    return settings
+
+
+def benchmark(user_counts, latency: float, concurrency_levels):
+    logging.getLogger().setLevel(logging.WARNING)
+    hass = FakeHass(latency=latency).start()
+    print(f"fake HA latency {latency * 1000:.0f} ms per request")
+    print(f"{'users':>6} | {'concurrency':>11} | {'requests':>8} | {'total [s]':>9} | {'req/s':>8}")
+    try:
+        for user_count in user_counts:
+            for concurrency in concurrency_levels:
+                settings = _use_fake_hass(hass, HASS_PUBLISH_CONCURRENCY=concurrency)
+                before = hass.requests
+                elapsed = publish_users(settings, user_count)
+                sent = hass.requests - before
+                print(f"{user_count:>6} | {concurrency:>11} | {sent:>8} | {elapsed:>9.3f} | {sent / elapsed:>8.1f}")
+    finally:
+        hass.stop()
+
+
+def outbox_scenario(user_count: int):
+    """Publish while HA is down, publish newer values, bring HA back and wait for the outbox to drain."""
+    from outbox import Outbox
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    hass = FakeHass().start()
+    settings = _use_fake_hass(hass, HASS_OUTBOX_BACKOFF_SECONDS=0.2)
+    outbox = Outbox.instance()
+    try:
+        hass.available = False
+        publish_users(settings, user_count, balance=10.0)
+        print(f"HA down: {outbox.depth()} updates pending, {len(hass.states)} delivered")
+        publish_users(settings, user_count, balance=9.5)
+        print(f"newer values while down: {outbox.depth()} updates pending (coalesced per entity)")
+        hass.available = True
+        start = time.monotonic()
+        outbox.start_replayer(interval=0.2)
+        while outbox.depth() and time.monotonic() - start < 30:
+            time.sleep(0.05)
+        balances = {
+            entity: body["state"] for entity, body in hass.states.items()
+            if entity.startswith(BALANCE_SENSOR_NAME)
+        }
+        lag = metrics.REGISTRY.get("sgcc_ha_outbox_delivery_lag_seconds_sum", 0.0)
+        count = metrics.REGISTRY.get("sgcc_ha_outbox_delivery_lag_seconds_count", 0.0)
+        print(f"HA up: drained in {time.monotonic() - start:.2f}s, {len(hass.states)} entities delivered, "
+              f"mean delivery lag {lag / max(count, 1):.2f}s")
+        assert outbox.depth() == 0, "outbox did not drain"
+        assert len(hass.states) == user_count * SENSORS_PER_USER, "some entities were never delivered"
+        assert set(balances.values()) == {9.5}, f"stale values delivered: {balances}"
+        print("OK: every entity delivered once HA came back, with the newest value")
+    finally:
+        outbox.close()
+        Outbox._instance = None
+        hass.stop()
+
+
+FAULT_SCENARIOS = [
+    ("clean", {}),
+    ("latency", {"latency": 0.02, "jitter": 0.08}),
+    ("5xx 20%", {"error_rate": 0.2}),
+    ("reset 10%", {"reset_rate": 0.1}),
+    ("mixed", {"latency": 0.01, "jitter": 0.04, "error_rate": 0.1, "reset_rate": 0.05}),
+]
+
+
+def _percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] if ordered else 0.0
+
+
+def _states_under_faults(hass: FakeHass, user_count: int, rounds: int, drain_timeout: float):
+    """Publish rounds of decreasing balances, drain the outbox and check what HA ended up with."""
+    from outbox import Outbox
+
+    settings = _use_fake_hass(
+        hass, HASS_OUTBOX_BACKOFF_SECONDS=0.02, HASS_OUTBOX_BACKOFF_MAX_SECONDS=0.5, HASS_READ_TIMEOUT=5
+    )
+    outbox = Outbox.instance()
+    confirmed_before = metrics.REGISTRY.get("sgcc_ha_push_total", 0.0, result="success")
+    latencies = []
+    start = time.monotonic()
+    try:
+        for round_index in range(rounds):
+            published_at = {}
+            round_start = time.time()
+            publish_users(settings, user_count, balance=50.0 - round_index, published_at=published_at)
+            deadline = time.monotonic() + drain_timeout
+            while outbox.depth() and time.monotonic() < deadline:
+                outbox.replay()
+                time.sleep(0.01)
+            # latency of an entity: from handing its user to the publisher until HA first applied it in this round
+            for entity_id, history in hass.history.items():
+                user_id = f"310000{entity_id[-4:]}"
+                if user_id in published_at:
+                    applied = [at for at, _ in history if at >= round_start]
+                    if applied:
+                        latencies.append(applied[0] - published_at[user_id])
+        wall = time.monotonic() - start
+        pending = outbox.depth()
+    finally:
+        outbox.close()
+        Outbox._instance = None
+
+    final_balance = 50.0 - (rounds - 1)
+    expected = user_count * SENSORS_PER_USER
+    balances = [body["state"] for entity, body in hass.states.items() if entity.startswith(BALANCE_SENSOR_NAME)]
+    confirmed = metrics.REGISTRY.get("sgcc_ha_push_total", 0.0, result="success") - confirmed_before
+    return {
+        "applied": hass.requests,
+        "wall": wall,
+        "latencies": latencies,
+        "lost": expected - len(hass.states),
+        "pending": pending,
+        "stale": sum(1 for balance in balances if balance != final_balance),
+        # applied by HA but not confirmed to the client (reset after apply), sent again later
+        "duplicates": int(hass.requests - confirmed),
+    }
+
+
+def _statistics_under_faults(hass: FakeHass, user_count: int, max_runs: int):
+    """Import 30 days and 12 months per user, one importer per simulated run, until every series is complete."""
+    from ha_statistics import StatisticsImporter
+
+    state_path = os.path.join(tempfile.mkdtemp(), "ha_statistics_state.json")
+    today = time.time()
+    dates = [time.strftime("%Y-%m-%d", time.localtime(today - 86400 * offset)) for offset in range(30, 0, -1)]
+    months = [f"2023-{month:02d}" for month in range(1, 13)]
+    start = time.monotonic()
+    runs = failures = 0
+    for runs in range(1, max_runs + 1):
+        importer = StatisticsImporter(hass.url.rstrip("/"), "benchmark", state_path)
+        for index in range(user_count):
+            try:
+                importer.publish(
+                    f"{3100000000 + index}", dates, [f"{5 + index % 7 * 0.5:.1f}"] * len(dates),
+                    months, ["300"] * 12, ["150"] * 12,
+                )
+            except Exception:
+                failures += 1
+        importer.close()
+        complete = sum(
+            1 for series in hass.statistics.values()
+            if len(series["stats"]) == (len(dates) if ":daily" in series["metadata"]["statistic_id"] else len(months))
+        )
+        if complete == user_count * 3:
+            break
+    wall = time.monotonic() - start
+    wrong_sums = 0
+    for series in hass.statistics.values():
+        rows = [series["stats"][start] for start in sorted(series["stats"])]
+        total = 0.0
+        for row in rows:
+            total = round(total + row["state"], 3)
+            wrong_sums += row["sum"] != total
+    rows = sum(len(series["stats"]) for series in hass.statistics.values())
+    return {"runs": runs, "failures": failures, "complete": complete, "rows": rows, "wall": wall, "wrong_sums": wrong_sums}
+
+
+def _notifications_under_faults(hass: FakeHass, user_count: int, max_runs: int):
+    """Low balances for every user; count the runs until PushPlus accepted the message and the messages it received."""
+    from notifier import BalanceNotifier, PushPlusChannel
+
+    state_path = os.path.join(tempfile.mkdtemp(), "balance_notify_state.json")
+    for runs in range(1, max_runs + 1):
+        notifier = BalanceNotifier(
+            [PushPlusChannel(["benchmark"], url=hass.url + "pushplus/send")], 10.0, state_path, timeout=(2, 5)
+        )
+        for index in range(user_count):
+            notifier.check(f"{3100000000 + index}", 5.0)
+        future = notifier.send()
+        if future is None or future.result():
+            return runs, len(hass.notifications)
+    return None, len(hass.notifications)
+
+
+def fault_suite(user_counts, rounds: int, seed: int):
+    """Throughput, tail latency and delivery guarantees of states, statistics and notifications under injected faults."""
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    print(f"states: {rounds} rounds of decreasing balances per scenario, outbox drained after each round")
+    print(f"{'scenario':>10} | {'users':>5} | {'applied':>7} | {'wall [s]':>8} | {'applied/s':>9} | "
+          f"{'p50 [ms]':>8} | {'p95 [ms]':>8} | {'p99 [ms]':>8} | {'max [ms]':>8} | {'lost':>4} | {'stale':>5} | {'dup':>4}")
+    failed = []
+    for name, faults in FAULT_SCENARIOS:
+        for user_count in user_counts:
+            hass = FakeHass(seed=seed, **faults).start()
+            try:
+                result = _states_under_faults(hass, user_count, rounds, drain_timeout=60)
+            finally:
+                hass.stop()
+            latencies = [value * 1000 for value in result["latencies"]]
+            print(f"{name:>10} | {user_count:>5} | {result['applied']:>7} | {result['wall']:>8.2f} | "
+                  f"{result['applied'] / result['wall']:>9.1f} | {_percentile(latencies, 0.5):>8.0f} | "
+                  f"{_percentile(latencies, 0.95):>8.0f} | {_percentile(latencies, 0.99):>8.0f} | "
+                  f"{max(latencies, default=0):>8.0f} | {result['lost']:>4} | {result['stale']:>5} | {result['duplicates']:>4}")
+            if result["lost"] or result["stale"] or result["pending"]:
+                failed.append(f"states {name} / {user_count} users")
+
+    print("\nstatistics over the websocket API: one importer per run until every series is complete")
+    print(f"{'scenario':>10} | {'users':>5} | {'runs':>4} | {'failed users':>12} | {'rows':>6} | {'wall [s]':>8} | {'rows/s':>8} | {'wrong sums':>10}")
+    for name, faults in FAULT_SCENARIOS:
+        for user_count in user_counts:
+            hass = FakeHass(seed=seed, **faults).start()
+            try:
+                result = _statistics_under_faults(hass, user_count, max_runs=20)
+            finally:
+                hass.stop()
+            print(f"{name:>10} | {user_count:>5} | {result['runs']:>4} | {result['failures']:>12} | {result['rows']:>6} | "
+                  f"{result['wall']:>8.2f} | {result['rows'] / result['wall']:>8.0f} | {result['wrong_sums']:>10}")
+            if result["complete"] != user_count * 3 or result["wrong_sums"]:
+                failed.append(f"statistics {name} / {user_count} users")
+
+    print("\nlow-balance notification over PushPlus: runs until delivered, messages received")
+    print(f"{'scenario':>10} | {'users':>5} | {'runs':>4} | {'messages':>8}")
+    for name, faults in FAULT_SCENARIOS:
+        hass = FakeHass(seed=seed, **faults).start()
+        try:
+            runs, messages = _notifications_under_faults(hass, max(user_counts), max_runs=20)
+        finally:
+            hass.stop()
+        print(f"{name:>10} | {max(user_counts):>5} | {runs or '-':>4} | {messages:>8}")
+        if runs is None:
+            failed.append(f"notification {name}")
+
+    if failed:
+        raise SystemExit("delivery guarantee violated: " + ", ".join(failed))
+    print("\nOK: nothing lost or stale, every statistic complete with consistent sums, every notification delivered")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Home Assistant REST and websocket API")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="run the fake server in the foreground")
+    serve_parser.add_argument("--port", type=int, default=8123)
+    serve_parser.add_argument("--latency", type=float, default=0.0)
+    serve_parser.add_argument("--jitter", type=float, default=0.0)
+    serve_parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    serve_parser.add_argument("--reset-rate", type=float, default=0.0, help="share of requests applied, then reset")
+    serve_parser.add_argument("--seed", type=int, default=0)
+    bench_parser = subparsers.add_parser("bench", help="benchmark SensorUpdator against the fake server")
+    bench_parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50])
+    bench_parser.add_argument("--latency", type=float, default=0.02)
+    bench_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    outbox_parser = subparsers.add_parser("outbox", help="check outbox delivery while the fake server goes down and up")
+    outbox_parser.add_argument("--users", type=int, default=3)
+    faults_parser = subparsers.add_parser("faults", help="throughput, tail latency and delivery guarantees under injected faults")
+    faults_parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50])
+    faults_parser.add_argument("--rounds", type=int, default=2)
+    faults_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "serve":
+        hass = FakeHass(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        reset_rate=args.reset_rate, seed=args.seed).start()
+        print(f"Fake Home Assistant listening on {hass.url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            hass.stop()
+    elif args.command == "outbox":
+        outbox_scenario(args.users)
+    elif args.command == "faults":
+        fault_suite(args.users, args.rounds, args.seed)
+    else:
+        benchmark(args.users, args.latency, args.concurrency)
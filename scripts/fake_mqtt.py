@@ -0,0 +1,144 @@
+"""
+In-process stand-in for an MQTT broker, used to check the MQTT publisher
+without Mosquitto. Keeps retained messages and counts connections.
+
+    python3 fake_mqtt.py serve --port 1883
+    python3 fake_mqtt.py check --users 3
+"""
+
+import argparse
+import json
+import logging
+import os
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+
+from mqtt_client import CONNACK, CONNECT, DISCONNECT, PINGREQ, PINGRESP, PUBACK, PUBLISH, packet, read_packet
+
+
+class FakeBroker:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.retained = {}
+        self.connections = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="fake-mqtt", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record(self, topic: str, payload: bytes, retain: bool):
+        with self._lock:
+            self.messages += 1
+            if retain:
+                self.retained[topic] = payload
+
+
+def _make_handler(broker: FakeBroker):
+
+    class Handler(socketserver.BaseRequestHandler):
+
+        def handle(self):
+            while True:
+                try:
+                    first, body = read_packet(self._recv_exact)
+                except (ConnectionError, IndexError):
+                    return
+                kind = first & 0xF0
+                if kind == CONNECT:
+                    with broker._lock:
+                        broker.connections += 1
+                    self.request.sendall(packet(CONNACK, b"\x00\x00"))
+                elif kind == PUBLISH:
+                    qos = (first >> 1) & 0x03
+                    topic_length = struct.unpack("!H", body[:2])[0]
+                    topic = body[2:2 + topic_length].decode("utf-8")
+                    offset = 2 + topic_length
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                    broker.record(topic, body[offset:], bool(first & 0x01))
+                    if qos:
+                        self.request.sendall(packet(PUBACK, packet_id))
+                elif kind == PINGREQ:
+                    self.request.sendall(packet(PINGRESP))
+                elif kind == DISCONNECT:
+                    return
+
+        def _recv_exact(self, size: int) -> bytes:
+            data = b""
+            while len(data) < size:
+                chunk = self.request.recv(size - len(data))
+                if not chunk:
+                    raise ConnectionError("client closed the connection")
+                data += chunk
+            return data
+
+    return Handler
+
+
+def check(user_count: int):
+    """Publish user_count users twice over the MQTT backend and verify the retained topics."""
+    from fake_hass import fake_settings, publish_users
+
+    logging.getLogger().setLevel(logging.WARNING)
+    broker = FakeBroker().start()
+    workdir = tempfile.mkdtemp()
+    settings = fake_settings(
+        HASS_PUBLISHER="mqtt",
+        MQTT_HOST=broker.host,
+        MQTT_PORT=broker.port,
+        HASS_STATE_CACHE_FILE=os.path.join(workdir, "ha_state_cache.json"),
+    )
+    try:
+        elapsed = publish_users(settings, user_count)
+        configs = [topic for topic in broker.retained if topic.endswith("/config")]
+        states = [topic for topic in broker.retained if topic.endswith("/state")]
+        print(f"first run: {broker.messages} messages over {broker.connections} connection(s) in {elapsed:.3f}s, "
+              f"{len(configs)} discovery configs, {len(states)} retained states")
+        assert broker.connections == 1, "all users must share one connection"
+        assert len(configs) == len(states) == user_count * 6
+        config = json.loads(broker.retained[configs[0]])
+        assert config["state_topic"] in broker.retained
+
+        before = broker.messages
+        publish_users(settings, user_count, balance=12.5)
+        # only the balances changed, the discovery configs were announced already
+        print(f"second run: {broker.messages - before} messages over {broker.connections - 1} connection(s)")
+        assert broker.messages - before == user_count * 2
+        balance = broker.retained["sgcc_electricity/electricity_charge_balance_0000/state"]
+        assert balance == b"12.5", balance
+        print("OK: discovery configs announced once, states retained, one connection per run")
+    finally:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake MQTT broker")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="run the fake broker in the foreground")
+    serve_parser.add_argument("--port", type=int, default=1883)
+    check_parser = subparsers.add_parser("check", help="check the MQTT publisher against the fake broker")
+    check_parser.add_argument("--users", type=int, default=3)
+    args = parser.parse_args()
+    if args.command == "serve":
+        broker = FakeBroker(port=args.port).start()
+        print(f"Fake MQTT broker listening on {broker.host}:{broker.port}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            broker.stop()
+    else:
+        check(args.users)
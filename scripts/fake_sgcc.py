@@ -0,0 +1,614 @@
+"""
+Local stand-in for the 95598.cn login, balance and electricity charge pages, so
+DataFetcher can be run and measured without the live site.
+
+    python3 fake_sgcc.py serve --port 8300 --users 3 --latency 0.05
+    python3 fake_sgcc.py serve --recording recordings/20240520
+    python3 fake_sgcc.py bench --users 3 --runs 2 --latency 0.05 --jitter 0.05
+    python3 fake_sgcc.py record --dir recordings/20240520   # one fetch from the live site, see page_recorder.py
+
+The pages rebuild the DOM the scraper relies on (same classes, ids and XPath
+positions) and load their data through XHR from /replay/api, with a loading
+mask while a request is pending, like the Element UI pages of the site. The
+data comes from a recording (recording.json) or is generated. The slide
+captcha is a canned canvas: any drag passes unless --captcha-tolerance is set,
+and the first --captcha-failures attempts are rejected to exercise the retry.
+
+Every request is delayed by --latency plus a uniform --jitter drawn from a
+seeded generator, so runs with the same seed see the same delays. Point the
+fetcher at the server with LOGIN_URL, BALANCE_URL and ELECTRIC_USAGE_URL.
+
+bench runs complete fetches (browser, captcha model, all users) in a child
+process against the fake site and a fake Home Assistant, and reports the wall
+time of every phase from the run's timing tree.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LOGIN_PATH = "/osgweb/login"
+BALANCE_PATH = "/osgweb/userAcc"
+USAGE_PATH = "/osgweb/electricityCharge"
+SESSION_COOKIE = "replay_session"
+
+COMMON_JS = """
+const API = "/replay/api/";
+let pending = 0;
+function mask(delta) {
+  pending += delta;
+  document.querySelector(".el-loading-mask").style.display = pending > 0 ? "block" : "none";
+}
+function api(path, body) {
+  mask(1);
+  const init = body ? {method: "POST", headers: {"Content-Type": "application/json"}, body: JSON.stringify(body)} : {};
+  return fetch(API + path, init).then((res) => res.json()).finally(() => mask(-1));
+}
+function currentUser() {
+  return Number(sessionStorage.getItem("replayUser") || 0);
+}
+function setupSelect(onChange) {
+  return api("users").then((users) => {
+    const input = document.querySelector(".el-select .el-input__inner");
+    const dropdown = document.querySelector(".el-select-dropdown");
+    const list = dropdown.querySelector(".el-select-dropdown__list");
+    const select = (index) => {
+      sessionStorage.setItem("replayUser", index);
+      input.value = users[index].label;
+      const id = document.querySelector("#current-id");
+      if (id) id.textContent = " " + users[index].user_id + " ";
+      onChange(index);
+    };
+    users.forEach((user, index) => {
+      const item = document.createElement("li");
+      item.className = "el-select-dropdown__item";
+      item.textContent = user.label;
+      item.addEventListener("click", () => { dropdown.style.display = "none"; select(index); });
+      list.appendChild(item);
+    });
+    input.addEventListener("click", () => { dropdown.style.display = "block"; });
+    select(Math.min(currentUser(), users.length - 1));
+  });
+}
+"""
+
+STYLE = """
+body { font-family: sans-serif; margin: 0; }
+.el-loading-mask { display: none; position: fixed; inset: 0; background: rgba(255, 255, 255, .6); z-index: 10; }
+.el-select { position: relative; display: inline-block; width: 320px; }
+.el-select .el-input__inner { width: 100%; }
+.el-select-dropdown { position: absolute; background: #fff; border: 1px solid #ddd; width: 100%; z-index: 5; }
+.el-select-dropdown__list { list-style: none; margin: 0; padding: 0; }
+.el-select-dropdown__item { padding: 4px 8px; cursor: pointer; }
+.el-tabs__nav div { display: inline-block; padding: 6px 12px; cursor: pointer; }
+.el-tabs__item.is-active { border-bottom: 2px solid #409eff; }
+td .cell { padding: 2px 8px; }
+"""
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>网上国网</title><style>__STYLE__
+#login_box { display: none; width: 360px; padding: 12px; border: 1px solid #ddd; }
+#slideVerify { display: none; position: relative; width: 310px; }
+.slide-verify-slider { position: relative; height: 40px; background: #f7f9fa; border: 1px solid #e4e7eb; }
+.slide-verify-slider-mask-item { position: absolute; left: 0; top: 0; width: 40px; height: 40px; background: #1991fa; cursor: pointer; }
+</style></head>
+<body><div id="app">
+<div class="header"><span class="user">登录</span></div>
+<div id="login_box">
+<div><div><div><span>扫码登录</span></div><div><span>账号登录</span></div><div><span>短信登录</span></div></div></div>
+<div><div><form>
+<div>
+<div><input class="el-input__inner" type="text" placeholder="请输入手机号"></div>
+<div><input class="el-input__inner" type="password" placeholder="请输入密码"></div>
+<div><div><span class="el-checkbox__inner"></span><span id="agree">我已阅读并同意用户协议</span></div></div>
+</div>
+<div><button type="button" class="el-button el-button--primary"><span>登录</span></button></div>
+</form></div></div>
+<div id="slideVerify" class="slide-verify"><canvas width="310" height="155"></canvas><div class="slide-verify-slider"><div class="slide-verify-slider-mask"><div class="slide-verify-slider-mask-item"></div></div></div></div>
+<p id="message"></p>
+</div>
+<div class="el-loading-mask"></div>
+</div>
+<script>__COMMON_JS__
+let agreed = false;
+let startX = null;
+const box = document.getElementById("login_box");
+const canvas = document.querySelector("#slideVerify canvas");
+const message = (text) => { document.getElementById("message").textContent = text; };
+document.querySelector(".user").addEventListener("click", () => { box.style.display = "block"; });
+document.getElementById("agree").addEventListener("click", () => { agreed = !agreed; });
+function draw(captcha) {
+  const ctx = canvas.getContext("2d");
+  if (captcha.image) {
+    const image = new Image();
+    image.onload = () => ctx.drawImage(image, 0, 0, canvas.width, canvas.height);
+    image.src = captcha.image;
+    return;
+  }
+  const gradient = ctx.createLinearGradient(0, 0, canvas.width, canvas.height);
+  gradient.addColorStop(0, "#6a8caf");
+  gradient.addColorStop(1, "#c9d6a3");
+  ctx.fillStyle = gradient;
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+  for (const [x, y, r, color] of captcha.shapes) {
+    ctx.fillStyle = color;
+    ctx.beginPath();
+    ctx.arc(x, y, r, 0, 2 * Math.PI);
+    ctx.fill();
+  }
+  ctx.fillStyle = "rgba(0, 0, 0, .45)";
+  ctx.strokeStyle = "rgba(255, 255, 255, .9)";
+  ctx.lineWidth = 2;
+  ctx.fillRect(captcha.gap, captcha.top, 42, 42);
+  ctx.strokeRect(captcha.gap, captcha.top, 42, 42);
+}
+// the first captcha comes with the page, so it is drawn as soon as the login button is clicked
+let nextCaptcha = __CAPTCHA__;
+document.querySelector(".el-button--primary").addEventListener("click", () => {
+  if (!agreed) { message("请先同意用户协议"); return; }
+  const show = (captcha) => {
+    draw(captcha);
+    document.getElementById("slideVerify").style.display = "block";
+  };
+  if (nextCaptcha) {
+    show(nextCaptcha);
+    nextCaptcha = null;
+  } else {
+    api("captcha").then(show);
+  }
+});
+document.querySelector(".slide-verify-slider-mask-item").addEventListener("mousedown", (e) => { startX = e.clientX; });
+document.addEventListener("mouseup", (e) => {
+  if (startX === null) return;
+  const offset = e.clientX - startX;
+  startX = null;
+  api("verify", {offset: offset}).then((result) => {
+    if (result.ok) { location.href = result.next; } else { message("验证失败，请重试"); }
+  });
+});
+</script></body></html>
+"""
+
+BALANCE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>账户余额</title><style>__STYLE__</style></head>
+<body><div id="app">
+<div class="el-dropdown"><span class="el-dropdown-link">切换户号</span></div>
+<div class="el-select"><div class="el-input"><input class="el-input__inner" type="text" readonly></div>
+<div class="el-select-dropdown" style="display: none"><ul class="el-select-dropdown__list"></ul></div></div>
+<ul class="info"><li class="righ"><span>用电户号:</span><span id="current-id"></span></li></ul>
+<div id="balance"></div>
+<div class="el-loading-mask"></div>
+</div>
+<script>__COMMON_JS__
+setupSelect((index) => {
+  const container = document.getElementById("balance");
+  container.innerHTML = "";
+  api("account?user=" + index).then((account) => {
+    container.innerHTML = '<p>您的账户余额为：<b class="cff8">' + account.balance + "元</b></p>";
+  });
+});
+</script></body></html>
+"""
+
+USAGE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>电费电量</title><style>__STYLE__</style></head>
+<body><div id="app">
+<div class="el-select"><div class="el-input"><input class="el-input__inner" type="text" readonly></div>
+<div class="el-select-dropdown" style="display: none"><ul class="el-select-dropdown__list"></ul></div></div>
+<div class="el-tabs el-tabs--top">
+<div class="el-tabs__header is-top"><div class="el-tabs__nav-wrap is-top"><div class="el-tabs__nav is-top"><div id="tab-first" class="el-tabs__item is-active">月用电量</div><div id="tab-second" class="el-tabs__item">日用电量</div></div></div></div>
+<div class="el-tabs__content">
+<div id="pane-first" class="el-tab-pane"><div>
+<div><div><div><div><input class="el-input__inner year" type="text" readonly></div><ul class="years" style="display: none"></ul></div></div></div>
+<div><div id="year-total"></div><div><div class="el-table"><div class="hidden-columns"></div><div class="el-table__header-wrapper"><table><thead><tr><th>月份</th><th>电量</th><th>电费</th></tr></thead></table></div><div class="el-table__body-wrapper is-scrolling-none"><table><tbody id="month-rows"></tbody></table></div></div></div></div>
+</div></div>
+<div id="pane-second" class="el-tab-pane dayd" style="display: none">
+<div><div><label><span class="el-radio__label">近7天</span></label><label><span class="el-radio__label">近30天</span></label></div></div>
+<div><div class="chart"></div><div><div class="el-table"><div class="hidden-columns"></div><div class="el-table__header-wrapper"><table><thead><tr><th>日期</th><th>电量</th></tr></thead></table></div><div class="el-table__body-wrapper is-scrolling-none"><table><tbody id="day-rows"></tbody></table></div></div></div></div>
+</div>
+</div></div>
+<div class="el-loading-mask"></div>
+</div>
+<script>__COMMON_JS__
+let user = 0;
+let view = 7;
+let dayRequest = 0;
+const cell = (text) => '<td><div class="cell">' + text + "</div></td>";
+function showDays() {
+  const rows = document.getElementById("day-rows");
+  const request = ++dayRequest;
+  rows.innerHTML = "";
+  api("daily?user=" + user + "&days=" + view).then((days) => {
+    // only the latest request is rendered, an older answer must not replace the current view
+    if (request !== dayRequest) return;
+    rows.innerHTML = days.map(([day, usage]) => "<tr>" + cell(day) + cell(usage) + "</tr>").join("");
+  });
+}
+const yearInput = document.querySelector("#pane-first input.year");
+const years = document.querySelector("#pane-first .years");
+yearInput.value = String(new Date().getFullYear());
+[0, 1].forEach((back) => {
+  const year = String(new Date().getFullYear() - back);
+  const item = document.createElement("li");
+  item.innerHTML = "<span>" + year + "</span>";
+  item.addEventListener("click", () => { yearInput.value = year; years.style.display = "none"; });
+  years.appendChild(item);
+});
+yearInput.addEventListener("click", () => { years.style.display = "block"; });
+document.getElementById("tab-first").addEventListener("click", () => {
+  document.getElementById("pane-first").style.display = "block";
+  document.getElementById("pane-second").style.display = "none";
+});
+document.getElementById("tab-second").addEventListener("click", () => {
+  document.getElementById("pane-first").style.display = "none";
+  document.getElementById("pane-second").style.display = "block";
+  if (!document.getElementById("day-rows").children.length) showDays();
+});
+document.querySelectorAll("#pane-second label").forEach((label, index) => {
+  label.querySelector("span").addEventListener("click", () => { view = index ? 30 : 7; showDays(); });
+});
+setupSelect((index) => {
+  user = index;
+  document.getElementById("year-total").innerHTML = "";
+  document.getElementById("month-rows").innerHTML = "";
+  document.getElementById("day-rows").innerHTML = "";
+  api("usage?user=" + index).then((usage) => {
+    document.getElementById("year-total").innerHTML = '<ul class="total"><li>年用电量<span>' + usage.yearly_usage
+      + "</span></li><li>年电费<span>" + usage.yearly_charge + "</span></li></ul>";
+    // the month with the highest usage is tagged MAX, the scraper removes the tag from the table text
+    const peak = usage.months.reduce((best, row, index, rows) => Number(row[1]) > Number(rows[best][1]) ? index : best, 0);
+    document.getElementById("month-rows").innerHTML = usage.months.map(([month, kwh, charge], index) =>
+      "<tr>" + cell(month) + cell(index === peak ? "<div>" + kwh + '</div><div class="tag">MAX</div>' : kwh)
+      + cell(charge) + "</tr>").join("");
+    if (document.getElementById("pane-second").style.display === "block") showDays();
+  });
+});
+</script></body></html>
+"""
+
+
+def synthetic_users(count: int, days: int = 30, seed: int = 0) -> list:
+    """Users with a plausible history: the site shows yesterday first and the months of this year."""
+    rng = random.Random(seed)
+    today = date.today()
+    users = []
+    for index in range(count):
+        daily = [
+            ((today - timedelta(days=offset)).isoformat(), f"{rng.uniform(3, 15):.2f}")
+            for offset in range(1, days + 1)
+        ]
+        shown = [f"{today.year}-{month:02d}" for month in range(1, today.month)] or [f"{today.year - 1}-12"]
+        months = []
+        for month in shown:
+            kwh = rng.uniform(150, 450)
+            months.append((month, f"{kwh:.2f}", f"{kwh * 0.56:.2f}"))
+        users.append({
+            "user_id": f"31{index:02d}{rng.randrange(10 ** 6):06d}{index:02d}",
+            "balance": round(rng.uniform(5, 200), 2),
+            "yearly_usage": f"{sum(float(kwh) for _, kwh, _ in months):.2f}",
+            "yearly_charge": f"{sum(float(charge) for _, _, charge in months):.2f}",
+            "months": [list(row) for row in months],
+            "days": [list(row) for row in daily],
+        })
+    return users
+
+
+def load_recording(directory: str) -> list:
+    with open(os.path.join(directory, "recording.json"), encoding="utf-8") as f:
+        return json.load(f)["users"]
+
+
+class FakeSgcc:
+
+    def __init__(self, users: list, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, seed: int = 0, captcha_failures: int = 0, captcha_tolerance: float = None,
+                 recording_dir: str = None):
+        self.users = users
+        self.latency = latency
+        self.jitter = jitter
+        self.captcha_failures = captcha_failures  # the first attempts are rejected regardless of the offset
+        self.captcha_tolerance = captcha_tolerance  # None accepts any drag to the right
+        self.recording_dir = recording_dir
+        self.requests = defaultdict(int)
+        self.captcha_attempts = 0
+        self._gap = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._captcha_images = []
+        if recording_dir and os.path.isdir(os.path.join(recording_dir, "captcha")):
+            self._captcha_images = sorted(os.listdir(os.path.join(recording_dir, "captcha")))
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, name="fake-sgcc", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def urls(self) -> dict:
+        """Environment overrides that point the fetcher at this server."""
+        return {
+            "LOGIN_URL": self.url + LOGIN_PATH,
+            "BALANCE_URL": self.url + BALANCE_PATH,
+            "ELECTRIC_USAGE_URL": self.url + USAGE_PATH,
+        }
+
+    def delay(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+            seconds = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if seconds:
+            time.sleep(seconds)
+
+    def new_captcha(self) -> dict:
+        with self._lock:
+            if self._captcha_images:
+                name = self._captcha_images[self.captcha_attempts % len(self._captcha_images)]
+                return {"image": f"/recorded/captcha/{name}"}
+            self._gap = self._rng.randint(120, 250)
+            shapes = [
+                (self._rng.randint(0, 310), self._rng.randint(0, 155), self._rng.randint(8, 30),
+                 f"rgba({self._rng.randint(0, 255)}, {self._rng.randint(0, 255)}, {self._rng.randint(0, 255)}, .5)")
+                for _ in range(12)
+            ]
+            return {"gap": self._gap, "top": self._rng.randint(20, 90), "shapes": shapes}
+
+    def verify(self, offset: float) -> bool:
+        with self._lock:
+            self.captcha_attempts += 1
+            if self.captcha_attempts <= self.captcha_failures:
+                return False
+            if self.captcha_tolerance is None or self._captcha_images:
+                return offset > 0
+            return abs(offset - self._gap) <= self.captcha_tolerance
+
+    def user(self, query: dict) -> dict:
+        index = int(query.get("user", ["0"])[0])
+        return self.users[min(max(index, 0), len(self.users) - 1)]
+
+
+def _make_handler(site: FakeSgcc):
+    pages = {
+        LOGIN_PATH: LOGIN_PAGE,
+        BALANCE_PATH: BALANCE_PAGE,
+        USAGE_PATH: USAGE_PAGE,
+    }
+    pages = {
+        path: page.replace("__STYLE__", STYLE).replace("__COMMON_JS__", COMMON_JS).encode("utf-8")
+        for path, page in pages.items()
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path in pages:
+                site.delay("page")
+                if url.path != LOGIN_PATH and SESSION_COOKIE not in self.headers.get("Cookie", ""):
+                    self._send(302, b"", headers={"Location": LOGIN_PATH})
+                    return
+                page = pages[url.path]
+                if url.path == LOGIN_PATH:
+                    page = page.replace(b"__CAPTCHA__", json.dumps(site.new_captcha()).encode("utf-8"))
+                self._send(200, page, "text/html; charset=utf-8")
+            elif url.path.startswith("/replay/api/"):
+                site.delay("xhr")
+                self._api(url.path[len("/replay/api/"):], parse_qs(url.query))
+            elif url.path.startswith("/recorded/") and site.recording_dir:
+                self._recorded(url.path[len("/recorded/"):])
+            else:
+                self._send(404, b"not found", "text/plain")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            url = urlparse(self.path)
+            if url.path != "/replay/api/verify":
+                self._send(404, b"not found", "text/plain")
+                return
+            site.delay("xhr")
+            offset = float(json.loads(body or b"{}").get("offset", 0))
+            if site.verify(offset):
+                self._json({"ok": True, "next": BALANCE_PATH}, {"Set-Cookie": f"{SESSION_COOKIE}=1; Path=/"})
+            else:
+                self._json({"ok": False})
+
+        def _api(self, name: str, query: dict):
+            if name == "users":
+                self._json([
+                    {"user_id": user["user_id"], "label": f"{user.get('name', '张*')} {user['user_id']}"}
+                    for user in site.users
+                ])
+            elif name == "captcha":
+                self._json(site.new_captcha())
+            elif name == "account":
+                self._json({"balance": f"{float(site.user(query)['balance']):.2f}"})
+            elif name == "usage":
+                user = site.user(query)
+                self._json({key: user[key] for key in ("yearly_usage", "yearly_charge", "months")})
+            elif name == "daily":
+                days = int(query.get("days", ["7"])[0])
+                self._json(site.user(query)["days"][:days])
+            else:
+                self._send(404, b"not found", "text/plain")
+
+        def _recorded(self, relative: str):
+            root = os.path.realpath(site.recording_dir)
+            path = os.path.realpath(os.path.join(root, relative))
+            if not path.startswith(root + os.sep) or not os.path.isfile(path):
+                self._send(404, b"not found", "text/plain")
+                return
+            with open(path, "rb") as f:
+                data = f.read()
+            content_type = "image/png" if path.endswith(".png") else "application/octet-stream"
+            self._send(200, data, content_type)
+
+        def _json(self, body, headers=None):
+            self._send(200, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json", headers)
+
+        def _send(self, code: int, data: bytes, content_type: str = "text/plain", headers=None):
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def fetch_once():
+    """One complete fetch with the current environment, used by bench and record in a child process."""
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s [%(levelname)-8s] %(message)s")
+    import settings as config
+    from data_fetcher import DataFetcher
+    from error_watcher import ErrorWatcher
+
+    ErrorWatcher.init()
+    DataFetcher(config.current()).fetch()
+
+
+def _phase_times(node: dict, totals: dict, counts: dict):
+    totals[node["name"]] += node["duration"]
+    counts[node["name"]] += 1
+    for child in node.get("children", []):
+        _phase_times(child, totals, counts)
+
+
+def benchmark(users: list, runs: int, latency: float, jitter: float, seed: int, captcha_failures: int,
+              extra_env: dict, recording_dir: str = None):
+    from const import BALANCE_SENSOR_NAME
+    from fake_hass import FakeHass
+
+    site = FakeSgcc(users, latency=latency, jitter=jitter, seed=seed, captcha_failures=captcha_failures,
+                    recording_dir=recording_dir).start()
+    hass = FakeHass().start()
+    workdir = tempfile.mkdtemp(prefix="sgcc_bench_")
+    timing_file = os.path.join(workdir, "timings.jsonl")
+    env = dict(os.environ)
+    env.update(site.urls())
+    env.update({
+        "PHONE_NUMBER": "13800000000",
+        "PASSWORD": "replay",
+        "HASS_URL": hass.url,
+        "HASS_TOKEN": "benchmark",
+        "HASS_FORCE_REFRESH_HOURS": "0",
+        "HASS_STATE_CACHE_FILE": os.path.join(workdir, "ha_state_cache.json"),
+        "HASS_OUTBOX_FILE": os.path.join(workdir, "ha_outbox.db"),
+        "TIMING_LOG_FILE": timing_file,
+        "ARTIFACT_DIR": os.path.join(workdir, "artifacts"),
+        "DB_NAME": os.path.join(workdir, "homeassistant.db"),
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra_env)
+    print(f"fake site: {len(users)} users, latency {latency * 1000:.0f} ms + up to {jitter * 1000:.0f} ms jitter, "
+          f"{captcha_failures} rejected captcha attempts; work dir {workdir}")
+    totals, counts = defaultdict(float), defaultdict(int)
+    walls = []
+    try:
+        for run_index in range(runs):
+            hass.states.clear()
+            start = time.monotonic()
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "fetch"], cwd=workdir, env=env)
+            walls.append(time.monotonic() - start)
+            published = sum(
+                1 for user in users
+                if hass.states.get(f"{BALANCE_SENSOR_NAME}_{user['user_id'][-4:]}", {}).get("state") == float(user["balance"])
+            )
+            print(f"run {run_index + 1}: exit {result.returncode}, {walls[-1]:.1f}s, "
+                  f"balance of {published}/{len(users)} users published correctly")
+    finally:
+        site.stop()
+        hass.stop()
+
+    records = []
+    if os.path.exists(timing_file):
+        with open(timing_file, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        _phase_times(record["tree"], totals, counts)
+    if not records:
+        print("no timing records written, check the fetch log above")
+        return
+    fetch_total = totals.get("fetch", 0.0) or 1.0
+    print(f"\n{len(records)} runs, process wall time mean {sum(walls) / len(walls):.1f}s, "
+          f"fetch span mean {fetch_total / len(records):.1f}s; requests served: {dict(site.requests)}")
+    print(f"{'phase':>24} | {'count':>5} | {'total [s]':>9} | {'per run [s]':>11} | {'mean [s]':>8} | {'of fetch':>8}")
+    for name, total in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"{name:>24} | {counts[name]:>5} | {total:>9.2f} | {total / len(records):>11.2f} | "
+              f"{total / counts[name]:>8.2f} | {total / fetch_total:>8.0%}")
+
+
+def record(directory: str):
+    """Run one fetch from the live site (PHONE_NUMBER / PASSWORD from the environment) with recording enabled."""
+    env = dict(os.environ, RECORD_DIR=os.path.abspath(directory))
+    subprocess.run([sys.executable, os.path.abspath(__file__), "fetch"], env=env, check=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake 95598.cn pages for offline runs of the fetcher")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("serve", "run the fake site in the foreground"), ("bench", "measure complete fetches against the fake site")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("--users", type=int, default=3, help="number of generated users, ignored with --recording")
+        sub.add_argument("--recording", help="directory written by RECORD_DIR / record")
+        sub.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+        sub.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds added on top, seeded")
+        sub.add_argument("--seed", type=int, default=0)
+        sub.add_argument("--captcha-failures", type=int, default=0, help="reject the first N captcha attempts")
+    subparsers.choices["serve"].add_argument("--port", type=int, default=8300)
+    subparsers.choices["serve"].add_argument("--captcha-tolerance", type=float, help="max distance in px from the gap, default accepts any drag")
+    subparsers.choices["bench"].add_argument("--runs", type=int, default=1)
+    subparsers.choices["bench"].add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                                             help="extra environment for the fetch, e.g. RETRY_WAIT_TIME_OFFSET_UNIT=1")
+    record_parser = subparsers.add_parser("record", help="record one fetch from the live site")
+    record_parser.add_argument("--dir", required=True)
+    subparsers.add_parser("fetch", help="run one fetch with the current environment (used by bench and record)")
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        fetch_once()
+    elif args.command == "record":
+        record(args.dir)
+    else:
+        users = load_recording(args.recording) if args.recording else synthetic_users(args.users, seed=args.seed)
+        if args.command == "bench":
+            extra_env = dict(item.split("=", 1) for item in args.env)
+            benchmark(users, args.runs, args.latency, args.jitter, args.seed, args.captcha_failures, extra_env,
+                      args.recording)
+        else:
+            site = FakeSgcc(users, port=args.port, latency=args.latency, jitter=args.jitter, seed=args.seed,
+                            captcha_failures=args.captcha_failures, captcha_tolerance=args.captcha_tolerance,
+                            recording_dir=args.recording).start()
+            print(f"Fake 95598 site listening on {site.url}, {len(users)} users")
+            for name, url in site.urls().items():
+                print(f"  {name}={url}")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                site.stop()
@@ -0,0 +1,218 @@
+"""
+Pre-built Firefox profile template.
+
+The template is a profile directory with LOW_MEMORY_FIREFOX_PREFS written to
+user.js, warmed up by one headless Firefox start so the startup cache,
+extension database and first-run state already exist. It is built once (at
+image build or on first start) and copied to tmpfs for every browser start,
+so Firefox skips its first-run work. The copy goes to the temp directory
+instead when /dev/shm is short of space; copies left by a crash are removed
+at startup.
+
+    python3 firefox_profile.py build     # build or rebuild the template
+    python3 firefox_profile.py bench     # time-to-first-driver.get with and without it
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import settings as config
+from const import DATA_DIR
+
+# Firefox 低内存配置：单内容进程、限制缓存、不保存会话历史、关闭遥测
+LOW_MEMORY_FIREFOX_PREFS = {
+    # 针对树莓派优化：禁用图片加载以节省 CPU 和内存
+    "permissions.default.image": 2,
+    # 单内容进程，关闭站点隔离（fission 会为每个站点再开进程）
+    "dom.ipc.processCount": 1,
+    "dom.ipc.processCount.webIsolated": 1,
+    "dom.ipc.processPrelaunch.enabled": False,
+    "fission.autostart": False,
+    # 缓存上限
+    "browser.cache.disk.enable": False,
+    "browser.cache.memory.capacity": 16384,  # KB
+    "browser.cache.offline.enable": False,
+    "image.mem.max_decoded_image_kb": 16384,
+    # 会话存储与历史
+    "browser.sessionstore.resume_from_crash": False,
+    "browser.sessionstore.max_tabs_undo": 0,
+    "browser.sessionstore.max_windows_undo": 0,
+    "browser.sessionhistory.max_entries": 2,
+    "browser.sessionhistory.max_total_viewers": 0,
+    # 遥测、健康报告、安全浏览及其他后台联网
+    "toolkit.telemetry.enabled": False,
+    "toolkit.telemetry.unified": False,
+    "toolkit.telemetry.archive.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+    "datareporting.policy.dataSubmissionEnabled": False,
+    "browser.safebrowsing.malware.enabled": False,
+    "browser.safebrowsing.phishing.enabled": False,
+    "browser.safebrowsing.downloads.enabled": False,
+    "app.update.enabled": False,
+    "extensions.pocket.enabled": False,
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    # 模板专用：跳过首次运行页面和默认浏览器检查
+    "browser.shell.checkDefaultBrowser": False,
+    "browser.startup.homepage_override.mstone": "ignore",
+    "startup.homepage_welcome_url": "about:blank",
+    "datareporting.policy.firstRunURL": "",
+}
+
+LOCK_FILES = ("lock", ".parentlock", "parent.lock")
+PREFS_HASH_FILE = ".prefs-hash"
+PROFILE_PREFIX = "sgcc-firefox-"
+SHM_DIR = "/dev/shm"
+# Docker 默认的 /dev/shm 只有 64MB，Firefox 的进程间通信也要用，复制配置后至少留出这么多
+SHM_RESERVE_BYTES = 32 * 1024 * 1024
+
+
+def template_dir() -> str:
+    return config.current().FIREFOX_PROFILE_TEMPLATE or os.path.join(DATA_DIR, "firefox-profile-template")
+
+
+def _prefs_hash() -> str:
+    return hashlib.sha1(json.dumps(LOW_MEMORY_FIREFOX_PREFS, sort_keys=True).encode()).hexdigest()
+
+
+def _firefox_binary():
+    for name in ("firefox", "firefox-esr"):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def build_template(path: str = None) -> str:
+    """Create the profile directory, write user.js and warm it up with one headless start."""
+    path = path or template_dir()
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    with open(os.path.join(path, "user.js"), "w", encoding="utf-8") as f:
+        for name, value in LOW_MEMORY_FIREFOX_PREFS.items():
+            f.write(f"user_pref({json.dumps(name)}, {json.dumps(value)});\n")
+
+    firefox = _firefox_binary()
+    if firefox:
+        start = time.monotonic()
+        screenshot = os.path.join(path, "warmup.png")
+        try:
+            subprocess.run(
+                [firefox, "--headless", "--no-remote", "-profile", path, "--screenshot", screenshot, "about:blank"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=120,
+            )
+            logging.info("Firefox profile template warmed up in %.1fs.", time.monotonic() - start)
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.warning("Failed to warm up the Firefox profile template: %s", e)
+        for name in ("warmup.png",) + LOCK_FILES:
+            if os.path.lexists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+    else:
+        logging.warning("Firefox binary not found, the profile template only contains user.js.")
+
+    with open(os.path.join(path, PREFS_HASH_FILE), "w") as f:
+        f.write(_prefs_hash())
+    logging.info("Firefox profile template built at %s.", path)
+    return path
+
+
+def ensure_template() -> str:
+    """Return the template path, (re)building it when missing or built with other prefs."""
+    path = template_dir()
+    try:
+        with open(os.path.join(path, PREFS_HASH_FILE)) as f:
+            if f.read().strip() == _prefs_hash():
+                return path
+    except OSError:
+        pass
+    return build_template(path)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _profile_root(needed: int) -> str:
+    """/dev/shm when it is writable and keeps SHM_RESERVE_BYTES free after the copy, else the temp directory."""
+    if os.access(SHM_DIR, os.W_OK):
+        try:
+            stat = os.statvfs(SHM_DIR)
+            if stat.f_bavail * stat.f_frsize >= needed + SHM_RESERVE_BYTES:
+                return SHM_DIR
+            logging.info("Not enough free space in %s for the Firefox profile, using %s.", SHM_DIR, tempfile.gettempdir())
+        except OSError:
+            pass
+    return tempfile.gettempdir()
+
+
+def prepare_profile() -> str:
+    """Copy the template to a fresh directory on tmpfs for one browser session."""
+    template = ensure_template()
+    profile_dir = tempfile.mkdtemp(prefix=PROFILE_PREFIX, dir=_profile_root(_dir_size(template)))
+    shutil.copytree(template, profile_dir, dirs_exist_ok=True)
+    return profile_dir
+
+
+def discard_profile(profile_dir: str):
+    shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+def remove_stale_profiles():
+    """Delete profile copies left behind by a crashed run; call at startup, before any browser starts."""
+    for root in {SHM_DIR, tempfile.gettempdir()}:
+        for path in glob.glob(os.path.join(root, PROFILE_PREFIX + "*")):
+            shutil.rmtree(path, ignore_errors=True)
+            logging.info("Removed the stale Firefox profile %s.", path)
+
+
+def benchmark(rounds: int, url: str):
+    """Time from webdriver start to the first driver.get() returning, with and without the template."""
+    from data_fetcher import DataFetcher
+
+    fetcher = DataFetcher(config.current())
+    results = {}
+    for use_template in (False, True):
+        fetcher.ENABLE_PROFILE_TEMPLATE = use_template
+        timings = []
+        for _ in range(rounds):
+            start = time.monotonic()
+            driver = fetcher._get_webdriver()
+            try:
+                driver.get(url)
+                timings.append(time.monotonic() - start)
+            finally:
+                driver.quit()
+                fetcher._discard_profiles()
+        results["template" if use_template else "fresh profile"] = timings
+    for name, timings in results.items():
+        print(f"{name:>14}: min {min(timings):.2f}s  avg {sum(timings) / len(timings):.2f}s  max {max(timings):.2f}s  ({rounds} rounds)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s  [%(levelname)-8s] ---- %(message)s")
+    parser = argparse.ArgumentParser(description="Firefox profile template")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="build or rebuild the profile template")
+    bench_parser = subparsers.add_parser("bench", help="compare time-to-first-driver.get with and without the template")
+    bench_parser.add_argument("--rounds", type=int, default=3)
+    bench_parser.add_argument("--url", default="about:blank")
+    args = parser.parse_args()
+    if args.command == "build":
+        build_template()
+    else:
+        benchmark(args.rounds, args.url)
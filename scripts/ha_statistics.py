@@ -0,0 +1,140 @@
+"""
+Backfill of the scraped daily and monthly history into Home Assistant
+long-term statistics, so the energy dashboard gets correct timestamps.
+
+Each series is an external statistic (`sgcc_electricity:<name>_<last 4 digits>`)
+imported with `recorder/import_statistics` over the websocket API. A local
+state file remembers what was imported, so only days or months that are new
+or changed (and the cumulative sums after them) are sent again. All series of
+one user are sent together over one connection per run.
+"""
+
+import logging
+import os
+from datetime import datetime
+
+import metrics
+from const import DATA_DIR
+from ha_websocket import HassWebSocket
+from state_cache import load_json_state, save_json_state
+
+SOURCE = "sgcc_electricity"
+DATE_FORMATS = ("%Y-%m-%d", "%Y%m%d", "%Y/%m/%d", "%Y-%m", "%Y%m", "%Y年%m月")
+
+
+def parse_period_start(text: str):
+    """Local midnight of a scraped day or the first day of a scraped month, None if unknown."""
+    text = (text or "").strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).astimezone()
+        except ValueError:
+            continue
+    return None
+
+
+class StatisticsImporter:
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            settings.hass_base_url,
+            settings.HASS_TOKEN,
+            os.path.join(DATA_DIR, settings.HASS_STATISTICS_STATE_FILE),
+        )
+
+    def __init__(self, base_url: str, token: str, state_path: str):
+        self.base_url = base_url
+        self.token = token
+        self.state_path = state_path
+        self.sent_rows = 0
+        self._ws = None
+        # 状态丢失时全部重新导入
+        self._state = load_json_state(state_path, "statistics import state")
+
+    def publish(self, user_id: str, dates, usages, months, month_usages, month_charges):
+        """Import the new or changed rows of all series of one user in one batch of pipelined calls."""
+        postfix = user_id[-4:]
+        series = [
+            (f"{SOURCE}:daily_usage_{postfix}", f"国网每日用电量 {postfix}", "kWh", dates, usages),
+            (f"{SOURCE}:monthly_usage_{postfix}", f"国网每月用电量 {postfix}", "kWh", months, month_usages),
+            (f"{SOURCE}:monthly_charge_{postfix}", f"国网每月电费 {postfix}", "CNY", months, month_charges),
+        ]
+        commands, updates = [], []
+        for statistic_id, name, unit, periods, values in series:
+            rows, merged = self._changed_rows(statistic_id, periods or [], values or [])
+            if not rows:
+                continue
+            commands.append({
+                "type": "recorder/import_statistics",
+                "metadata": {
+                    "has_mean": False,
+                    "has_sum": True,
+                    "name": name,
+                    "source": SOURCE,
+                    "statistic_id": statistic_id,
+                    "unit_of_measurement": unit,
+                },
+                "stats": [{"start": start, "state": state, "sum": total} for start, state, total in rows],
+            })
+            updates.append((statistic_id, merged, len(rows)))
+        if not commands:
+            logging.info("Long-term statistics of user %s are up to date.", user_id)
+            return
+
+        try:
+            if self._ws is None:
+                self._ws = HassWebSocket(self.base_url, self.token)
+                self._ws.connect()
+            results = self._ws.call_many(commands)
+        except Exception:
+            # never reuse a broken connection, the next user connects again; these rows are sent by the next run
+            self._close_connection()
+            raise
+        for (statistic_id, merged, row_count), result in zip(updates, results):
+            if result.get("success"):
+                self._state[statistic_id] = merged
+                self.sent_rows += row_count
+                metrics.inc("sgcc_statistics_rows_total", row_count)
+                logging.info("Imported %s rows into long-term statistic %s.", row_count, statistic_id)
+            else:
+                logging.error("Import of long-term statistic %s failed: %s", statistic_id, result.get('error'))
+
+    def close(self):
+        self._close_connection()
+        save_json_state(self.state_path, self._state, "statistics import state")
+
+    def _close_connection(self):
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except OSError:
+                pass
+            self._ws = None
+
+    def _changed_rows(self, statistic_id: str, periods, values):
+        """
+        Merge the scraped rows into the imported history, recompute the cumulative
+        sums and return (rows from the first new or changed one on, merged history).
+        """
+        imported = self._state.get(statistic_id, {})
+        history = {start: state for start, (state, _) in imported.items()}
+        for period, value in zip(periods, values):
+            start = parse_period_start(period)
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if start is None:
+                logging.debug("Skip statistics row with unknown period format: %s", period)
+                continue
+            history[start.isoformat()] = value
+
+        merged, rows, total, changed = {}, [], 0.0, False
+        for start in sorted(history):
+            total = round(total + history[start], 3)
+            merged[start] = [history[start], total]
+            changed = changed or imported.get(start) != merged[start]
+            if changed:
+                rows.append((start, history[start], total))
+        return rows, merged
@@ -0,0 +1,170 @@
+"""
+Minimal Home Assistant websocket API client (RFC 6455 over the standard library).
+
+Only what the statistics import needs: the handshake, authentication, and
+pipelined JSON commands with their results.
+"""
+
+import base64
+import json
+import os
+import socket
+import ssl
+import struct
+from urllib.parse import urlparse
+
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class HassWebSocketError(Exception):
+    pass
+
+
+def _apply_mask(payload: bytes, key: bytes) -> bytes:
+    if not payload:
+        return payload
+    repeated = (key * (len(payload) // 4 + 1))[: len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+
+def encode_frame(payload: bytes, opcode: int = OPCODE_TEXT, mask: bool = True) -> bytes:
+    """One final frame; clients must mask, servers must not."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = _apply_mask(payload, key)
+    return bytes(header) + payload
+
+
+def read_frame(recv_exact):
+    """Read one frame with recv_exact(n) -> bytes, return (fin, opcode, payload)."""
+    first, second = recv_exact(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", recv_exact(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", recv_exact(8))[0]
+    key = recv_exact(4) if second & 0x80 else None
+    payload = recv_exact(length) if length else b""
+    if key:
+        payload = _apply_mask(payload, key)
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class HassWebSocket:
+
+    def __init__(self, base_url: str, token: str, timeout: float = 30):
+        self.base_url = base_url
+        self.token = token
+        self.timeout = timeout
+        self._sock = None
+        self._buffer = b""
+        self._next_id = 1
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connect(self):
+        url = urlparse(self.base_url)
+        secure = url.scheme in ("https", "wss")
+        port = url.port or (443 if secure else 80)
+        sock = socket.create_connection((url.hostname, port), timeout=self.timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=url.hostname)
+        self._sock = sock
+        path = url.path.rstrip("/") + "/api/websocket"
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall(
+            (
+                f"GET {path} HTTP/1.1\r\nHost: {url.hostname}:{port}\r\nUpgrade: websocket\r\n"
+                f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        while b"\r\n\r\n" not in self._buffer:
+            self._fill()
+        head, self._buffer = self._buffer.split(b"\r\n\r\n", 1)
+        status_line = head.split(b"\r\n", 1)[0].decode(errors="replace")
+        if " 101 " not in status_line + " ":
+            raise HassWebSocketError(f"websocket handshake failed: {status_line}")
+
+        message = self.recv_json()
+        if message.get("type") == "auth_required":
+            self.send_json({"type": "auth", "access_token": self.token})
+            message = self.recv_json()
+        if message.get("type") != "auth_ok":
+            raise HassWebSocketError(f"websocket authentication failed: {message.get('message', message.get('type'))}")
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.sendall(encode_frame(b"", OPCODE_CLOSE))
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+
+    def send_json(self, message: dict):
+        self._sock.sendall(encode_frame(json.dumps(message, ensure_ascii=False).encode("utf-8")))
+
+    def recv_json(self) -> dict:
+        fragments = []
+        while True:
+            fin, opcode, payload = read_frame(self._recv_exact)
+            if opcode == OPCODE_PING:
+                self._sock.sendall(encode_frame(payload, OPCODE_PONG))
+                continue
+            if opcode == OPCODE_CLOSE:
+                raise HassWebSocketError("websocket closed by Home Assistant")
+            if opcode == OPCODE_PONG:
+                continue
+            fragments.append(payload)
+            if fin:
+                return json.loads(b"".join(fragments))
+
+    def call_many(self, commands: list) -> list:
+        """Send all commands without waiting, then collect their results in order."""
+        ids = []
+        for command in commands:
+            message = dict(command, id=self._next_id)
+            ids.append(self._next_id)
+            self._next_id += 1
+            self.send_json(message)
+        results = {}
+        while len(results) < len(ids):
+            message = self.recv_json()
+            if message.get("type") == "result" and message.get("id") in ids:
+                results[message["id"]] = message
+        return [results[command_id] for command_id in ids]
+
+    def call(self, command: dict) -> dict:
+        return self.call_many([command])[0]
+
+    def _fill(self):
+        chunk = self._sock.recv(65536)
+        if not chunk:
+            raise HassWebSocketError("websocket connection closed")
+        self._buffer += chunk
+
+    def _recv_exact(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            self._fill()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
@@ -0,0 +1,169 @@
+"""
+Logging of the daemon: records are queued by the calling thread and formatted
+and written by a QueueListener thread, so a slow stdout never stalls a fetch.
+
+The calling thread tags each record with the current run id and span (phase)
+from tracing.py and merges the arguments of the %-style call, so an argument
+changed after the call cannot alter the message; records below the level are
+never formatted. Before output, the listener thread:
+- suppresses a message repeated more than LOG_RATE_LIMIT times per minute
+  (0 disables), the next one after the minute reports how many were dropped
+- masks the secret settings (PASSWORD, tokens, MQTT_PASSWORD, webhook URL),
+  plus anything that looks like a bearer token or a token= parameter
+
+LOG_FORMAT=json writes one JSON object per line with run_id and phase.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import time
+from datetime import datetime
+
+import metrics
+import tracing
+
+TEXT_FORMAT = "%(asctime)s  [%(levelname)-8s] ---- %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+MASK = "******"
+SECRET_PATTERNS = (
+    re.compile(r"(Bearer\s+)[\w.\-~+/]+=*", re.IGNORECASE),
+    re.compile(r"((?:access_)?token=)[^&\s\"']+", re.IGNORECASE),
+)
+
+_listener = None
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """Queue a snapshot of the record; filtering and formatting happen in the listener thread."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.run_id = tracing.current_run_id()
+        record.phase = tracing.current_phase()
+        # 像标准库的 QueueHandler 一样在入队前合并参数，避免可变参数在监听线程格式化前被修改
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+
+    def __init__(self, limit: int, window: float = 60.0):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._seen = {}  # (level, message) -> [window start, count]
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno >= logging.CRITICAL:
+            return True
+        message = record.getMessage()
+        now = time.monotonic()
+        key = (record.levelno, message)
+        entry = self._seen.get(key)
+        if entry is None or now - entry[0] >= self.window:
+            suppressed = entry[1] - self.limit if entry is not None and entry[1] > self.limit else 0
+            self._seen[key] = [now, 1]
+            if len(self._seen) > 1000:
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+            if suppressed:
+                record.msg = f"{message} ({suppressed} repeated messages suppressed)"
+                record.args = None
+            return True
+        entry[1] += 1
+        if entry[1] > self.limit:
+            metrics.inc("sgcc_log_messages_suppressed_total")
+            return False
+        return True
+
+
+class RedactFilter(logging.Filter):
+
+    def __init__(self, secrets=()):
+        super().__init__()
+        # longest first, so a secret containing another one is masked whole
+        self.secrets = sorted({secret for secret in secrets if secret and len(secret) >= 4}, key=len, reverse=True)
+
+    def redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, MASK)
+        for pattern in SECRET_PATTERNS:
+            text = pattern.sub(lambda match: match.group(1) + MASK, text)
+        return text
+
+    def filter(self, record):
+        record.msg = self.redact(record.getMessage())
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = self.redact(record.exc_text)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "phase": getattr(record, "phase", None),
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def init(level: str, log_format: str = "text", rate_limit: int = 10, secrets=()):
+    """Route the root logger through a queue; safe to call again to reconfigure."""
+    global _listener
+    previous, _listener = _listener, None
+
+    output = logging.StreamHandler(stream=sys.stdout)
+    if log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    output.addFilter(RateLimitFilter(rate_limit))
+    output.addFilter(RedactFilter(secrets))
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    root = logging.getLogger()
+    handler = _ContextQueueHandler(records)
+    root.addHandler(handler)
+    for old in [h for h in root.handlers if isinstance(h, _ContextQueueHandler) and h is not handler]:
+        root.removeHandler(old)
+    root.setLevel(level)
+    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
+    # 旧的监听线程写完已排队的日志后退出
+    if previous is not None:
+        previous.stop()
+    return _listener
+
+
+def stop():
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
@@ -1,113 +1,182 @@
+import argparse
 import logging
 import logging.config
 import os
+import subprocess
 import sys
 import time
-import schedule
-import json
 import random
+import metrics
 from error_watcher import ErrorWatcher
 from datetime import datetime,timedelta
 from const import *
-from data_fetcher import DataFetcher
+
+# selenium / numpy / onnxruntime 等重型依赖都在 data_fetcher 中，
+# 放到 main() 里真正创建 DataFetcher 时再导入，保证日志第一时间输出
 
 def main():
-    global RETRY_TIMES_LIMIT
-    if 'PYTHON_IN_DOCKER' not in os.environ: 
-        # 读取 .env 文件
-        import dotenv
-        dotenv.load_dotenv(verbose=True)
-    if os.path.isfile('/data/options.json'):
-        with open('/data/options.json') as f:
-            options = json.load(f)
-        try:
-            PHONE_NUMBER = options.get("PHONE_NUMBER")
-            PASSWORD = options.get("PASSWORD")
-            HASS_URL = options.get("HASS_URL")
-            JOB_START_TIME = options.get("JOB_START_TIME", "07:00")
-            LOG_LEVEL = options.get("LOG_LEVEL", "INFO")
-            VERSION = os.getenv("VERSION")
-            RETRY_TIMES_LIMIT = int(options.get("RETRY_TIMES_LIMIT", 5))
-
-            logger_init(LOG_LEVEL)
-            os.environ["HASS_URL"] = options.get("HASS_URL", "http://homeassistant.local:8123/")
-            os.environ["HASS_TOKEN"] = options.get("HASS_TOKEN", "")
-            os.environ["ENABLE_DATABASE_STORAGE"] = str(options.get("ENABLE_DATABASE_STORAGE", "false")).lower()
-            os.environ["IGNORE_USER_ID"] = options.get("IGNORE_USER_ID", "xxxxx,xxxxx")
-            os.environ["DB_NAME"] = options.get("DB_NAME", "homeassistant.db")
-            os.environ["RETRY_TIMES_LIMIT"] = str(options.get("RETRY_TIMES_LIMIT", 5))
-            os.environ["DRIVER_IMPLICITY_WAIT_TIME"] = str(options.get("DRIVER_IMPLICITY_WAIT_TIME", 60))
-            os.environ["LOGIN_EXPECTED_TIME"] = str(options.get("LOGIN_EXPECTED_TIME", 10))
-            os.environ["RETRY_WAIT_TIME_OFFSET_UNIT"] = str(options.get("RETRY_WAIT_TIME_OFFSET_UNIT", 10))
-            os.environ["DATA_RETENTION_DAYS"] = str(options.get("DATA_RETENTION_DAYS", 7))
-            os.environ["RECHARGE_NOTIFY"] = str(options.get("RECHARGE_NOTIFY", "false")).lower()
-            os.environ["BALANCE"] = str(options.get("BALANCE", 5.0))
-            os.environ["PUSHPLUS_TOKEN"] = options.get("PUSHPLUS_TOKEN", "")
-            logging.info(f"当前以Homeassistant Add-on 形式运行.")
-        except Exception as e:
-            logging.error(f"Failing to read the options.json file, the program will exit with an error message: {e}.")
-            sys.exit()
+    import settings as config
+    try:
+        settings = config.current()
+    except Exception as e:
+        logger_init()
+        logging.error("Failing to read the settings, the program will exit with an error message: %s.", e)
+        sys.exit()
+    logger_init(settings)
+    if settings.source == config.OPTIONS_PATH:
+        logging.info("当前以Homeassistant Add-on 形式运行.")
     else:
-        try:
-            PHONE_NUMBER = os.getenv("PHONE_NUMBER")
-            PASSWORD = os.getenv("PASSWORD")
-            HASS_URL = os.getenv("HASS_URL")
-            JOB_START_TIME = os.getenv("JOB_START_TIME","07:00" )
-            LOG_LEVEL = os.getenv("LOG_LEVEL","INFO")
-            VERSION = os.getenv("VERSION")
-            RETRY_TIMES_LIMIT = int(os.getenv("RETRY_TIMES_LIMIT", 5))
-            
-            logger_init(LOG_LEVEL)
-            logging.info(f"The current run runs as a docker image.")
-        except Exception as e:
-            logging.error(f"Failing to read the .env file, the program will exit with an error message: {e}.")
-            sys.exit()
-
-    logging.info(f"The current repository version is {VERSION}, and the repository address is https://github.com/ARC-MX/sgcc_electricity_new.git")
+        logging.info("The current run runs as a docker image.")
+
+    VERSION = os.getenv("VERSION")
+    logging.info("The current repository version is %s, and the repository address is https://github.com/ARC-MX/sgcc_electricity_new.git", VERSION)
     current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    logging.info(f"The current date is {current_datetime}.")
+    logging.info("The current date is %s.", current_datetime)
+
+    logging.info("start init ErrorWatcher")
+    ErrorWatcher.init()
+    logging.info("ErrorWatcher init done!")
+    import schedule
+    from data_fetcher import DataFetcher
+    fetcher = DataFetcher(settings)
+    # 上次异常退出时留下的浏览器配置副本
+    import firefox_profile
+    firefox_profile.remove_stale_profiles()
+
+    adaptive = schedule_jobs(settings, fetcher)
+
+    control_server = None
+    if settings.CONTROL_SERVER_PORT:
+        from control_server import ControlServer
+        control_server = ControlServer(
+            settings.CONTROL_SERVER_HOST,
+            settings.CONTROL_SERVER_PORT,
+            next_run=lambda: adaptive.next_run if adaptive else schedule.next_run(),
+        ).start()
 
-    logging.info(f"start init ErrorWatcher")
-    ErrorWatcher.init(root_dir='/data/errors')
-    logging.info(f'ErrorWatcher init done!')
-    fetcher = DataFetcher(PHONE_NUMBER, PASSWORD)
+    # HA 不可用时未送达的更新在两次运行之间定时补发
+    from outbox import Outbox
+    Outbox.instance().start_replayer()
+    succeeded = True
+
+    def on_reload(old, new):
+        """配置文件修改或收到 SIGHUP 后应用新配置，浏览器和验证码模型保持不变"""
+        nonlocal adaptive
+        changed = set(new.changed(old))
+        if changed & {"LOG_LEVEL", "LOG_FORMAT", "LOG_RATE_LIMIT"} or new.secrets != old.secrets:
+            logger_init(new)
+        fetcher.apply_settings(new)
+        if any(name.startswith("HASS_") for name in changed):
+            Outbox.instance().configure(new)
+        if "JOB_START_TIME" in changed or any(name.startswith("ADAPTIVE_") for name in changed):
+            adaptive = schedule_jobs(new, fetcher)
+            if adaptive:
+                adaptive.plan(failed=not succeeded)
+
+    config.subscribe(on_reload)
+    watcher = config.SettingsWatcher().install()
+
+    succeeded = run_task(fetcher)
+    if adaptive:
+        adaptive.plan(failed=not succeeded)
+
+    while True:
+        watcher.poll()
+        schedule.run_pending()
+        if adaptive and adaptive.due():
+            succeeded = run_task(fetcher)
+            adaptive.plan(failed=not succeeded)
+        if control_server and control_server.run_now.is_set():
+            control_server.run_now.clear()
+            succeeded = run_task(fetcher)
+            if adaptive:
+                adaptive.plan(failed=not succeeded)
+        time.sleep(1)
+
+
+def schedule_jobs(settings, fetcher: "DataFetcher"):
+    """(Re)register the daily runs; returns the AdaptiveScheduler when ADAPTIVE_SCHEDULE is on, else None."""
+    import schedule
+    schedule.clear()
+    if settings.ADAPTIVE_SCHEDULE:
+        # 根据网站实际发布日用电量的时间安排运行，数据已是最新时跳过当天剩余的运行
+        from adaptive_schedule import AdaptiveScheduler
+        logging.info("The current logged-in user name is %s, the homeassistant address is %s, and the program will be executed when the daily usage is expected to be published.", settings.PHONE_NUMBER, settings.HASS_URL)
+        return AdaptiveScheduler.from_settings(settings)
 
     # 生成随机延迟时间（-10分钟到+10分钟）
     random_delay_minutes = random.randint(-10, 10)
-    parsed_time = datetime.strptime(JOB_START_TIME, "%H:%M") + timedelta(minutes=random_delay_minutes)
-    logging.info(f"The current logged-in user name is {PHONE_NUMBER}, the homeassistant address is {HASS_URL}, and the program will be executed every day at {parsed_time.strftime('%H:%M')}.")
+    parsed_time = datetime.strptime(settings.JOB_START_TIME, "%H:%M") + timedelta(minutes=random_delay_minutes)
+    logging.info("The current logged-in user name is %s, the homeassistant address is %s, and the program will be executed every day at %s.", settings.PHONE_NUMBER, settings.HASS_URL, parsed_time.strftime('%H:%M'))
 
     # 添加随机延迟
     next_run_time = parsed_time + timedelta(hours=12)
 
-    logging.info(f'Run job now! The next run will be at {parsed_time.strftime("%H:%M")} and {next_run_time.strftime("%H:%M")} every day')
+    logging.info("Run job now! The next run will be at %s and %s every day", parsed_time.strftime("%H:%M"), next_run_time.strftime("%H:%M"))
     schedule.every().day.at(parsed_time.strftime("%H:%M")).do(run_task, fetcher)
     schedule.every().day.at(next_run_time.strftime("%H:%M")).do(run_task, fetcher)
-    run_task(fetcher)
+    return None
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
 
+def run_task(data_fetcher: "DataFetcher") -> bool:
+    """Fetch with retries; True when a fetch completed."""
+    metrics.set_gauge("sgcc_run_in_progress", 1)
+    result = "failure"
+    retry_times_limit = data_fetcher.RETRY_TIMES_LIMIT
+    try:
+        for retry_times in range(1, retry_times_limit + 1):
+            try:
+                with metrics.timed("run"):
+                    data_fetcher.fetch()
+                result = "success"
+                return True
+            except Exception as e:
+                logging.error("state-refresh task failed, reason is [%s], %s retry times left.", e, retry_times_limit - retry_times)
+                continue
+        return False
+    finally:
+        metrics.inc("sgcc_runs_total", result=result)
+        metrics.set_gauge("sgcc_last_run_timestamp_seconds", time.time(), result=result)
+        metrics.set_gauge("sgcc_run_in_progress", 0)
 
-def run_task(data_fetcher: DataFetcher):
-    for retry_times in range(1, RETRY_TIMES_LIMIT + 1):
-        try:
-            data_fetcher.fetch()
-            return
-        except Exception as e:
-            logging.error(f"state-refresh task failed, reason is [{e}], {RETRY_TIMES_LIMIT - retry_times} retry times left.")
-            continue
+def logger_init(settings=None):
+    # 日志在后台线程中格式化和输出，并做密码/令牌脱敏和重复消息限流，见 log_setup.py
+    import log_setup
+    if settings is None:
+        log_setup.init("INFO")
+    else:
+        log_setup.init(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_RATE_LIMIT, settings.secrets)
 
-def logger_init(level: str):
-    logger = logging.getLogger()
-    logger.setLevel(level)
-    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
-    format = logging.Formatter("%(asctime)s  [%(levelname)-8s] ---- %(message)s", "%Y-%m-%d %H:%M:%S")
-    sh = logging.StreamHandler(stream=sys.stdout)
-    sh.setFormatter(format)
-    logger.addHandler(sh)
+def startup_profile(top: int = 25):
+    """以 -X importtime 在子进程中分别导入启动阶段和抓取阶段的模块，输出耗时最多的导入"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    phases = [("startup", "import main"), ("fetch", "import data_fetcher")]
+    for phase, statement in phases:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            cwd=script_dir, capture_output=True, text=True,
+        )
+        rows = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+        if result.returncode != 0:
+            print(f"[{phase}] `{statement}` failed: {result.stderr.strip().splitlines()[-1]}")
+        total_us = sum(self_us for _, self_us, _ in rows)
+        print(f"[{phase}] `{statement}`: {len(rows)} modules, {total_us / 1000:.1f} ms total")
+        print(f"{'cumulative [ms]':>16} | {'self [ms]':>10} | imported package")
+        for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+            print(f"{cumulative_us / 1000:>16.1f} | {self_us / 1000:>10.1f} | {name}")
+        print()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="sgcc_electricity")
+    parser.add_argument("--startup-profile", action="store_true", help="print an -X importtime style breakdown of startup imports and exit")
+    args = parser.parse_args()
+    if args.startup_profile:
+        startup_profile()
+    else:
+        main()
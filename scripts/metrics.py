@@ -0,0 +1,194 @@
+"""
+A minimal, thread-safe Prometheus style metrics registry.
+
+The fetcher, the sensor updator and main.py record into the module level
+REGISTRY, and the control server renders it on /metrics.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}  # name -> (type, help)
+        self._values = {}  # name -> {labels tuple: value}
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self._meta[name] = (metric_type, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values.setdefault(name, {})[key] = float(value)
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation of a summary (exported as _sum and _count)."""
+        self.inc(f"{name}_sum", value, **labels)
+        self.inc(f"{name}_count", 1.0, **labels)
+
+    def get(self, name: str, default=None, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            return self._values.get(name, {}).get(key, default)
+
+    def samples(self, name: str) -> dict:
+        """Return {labels dict as tuple: value} for every series of a metric."""
+        with self._lock:
+            return dict(self._values.get(name, {}))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+        lines = []
+        for name in sorted(self._meta):
+            metric_type, help_text = self._meta[name]
+            if metric_type == "summary":
+                series_names = [f"{name}_sum", f"{name}_count"]
+            else:
+                series_names = [name]
+            if not any(values.get(series_name) for series_name in series_names):
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for series_name in series_names:
+                for key, value in sorted(values.get(series_name, {}).items()):
+                    lines.append(f"{series_name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key) -> str:
+    if not key:
+        return ""
+    escaped = []
+    for label, value in key:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{label}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("sgcc_phase_duration_seconds", "summary", "Wall time spent in each fetch phase.")
+REGISTRY.describe("sgcc_phase_last_duration_seconds", "gauge", "Wall time of the most recent execution of each fetch phase.")
+REGISTRY.describe("sgcc_runs_total", "counter", "Scheduled or requested fetch runs by result.")
+REGISTRY.describe("sgcc_run_in_progress", "gauge", "1 while a fetch run is executing.")
+REGISTRY.describe("sgcc_last_run_timestamp_seconds", "gauge", "Unix time the last fetch run finished, by result.")
+REGISTRY.describe("sgcc_publication_time_minutes", "gauge", "Learned time of day (minutes after midnight) daily usage is published.")
+REGISTRY.describe("sgcc_next_run_timestamp_seconds", "gauge", "Unix time of the next scheduled fetch run.")
+REGISTRY.describe("sgcc_scheduled_runs_total", "counter", "Planned fetch runs by decision (postponed, retry, next_day, skipped_day, max_interval).")
+REGISTRY.describe("sgcc_login_total", "counter", "Login attempts by result.")
+REGISTRY.describe("sgcc_captcha_attempts_total", "counter", "Slider captcha attempts by result.")
+REGISTRY.describe("sgcc_pacing_seconds_total", "counter", "Seconds slept to pace browser actions, by kind.")
+REGISTRY.describe("sgcc_pacing_overlap_seconds_total", "counter", "Think time covered by other work instead of sleeping, by kind.")
+REGISTRY.describe("sgcc_run_pacing_seconds", "gauge", "Seconds slept for pacing in the last fetch run.")
+REGISTRY.describe("sgcc_user_fetch_total", "counter", "Per user data fetches by result.")
+REGISTRY.describe("sgcc_last_success_timestamp_seconds", "gauge", "Unix time of the last successful fetch and push for each user id.")
+REGISTRY.describe("sgcc_daily_fetch_total", "counter", "Daily usage table reads by view (7, 30 or skipped).")
+REGISTRY.describe("sgcc_daily_days_lost_total", "counter", "Days of daily usage the site no longer provides.")
+REGISTRY.describe("sgcc_page_loads_saved_total", "counter", "Usage page tabs not loaded because the probe found nothing new.")
+REGISTRY.describe("sgcc_run_page_loads_saved", "gauge", "Usage page tabs the probe saved in the last run.")
+REGISTRY.describe("sgcc_ha_updates_total", "counter", "Sensor updates sent or skipped because the state was unchanged.")
+REGISTRY.describe("sgcc_ha_push_total", "counter", "Home Assistant state updates by result.")
+REGISTRY.describe("sgcc_ha_outbox_depth", "gauge", "Home Assistant updates waiting in the outbox.")
+REGISTRY.describe("sgcc_ha_outbox_oldest_age_seconds", "gauge", "Age of the oldest pending update in the outbox.")
+REGISTRY.describe("sgcc_ha_outbox_delivery_lag_seconds", "summary", "Time from queueing the latest value of an entity to its delivery.")
+REGISTRY.describe("sgcc_notifications_total", "counter", "Low-balance notifications by channel and result.")
+REGISTRY.describe("sgcc_statistics_rows_total", "counter", "Rows imported into Home Assistant long-term statistics.")
+REGISTRY.describe("sgcc_db_size_bytes", "gauge", "Size of the usage database including its WAL after the last maintenance.")
+REGISTRY.describe("sgcc_db_archived_rows_total", "counter", "Daily readings moved from the database to archive files.")
+REGISTRY.describe("sgcc_db_reclaimed_bytes_total", "counter", "Bytes reclaimed by database maintenance.")
+REGISTRY.describe("process_resident_memory_bytes", "gauge", "Resident memory of this process.")
+REGISTRY.describe("sgcc_browser_resident_memory_bytes", "gauge", "Resident memory of the geckodriver/browser process tree.")
+REGISTRY.describe("sgcc_browser_peak_resident_memory_bytes", "gauge", "Peak browser process tree RSS during the last run.")
+REGISTRY.describe("sgcc_browser_restarts_total", "counter", "Browser restarts triggered by the memory watchdog.")
+REGISTRY.describe("sgcc_log_messages_suppressed_total", "counter", "Repeated log messages dropped by the rate limit.")
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels):
+    REGISTRY.set(name, value, **labels)
+
+
+def observe_phase(phase: str, seconds: float):
+    REGISTRY.observe("sgcc_phase_duration_seconds", seconds, phase=phase)
+    REGISTRY.set("sgcc_phase_last_duration_seconds", seconds, phase=phase)
+
+
+@contextmanager
+def timed(phase: str):
+    """Context manager recording the wall time of a phase."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe_phase(phase, time.monotonic() - start)
+
+
+def read_rss(pid: int) -> int:
+    """Resident set size of a process in bytes, 0 if it cannot be read (non Linux or exited)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def child_pids(pid: int) -> list:
+    """All descendant pids of a process, read from /proc."""
+    children = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces, the ppid is the 2nd field after it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    descendants, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            descendants.append(child)
+            stack.append(child)
+    return descendants
+
+
+def tree_rss(pid: int, include_self: bool = True) -> int:
+    """Summed RSS of a process and all of its descendants."""
+    total = read_rss(pid) if include_self else 0
+    return total + sum(read_rss(child) for child in child_pids(pid))
+
+
+def render() -> str:
+    """Refresh the memory gauges and render the registry."""
+    pid = os.getpid()
+    REGISTRY.set("process_resident_memory_bytes", read_rss(pid))
+    # geckodriver and firefox are the only children of this process
+    REGISTRY.set("sgcc_browser_resident_memory_bytes", tree_rss(pid, include_self=False))
+    return REGISTRY.render()
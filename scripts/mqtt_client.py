@@ -0,0 +1,169 @@
+"""
+Minimal MQTT 3.1.1 client over the standard library.
+
+Supports what the publisher needs: CONNECT with optional credentials,
+retained PUBLISH with QoS 0/1, keep-alive pings and a clean DISCONNECT.
+QoS 1 publishes are tracked until the broker acknowledges them, see
+wait_for_acks().
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 0x10, 0x20, 0x30, 0x40
+PINGREQ, PINGRESP, DISCONNECT = 0xC0, 0xD0, 0xE0
+
+
+class MqttError(Exception):
+    pass
+
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(packet_type: int, body: bytes = b"") -> bytes:
+    return bytes([packet_type]) + encode_length(len(body)) + body
+
+
+def read_packet(recv_exact):
+    """Read one packet with recv_exact(n) -> bytes, return (first header byte, body)."""
+    first = recv_exact(1)[0]
+    length, multiplier = 0, 1
+    while True:
+        byte = recv_exact(1)[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    return first, recv_exact(length) if length else b""
+
+
+class MqttClient:
+
+    def __init__(self, host: str, port: int = 1883, client_id: str = "sgcc_electricity",
+                 username: str = "", password: str = "", keepalive: int = 60, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._acked = threading.Condition()
+        self._in_flight = set()
+        self._next_packet_id = 1
+        self._reader = None
+        self._closed = threading.Event()
+        self._error = None
+
+    def connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        flags = 0x02  # clean session
+        payload = encode_string(self.client_id)
+        if self.username:
+            flags |= 0x80
+            payload += encode_string(self.username)
+            if self.password:
+                flags |= 0x40
+                payload += encode_string(self.password)
+        body = encode_string("MQTT") + bytes([4, flags]) + struct.pack("!H", self.keepalive) + payload
+        self._sock.sendall(packet(CONNECT, body))
+        first, body = read_packet(self._recv_exact)
+        if first & 0xF0 != CONNACK or len(body) < 2 or body[1] != 0:
+            self._sock.close()
+            raise MqttError(f"MQTT connection refused, return code {body[1] if len(body) > 1 else 'unknown'}")
+        self._sock.settimeout(self.keepalive / 2)
+        self._reader = threading.Thread(target=self._read_loop, name="mqtt-reader", daemon=True)
+        self._reader.start()
+        return self
+
+    def publish(self, topic: str, payload, qos: int = 1, retain: bool = True):
+        if self._error is not None:
+            raise MqttError(f"MQTT connection lost: {self._error}")
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        body = encode_string(topic)
+        if qos:
+            with self._acked:
+                packet_id = self._next_packet_id
+                self._next_packet_id = packet_id % 65535 + 1
+                self._in_flight.add(packet_id)
+            body += struct.pack("!H", packet_id)
+        header = PUBLISH | (qos << 1) | (1 if retain else 0)
+        with self._send_lock:
+            self._sock.sendall(packet(header, body + payload))
+
+    def wait_for_acks(self, timeout: float = None) -> bool:
+        """Block until every QoS 1 publish was acknowledged, False on timeout or lost connection."""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        with self._acked:
+            while self._in_flight and self._error is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._acked.wait(remaining)
+            return not self._in_flight
+
+    def disconnect(self):
+        if self._sock is None:
+            return
+        self._closed.set()
+        try:
+            with self._send_lock:
+                self._sock.sendall(packet(DISCONNECT))
+        except OSError:
+            pass
+        self._sock.close()
+        self._sock = None
+
+    def _read_loop(self):
+        while not self._closed.is_set():
+            try:
+                first, body = read_packet(self._recv_exact)
+            except socket.timeout:
+                try:
+                    with self._send_lock:
+                        self._sock.sendall(packet(PINGREQ))
+                except OSError as e:
+                    self._fail(e)
+                    return
+                continue
+            except (OSError, MqttError, IndexError) as e:
+                if not self._closed.is_set():
+                    self._fail(e)
+                return
+            if first & 0xF0 == PUBACK:
+                with self._acked:
+                    self._in_flight.discard(struct.unpack("!H", body[:2])[0])
+                    self._acked.notify_all()
+
+    def _fail(self, error):
+        logging.error("MQTT connection to %s:%s lost: %s", self.host, self.port, error)
+        with self._acked:
+            self._error = error
+            self._acked.notify_all()
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise MqttError("connection closed by broker")
+            data += chunk
+        return data
@@ -0,0 +1,158 @@
+"""
+Low-balance notifications.
+
+check() collects the users whose balance is below the threshold during a run,
+send() delivers one message covering all of them in the background, so a slow
+or broken endpoint never delays the sensor updates. A persisted state
+remembers the balance each user was alerted at: the same balance is not
+alerted again, a lower one only after NOTIFY_REPEAT_HOURS, and the state is
+cleared once the balance is back above the threshold.
+
+Channels (every configured one is used):
+- pushplus: PUSHPLUS_TOKEN, comma separated, sent in the POST body (PUSHPLUS_URL to use another endpoint)
+- webhook:  NOTIFY_WEBHOOK_URL, receives {"title", "content", "users"} as JSON
+- hass:     NOTIFY_HASS_PERSISTENT=true, a persistent notification in Home Assistant
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from const import DATA_DIR
+from state_cache import load_json_state, save_json_state
+
+PUSHPLUS_URL = "https://www.pushplus.plus/send"
+TITLE = "电费余额不足提醒"
+
+
+class PushPlusChannel:
+    name = "pushplus"
+
+    def __init__(self, tokens, url: str = PUSHPLUS_URL):
+        self.tokens = tokens
+        self.url = url
+
+    def send(self, session, title: str, content: str, users: dict, timeout):
+        for token in self.tokens:
+            response = session.post(
+                self.url, json={"token": token, "title": title, "content": content, "template": "txt"}, timeout=timeout
+            )
+            response.raise_for_status()
+
+
+class WebhookChannel:
+    name = "webhook"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def send(self, session, title: str, content: str, users: dict, timeout):
+        session.post(self.url, json={"title": title, "content": content, "users": users}, timeout=timeout).raise_for_status()
+
+
+class HassPersistentChannel:
+    name = "hass"
+
+    def __init__(self, base_url: str, token: str):
+        self.base_url = base_url
+        self.token = token
+
+    def send(self, session, title: str, content: str, users: dict, timeout):
+        session.post(
+            self.base_url + "/api/services/persistent_notification/create",
+            json={"title": title, "message": content, "notification_id": "sgcc_electricity_low_balance"},
+            headers={"Authorization": "Bearer " + self.token},
+            timeout=timeout,
+        ).raise_for_status()
+
+
+class BalanceNotifier:
+
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="balance-notify")
+
+    @classmethod
+    def from_settings(cls, settings):
+        channels = []
+        if settings.PUSHPLUS_TOKEN:
+            channels.append(PushPlusChannel(list(settings.PUSHPLUS_TOKEN), settings.PUSHPLUS_URL or PUSHPLUS_URL))
+        if settings.NOTIFY_WEBHOOK_URL:
+            channels.append(WebhookChannel(settings.NOTIFY_WEBHOOK_URL))
+        if settings.NOTIFY_HASS_PERSISTENT:
+            channels.append(HassPersistentChannel(settings.hass_base_url, settings.HASS_TOKEN))
+        return cls(
+            channels,
+            settings.BALANCE,
+            os.path.join(DATA_DIR, settings.NOTIFY_STATE_FILE),
+            repeat_seconds=settings.NOTIFY_REPEAT_HOURS * 3600,
+            timeout=(settings.NOTIFY_CONNECT_TIMEOUT, settings.NOTIFY_READ_TIMEOUT),
+        )
+
+    def __init__(self, channels, threshold: float, state_path: str, repeat_seconds: float = 24 * 3600, timeout=(5, 10)):
+        self.channels = channels
+        self.threshold = threshold
+        self.state_path = state_path
+        self.repeat_seconds = repeat_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._due = {}  # user_id -> balance to alert in this run
+        self._alerted = load_json_state(state_path, "balance notification state")
+
+    def check(self, user_id: str, balance: float):
+        """Remember user_id for this run's message if its balance is low and not alerted yet."""
+        with self._lock:
+            alerted = self._alerted.get(user_id)
+            if balance >= self.threshold:
+                if alerted is not None:
+                    logging.info("The balance of user id %s is back to %s CNY, low-balance alert cleared.", user_id, balance)
+                    del self._alerted[user_id]
+                    self._save()
+                return
+            if alerted is not None and (
+                balance >= alerted["balance"] or time.time() - alerted["sent_at"] < self.repeat_seconds
+            ):
+                logging.info("The balance of user id %s is %s CNY, already alerted at %s CNY.", user_id, balance, alerted['balance'])
+                return
+            self._due[user_id] = balance
+
+    def send(self):
+        """Deliver one message for all low-balance users of this run in the background, returns the future or None."""
+        with self._lock:
+            users, self._due = self._due, {}
+        if not users:
+            return None
+        if not self.channels:
+            logging.warning("Balance of user ids %s is below %s CNY, but no notification channel is configured.", ', '.join(users), self.threshold)
+            return None
+        return self._executor.submit(self._deliver, users)
+
+    # private methods below
+
+    def _deliver(self, users: dict):
+        import requests
+
+        content = "\n".join(f"您用户号{user_id}的当前电费余额为：{balance}元，请及时充值。" for user_id, balance in users.items())
+        delivered = False
+        with requests.Session() as session:
+            for channel in self.channels:
+                try:
+                    channel.send(session, TITLE, content, users, self.timeout)
+                    delivered = True
+                    metrics.inc("sgcc_notifications_total", channel=channel.name, result="success")
+                except Exception as e:
+                    metrics.inc("sgcc_notifications_total", channel=channel.name, result="failure")
+                    logging.error("Low-balance notification over %s failed: %s", channel.name, e)
+        if not delivered:
+            return False
+        with self._lock:
+            now = time.time()
+            for user_id, balance in users.items():
+                self._alerted[user_id] = {"balance": balance, "sent_at": now}
+            self._save()
+        logging.info("Low-balance notice sent for user ids %s, threshold %s CNY.", ', '.join(users), self.threshold)
+        return True
+
+    def _save(self):
+        save_json_state(self.state_path, self._alerted, "balance notification state")
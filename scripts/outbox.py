@@ -0,0 +1,252 @@
+"""
+Durable outbox for Home Assistant state updates.
+
+Every update is first written to an SQLite table keyed by entity id, so a newer
+value for the same entity replaces (coalesces) the pending one. replay() posts
+all due entries over one pooled session and deletes them once HA accepted
+them. Failed entries back off exponentially and are retried by later runs or
+by the background replayer started from main.py, so readings survive an HA
+restart or outage instead of being lost until the next scheduled run.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import settings as config
+from const import API_PATH, DATA_DIR
+
+
+class Outbox:
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """Process wide outbox configured from the current settings."""
+        if cls._instance is None:
+            settings = config.current()
+            cls._instance = cls(
+                os.path.join(DATA_DIR, settings.HASS_OUTBOX_FILE),
+                settings.hass_base_url,
+                settings.HASS_TOKEN,
+                **cls._options(settings),
+            )
+        return cls._instance
+
+    @staticmethod
+    def _options(settings) -> dict:
+        return {
+            "concurrency": settings.HASS_PUBLISH_CONCURRENCY,
+            "timeout": (settings.HASS_CONNECT_TIMEOUT, settings.HASS_READ_TIMEOUT),
+            "backoff_base": settings.HASS_OUTBOX_BACKOFF_SECONDS,
+            "backoff_max": settings.HASS_OUTBOX_BACKOFF_MAX_SECONDS,
+            "max_age_seconds": settings.HASS_OUTBOX_MAX_AGE_HOURS * 3600,
+        }
+
+    def __init__(self, path: str, base_url: str, token: str, concurrency: int = 4, timeout=(5, 10),
+                 backoff_base: float = 30, backoff_max: float = 3600, max_age_seconds: float = 72 * 3600):
+        self.path = path
+        self.base_url = base_url
+        self.token = token
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_age_seconds = max_age_seconds
+        self.on_delivered = None  # callback(entity_id, fingerprint)
+        self._db_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._session = None
+        self._executor = None
+        self._replayer = None
+        self._stop = threading.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                entity_id TEXT PRIMARY KEY NOT NULL,
+                body TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                next_attempt_at REAL NOT NULL)"""
+        )
+        self._update_gauges()
+
+    def put(self, entity_id: str, body: dict, fingerprint: str = ""):
+        """Queue an update, replacing any pending update of the same entity; its age starts again, its backoff is kept."""
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                """INSERT INTO outbox VALUES (?, ?, ?, 1, ?, 0, ?)
+                ON CONFLICT(entity_id) DO UPDATE SET
+                    body = excluded.body,
+                    fingerprint = excluded.fingerprint,
+                    version = version + 1,
+                    enqueued_at = excluded.enqueued_at""",
+                (entity_id, json.dumps(body, ensure_ascii=False), fingerprint, now, now),
+            )
+        self._update_gauges()
+
+    def depth(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def oldest_age(self) -> float:
+        with self._db_lock:
+            oldest = self._db.execute("SELECT MIN(enqueued_at) FROM outbox").fetchone()[0]
+        return time.time() - oldest if oldest else 0.0
+
+    def replay(self, block: bool = True):
+        """
+        Deliver every due entry. Returns (delivered, failed), or None when another
+        replay is running and block is False.
+        """
+        if not self._replay_lock.acquire(blocking=block):
+            return None
+        delivered = failed = 0
+        try:
+            self._expire()
+            while True:
+                rows = self._due_rows()
+                if not rows:
+                    break
+                results = list(self._get_executor().map(self._deliver, rows))
+                delivered += results.count(True)
+                failed += results.count(False)
+                if False in results:
+                    # HA is probably down: back off everything that is due and stop this pass
+                    self._backoff_due()
+                    break
+        finally:
+            self._replay_lock.release()
+            self._update_gauges()
+        if failed:
+            logging.warning("Homeassistant outbox: %s updates delivered, %s failed, %s pending.", delivered, failed, self.depth())
+        elif delivered:
+            logging.debug("Homeassistant outbox: %s updates delivered.", delivered)
+        return delivered, failed
+
+    def start_replayer(self, interval: float = 60):
+        """Retry pending updates in the background between scheduled runs."""
+        if self._replayer is None:
+            self._replayer = threading.Thread(target=self._replay_loop, args=(interval,), name="ha-outbox", daemon=True)
+            self._replayer.start()
+
+    def configure(self, settings):
+        """Apply reloaded settings; pending entries are kept and sent with the new URL and token."""
+        with self._replay_lock:
+            self.base_url = settings.hass_base_url
+            self.token = settings.HASS_TOKEN
+            for name, value in self._options(settings).items():
+                setattr(self, name, value)
+            # 会话和线程池带有旧的令牌和并发数，下次推送时重新创建
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def close(self):
+        self._stop.set()
+        if self._replayer is not None:
+            self._replayer.join()
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._session is not None:
+            self._session.close()
+        with self._db_lock:
+            self._db.close()
+
+    # private methods below
+
+    def _replay_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.replay(block=False)
+            except Exception as e:
+                logging.error("Homeassistant outbox replay failed: %s", e)
+
+    def _get_executor(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._session = requests.Session()
+            self._session.headers.update({
+                "Content-Type": "application/json",
+                "Authorization": "Bearer " + self.token,
+            })
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ha-publish")
+        return self._executor
+
+    def _due_rows(self, limit: int = 100):
+        with self._db_lock:
+            return self._db.execute(
+                """SELECT entity_id, body, fingerprint, version, enqueued_at FROM outbox
+                WHERE next_attempt_at <= ? ORDER BY enqueued_at LIMIT ?""",
+                (time.time(), limit),
+            ).fetchall()
+
+    def _deliver(self, row) -> bool:
+        entity_id, body, fingerprint, version, enqueued_at = row
+        url = self.base_url + API_PATH + entity_id  # /api/states/<entity_id>
+        try:
+            response = self._session.post(url, data=body.encode("utf-8"), timeout=self.timeout)
+            logging.debug(
+                "Homeassistant REST API invoke, POST on %s. response[%s]: %s", url, response.status_code, response.content
+            )
+        except Exception as e:
+            metrics.inc("sgcc_ha_push_total", result="failure")
+            logging.error("Homeassistant REST API invoke failed, reason is %s", e)
+            return False
+        if not response.ok:
+            metrics.inc("sgcc_ha_push_total", result="failure")
+            logging.error("Homeassistant REST API invoke failed, POST on %s returned %s", url, response.status_code)
+            return False
+        metrics.inc("sgcc_ha_push_total", result="success")
+        metrics.REGISTRY.observe("sgcc_ha_outbox_delivery_lag_seconds", time.time() - enqueued_at)
+        with self._db_lock:
+            # a newer value queued meanwhile stays pending
+            self._db.execute("DELETE FROM outbox WHERE entity_id = ? AND version = ?", (entity_id, version))
+        if self.on_delivered is not None:
+            self.on_delivered(entity_id, fingerprint)
+        return True
+
+    def _backoff_due(self):
+        now = time.time()
+        with self._db_lock:
+            rows = self._db.execute("SELECT entity_id, attempts FROM outbox WHERE next_attempt_at <= ?", (now,)).fetchall()
+            self._db.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE entity_id = ?",
+                [
+                    (attempts + 1, now + min(self.backoff_base * 2 ** attempts, self.backoff_max), entity_id)
+                    for entity_id, attempts in rows
+                ],
+            )
+
+    def _expire(self):
+        if self.max_age_seconds <= 0:
+            return
+        with self._db_lock:
+            expired = self._db.execute(
+                "DELETE FROM outbox WHERE enqueued_at < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+        if expired:
+            logging.warning("Homeassistant outbox: dropped %s updates older than %.0f hours.", expired, self.max_age_seconds / 3600)
+
+    def _update_gauges(self):
+        metrics.set_gauge("sgcc_ha_outbox_depth", self.depth())
+        metrics.set_gauge("sgcc_ha_outbox_oldest_age_seconds", self.oldest_age())
@@ -0,0 +1,195 @@
+"""
+Human-like pacing of the browser actions watched by the site's risk control.
+
+DataFetcher calls Pacer.pace(kind) right before each paced action and
+Pacer.mark() once the browser is idle again, after a click, a page load or a
+wait. The think time of the kind is drawn from the delay profile and counted
+from the last mark, so side work done in between (captcha inference, database
+writes, pushing to Home Assistant) is part of it and only the remainder is
+slept; page loads and waits are not. A token bucket (PACING_ACTIONS_PER_MINUTE, PACING_BURST) also caps the rate of
+paced actions over longer stretches.
+
+PACING_PROFILE selects the delays, "page" and "user" scale with
+RETRY_WAIT_TIME_OFFSET_UNIT:
+- normal: the delays of the former fixed sleeps, randomized around them
+- cautious: about twice as long
+- fast: short delays, for replays against fake_sgcc.py
+- off: no think time and no token bucket
+PACING_DELAYS overrides single kinds in seconds, e.g. "click=0.8-1.6,user=10-20",
+and is validated with the other settings.
+
+    python3 pacing.py --profile cautious --users 3
+
+prints the delays of a profile and the pacing expected for one fetch.
+"""
+
+import argparse
+import logging
+import random
+import time
+
+import metrics
+
+# kind -> before which action
+KINDS = {
+    "click": "each step of the login form",
+    "type": "typing the password after the account",
+    "slide": "dragging the captcha slider",
+    "page": "opening the usage page of a user",
+    "user": "switching to the next user",
+}
+
+
+def profile_delays(profile: str, unit: float) -> dict:
+    """(low, high) seconds of each kind in a profile, unit is RETRY_WAIT_TIME_OFFSET_UNIT."""
+    if profile == "off":
+        return {kind: (0.0, 0.0) for kind in KINDS}
+    if profile == "fast":
+        return {"click": (0.1, 0.3), "type": (0.05, 0.2), "slide": (0.0, 0.2), "page": (0.0, 0.5), "user": (0.0, 0.5)}
+    scale = 2.0 if profile == "cautious" else 1.0
+    return {
+        "click": (0.7 * scale, 1.5 * scale),
+        "type": (0.3 * scale, 0.8 * scale),
+        "slide": (0.5 * scale, 1.2 * scale),
+        "page": (0.8 * unit * scale, 1.3 * unit * scale),
+        "user": (0.8 * unit * scale, 1.3 * unit * scale),
+    }
+
+
+def parse_delays(items) -> dict:
+    """Parse PACING_DELAYS entries like "click=0.8-1.6" or "user=12"."""
+    delays = {}
+    for item in items:
+        kind, _, value = item.partition("=")
+        kind = kind.strip().lower()
+        if kind not in KINDS:
+            raise ValueError(f"unknown pacing kind {kind!r}, expected one of {', '.join(KINDS)}")
+        low, _, high = value.partition("-")
+        try:
+            low = float(low)
+            high = float(high) if high else low
+        except ValueError:
+            raise ValueError(f"pacing delay of {kind} must be seconds or low-high, got {value!r}") from None
+        if low < 0 or high < low:
+            raise ValueError(f"pacing delay of {kind} must satisfy 0 <= low <= high, got {value!r}")
+        delays[kind] = (low, high)
+    return delays
+
+
+def mean_delay(low: float, high: float) -> float:
+    return (low + high + _mode(low, high)) / 3
+
+
+def _mode(low: float, high: float) -> float:
+    # 人的反应时间偏向短的一端，偶尔较长
+    return low + (high - low) / 4
+
+
+class TokenBucket:
+    """At most `burst` actions at once, refilled at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, burst: int, now: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self._updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class Pacer:
+
+    @classmethod
+    def from_settings(cls, settings):
+        delays = profile_delays(settings.PACING_PROFILE, settings.RETRY_WAIT_TIME_OFFSET_UNIT)
+        # 已在加载设置时校验过
+        delays.update(parse_delays(settings.PACING_DELAYS))
+        rate = 0 if settings.PACING_PROFILE == "off" else settings.PACING_ACTIONS_PER_MINUTE
+        return cls(delays, rate, settings.PACING_BURST)
+
+    def __init__(self, delays: dict, actions_per_minute: float = 0, burst: int = 1,
+                 rng: random.Random = None, clock=time.monotonic, sleep=time.sleep):
+        self.delays = delays
+        self._random = rng or random.Random()
+        self._clock = clock
+        self._sleep = sleep
+        self._bucket = TokenBucket(actions_per_minute, burst, clock()) if actions_per_minute > 0 else None
+        self._last = None
+        # 本次运行的统计，见 DataFetcher.fetch
+        self.actions = 0
+        self.slept = 0.0
+        self.overlapped = 0.0
+
+    def think_time(self, kind: str) -> float:
+        low, high = self.delays.get(kind, (0.0, 0.0))
+        if high <= 0:
+            return 0.0
+        return self._random.triangular(low, high, _mode(low, high))
+
+    def mark(self):
+        """The browser is idle from now on, the think time of the next action is counted from here."""
+        self._last = self._clock()
+
+    def pace(self, kind: str):
+        """Wait what is left of the think time of `kind` and of the rate limit, then record the action."""
+        think = self.think_time(kind)
+        now = self._clock()
+        elapsed = now - self._last if self._last is not None else 0.0
+        wait = max(0.0, think - elapsed)
+        if self._bucket is not None:
+            wait = max(wait, self._bucket.delay(now))
+        if wait > 0:
+            self._sleep(wait)
+        overlapped = min(think, elapsed)
+        self._last = self._clock()
+        if self._bucket is not None:
+            self._bucket.take(self._last)
+        self.actions += 1
+        self.slept += wait
+        self.overlapped += overlapped
+        metrics.inc("sgcc_pacing_seconds_total", wait, kind=kind)
+        if overlapped > 0:
+            metrics.inc("sgcc_pacing_overlap_seconds_total", overlapped, kind=kind)
+        logging.debug("Paced %s: think time %.2fs, slept %.2fs.", kind, think, wait)
+        return wait
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Delays of a pacing profile")
+    parser.add_argument("--profile", choices=["normal", "cautious", "fast", "off"], default=None,
+                        help="default PACING_PROFILE of the current settings")
+    parser.add_argument("--unit", type=float, default=None, help="default RETRY_WAIT_TIME_OFFSET_UNIT of the current settings")
+    parser.add_argument("--users", type=int, default=1, help="users fetched in one run")
+    args = parser.parse_args()
+    import settings as config
+
+    settings = config.current()
+    profile = args.profile or settings.PACING_PROFILE
+    unit = settings.RETRY_WAIT_TIME_OFFSET_UNIT if args.unit is None else args.unit
+    delays = profile_delays(profile, unit)
+    delays.update(parse_delays(settings.PACING_DELAYS))
+    print(f"profile {profile}, RETRY_WAIT_TIME_OFFSET_UNIT={unit:g}")
+    for kind, description in KINDS.items():
+        low, high = delays[kind]
+        print(f"  {kind:<6} {low:6.2f} - {high:6.2f}s, mean {mean_delay(low, high):6.2f}s  before {description}")
+    # 登录：切换账号登录、同意协议、输入账号、点击登录各一次 click，输入密码一次 type，滑动一次；
+    # 每个户号打开一次用电量页面，第二个户号起切换前再等待一次
+    login = 4 * mean_delay(*delays["click"]) + mean_delay(*delays["type"]) + mean_delay(*delays["slide"])
+    users = args.users * mean_delay(*delays["page"]) + max(0, args.users - 1) * mean_delay(*delays["user"])
+    print(f"expected think time: login {login:.1f}s, {users:.1f}s for {args.users} users, "
+          f"{login + users:.1f}s in total (before overlap with other work)")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,157 @@
+"""
+Records the pages DataFetcher visits, so they can be replayed by fake_sgcc.py.
+
+    RECORD_DIR=recordings/20240520 python3 main.py
+    python3 fake_sgcc.py record --dir recordings/20240520
+
+A recording directory contains:
+- recording.json   the values read for every user (balance, yearly, monthly and
+                   daily rows), the replay server builds its pages from these
+- pages/*.html     the rendered DOM at every step, to compare with the replay
+                   templates when the site changes
+- xhr/*.json       XHR and fetch responses seen since the previous step; the hook
+                   is injected after each page load, so requests made while the
+                   page loads are not included
+- assets/          same-origin scripts and stylesheets of the visited pages
+- captcha/*.png    the slide captcha backgrounds
+The files contain the account data of the recorded users, keep them private.
+"""
+
+import base64
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from urllib.parse import urlparse
+
+# wraps XMLHttpRequest and fetch once per page, responses are collected in window.__sgccRecorded
+HOOK_JS = """
+if (!window.__sgccRecorded) {
+  window.__sgccRecorded = [];
+  const push = (entry) => window.__sgccRecorded.push(entry);
+  const open = XMLHttpRequest.prototype.open;
+  XMLHttpRequest.prototype.open = function (method, url) {
+    this.__sgcc = {method: method, url: String(url)};
+    return open.apply(this, arguments);
+  };
+  const send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function (body) {
+    const info = this.__sgcc || {};
+    this.addEventListener("loadend", () => {
+      let response = null;
+      try { response = this.responseText; } catch (e) {}
+      push({type: "xhr", method: info.method, url: info.url, status: this.status,
+            request: typeof body === "string" ? body : null, response: response});
+    });
+    return send.apply(this, arguments);
+  };
+  const nativeFetch = window.fetch;
+  window.fetch = function (input, init) {
+    const url = String(input && input.url ? input.url : input);
+    return nativeFetch.apply(this, arguments).then((res) => {
+      res.clone().text().then((text) => push({type: "fetch", method: (init && init.method) || "GET", url: url,
+                                              status: res.status, request: null, response: text}));
+      return res;
+    });
+  };
+}
+"""
+
+DRAIN_JS = "const recorded = window.__sgccRecorded || []; window.__sgccRecorded = []; return recorded;"
+
+RESOURCES_JS = """
+return performance.getEntriesByType("resource")
+  .filter((entry) => entry.initiatorType === "script" || entry.initiatorType === "link" || entry.initiatorType === "css")
+  .map((entry) => entry.name);
+"""
+
+
+class PageRecorder:
+
+    @classmethod
+    def from_env(cls):
+        root = os.getenv("RECORD_DIR")
+        return cls(root) if root else None
+
+    def __init__(self, root: str):
+        self.root = root
+        self.users = {}
+        self._steps = 0
+        self._captchas = 0
+        self._assets = set()
+        for directory in ("pages", "xhr", "assets", "captcha"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        logging.info("Recording the visited pages to %s.", root)
+
+    def capture(self, driver, name: str):
+        """Save the DOM, the responses since the last capture and the page assets; never raises."""
+        self._steps += 1
+        prefix = f"{self._steps:02d}_" + re.sub(r"[^\w.-]", "_", name)
+        try:
+            with open(os.path.join(self.root, "pages", prefix + ".html"), "w", encoding="utf-8") as f:
+                f.write(driver.page_source)
+            recorded = driver.execute_script(DRAIN_JS)
+            if recorded:
+                with open(os.path.join(self.root, "xhr", prefix + ".json"), "w", encoding="utf-8") as f:
+                    json.dump(recorded, f, ensure_ascii=False, indent=2)
+            self._save_assets(driver)
+            driver.execute_script(HOOK_JS)
+        except Exception as e:
+            logging.warning("Failed to record page %s: %s", name, e)
+
+    def save_captcha(self, data_url: str):
+        self._captchas += 1
+        path = os.path.join(self.root, "captcha", f"{self._captchas}.png")
+        try:
+            with open(path, "wb") as f:
+                f.write(base64.b64decode(data_url.split(",", 1)[1]))
+        except Exception as e:
+            logging.warning("Failed to record the captcha image: %s", e)
+
+    def add_user(self, user_id, balance, yearly_usage, yearly_charge, months, month_usage, month_charge, days, day_usage):
+        self.users[user_id] = {
+            "user_id": user_id,
+            "balance": balance,
+            "yearly_usage": yearly_usage,
+            "yearly_charge": yearly_charge,
+            "months": [list(row) for row in zip(months or [], month_usage or [], month_charge or [])],
+            "days": [list(row) for row in zip(days or [], day_usage or [])],
+        }
+
+    def close(self):
+        path = os.path.join(self.root, "recording.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "recorded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "users": list(self.users.values()),
+            }, f, ensure_ascii=False, indent=2)
+        logging.info("Recorded %s users and %s pages to %s.", len(self.users), self._steps, self.root)
+
+    def _save_assets(self, driver):
+        import requests
+
+        page_host = urlparse(driver.current_url).netloc
+        urls = [url for url in driver.execute_script(RESOURCES_JS) if url not in self._assets]
+        urls = [url for url in urls if urlparse(url).netloc == page_host]
+        if not urls:
+            return
+        session = requests.Session()
+        for cookie in driver.get_cookies():
+            session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"))
+        for url in urls:
+            self._assets.add(url)
+            parsed = urlparse(url)
+            assets_dir = os.path.normpath(os.path.join(self.root, "assets"))
+            path = os.path.normpath(os.path.join(assets_dir, parsed.netloc, parsed.path.lstrip("/")))
+            if parsed.path.endswith("/") or not path.startswith(assets_dir + os.sep):
+                continue
+            try:
+                response = session.get(url, timeout=10)
+                response.raise_for_status()
+            except Exception as e:
+                logging.debug("Failed to record asset %s: %s", url, e)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(response.content)
@@ -0,0 +1,70 @@
+"""
+Values of the last full fetch of each user, used by the "anything new?" probe.
+
+After login DataFetcher reads only the balance and the latest daily row of a
+user. When both equal the last full fetch, and that fetch is younger than
+FULL_REFRESH_HOURS, the yearly, monthly and daily usage sections are not
+loaded and their values are taken from here. 0 disables the probe.
+"""
+
+import os
+import time
+
+from const import DATA_DIR
+from state_cache import load_json_state, save_json_state
+
+FIELDS = (
+    "balance",
+    "last_daily_date",
+    "last_daily_usage",
+    "yearly_charge",
+    "yearly_usage",
+    "month_charge",
+    "month_usage",
+)
+
+
+class ProbeCache:
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            os.path.join(DATA_DIR, settings.PROBE_CACHE_FILE),
+            settings.FULL_REFRESH_HOURS * 3600,
+        )
+
+    def __init__(self, path: str, full_refresh_seconds: float):
+        self.path = path
+        self.full_refresh_seconds = full_refresh_seconds
+        self._entries = load_json_state(path, "probe cache")
+        self._dirty = False
+
+    def unchanged(self, user_id: str, balance, last_daily_date, last_daily_usage):
+        """The cached values when the probed ones did not change and no full refresh is due, else None."""
+        entry = self._entries.get(user_id)
+        if (
+            self.full_refresh_seconds <= 0
+            or entry is None
+            or balance is None
+            or last_daily_usage is None
+            or time.time() - entry["fetched_at"] >= self.full_refresh_seconds
+        ):
+            return None
+        values = entry["values"]
+        probed = (balance, last_daily_date, last_daily_usage)
+        if probed != (values["balance"], values["last_daily_date"], values["last_daily_usage"]):
+            return None
+        return values
+
+    def remember(self, user_id: str, values: tuple):
+        """Keep the result of a full fetch, in the order of FIELDS."""
+        if values[0] is None or values[2] is None:
+            return
+        self._entries[user_id] = {"fetched_at": time.time(), "values": dict(zip(FIELDS, values))}
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        if save_json_state(self.path, self._entries, "probe cache"):
+            self._dirty = False
@@ -0,0 +1,195 @@
+"""
+Delivery backends for the sensor states built by SensorUpdator.
+
+- rest: POST /api/states through the durable outbox (default), see outbox.py
+- mqtt: MQTT discovery; a retained config per sensor is announced once, states
+  and attributes are retained messages, all users share one connection per run
+
+Select with HASS_PUBLISHER=rest|mqtt.
+"""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from mqtt_client import MqttClient, MqttError
+from outbox import Outbox
+
+# attributes that belong to the discovery config rather than to every state message
+DISCOVERY_ATTRIBUTES = ("unit_of_measurement", "icon", "device_class", "state_class")
+
+
+class Publisher(ABC):
+    """Interface of a backend: publish() queues, kick() starts delivery, flush() waits for it."""
+
+    on_delivered = None  # callback(entity_id, fingerprint)
+
+    @abstractmethod
+    def publish(self, entity_id: str, body: dict, fingerprint: str):
+        """Queue one sensor state; on_delivered is called once the backend accepted it."""
+
+    def kick(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def pending(self) -> int:
+        return 0
+
+    def close(self):
+        self.flush()
+
+
+class RestPublisher(Publisher):
+
+    def __init__(self, on_delivered=None):
+        self.on_delivered = on_delivered
+        self.outbox = Outbox.instance()
+        self.outbox.on_delivered = on_delivered
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ha-outbox-kick")
+        self._pending = None
+
+    def publish(self, entity_id: str, body: dict, fingerprint: str):
+        self.outbox.put(entity_id, body, fingerprint)
+
+    def kick(self):
+        """Deliver the outbox in the background without blocking the next user."""
+        if self._pending is None or self._pending.done():
+            self._pending = self._executor.submit(self.outbox.replay, False)
+
+    def flush(self):
+        if self._pending is not None:
+            self._pending.result()
+        self.outbox.replay()
+
+    def pending(self) -> int:
+        return self.outbox.depth()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+        self.outbox.on_delivered = None
+
+
+class MqttPublisher(Publisher):
+
+    @classmethod
+    def from_settings(cls, settings, on_delivered=None, discovery_cache=None):
+        return cls(
+            MqttClient(
+                settings.MQTT_HOST,
+                settings.MQTT_PORT,
+                client_id=settings.MQTT_CLIENT_ID,
+                username=settings.MQTT_USERNAME,
+                password=settings.MQTT_PASSWORD,
+            ),
+            discovery_prefix=settings.MQTT_DISCOVERY_PREFIX,
+            base_topic=settings.MQTT_BASE_TOPIC,
+            on_delivered=on_delivered,
+            discovery_cache=discovery_cache,
+        )
+
+    def __init__(self, client: MqttClient, discovery_prefix: str = "homeassistant",
+                 base_topic: str = "sgcc_electricity", on_delivered=None, discovery_cache=None):
+        self.client = client
+        self.discovery_prefix = discovery_prefix
+        self.base_topic = base_topic
+        self.on_delivered = on_delivered
+        # StateCache remembering the announced configs, so they are published once
+        self.discovery_cache = discovery_cache
+        self._connected = False
+        # 本次运行中连接失败后不再重试，避免每个传感器都等待一次连接超时
+        self._unavailable = False
+        self._unacked = []  # (entity_id, fingerprint) waiting for the broker's PUBACK
+        self._announced = []
+
+    def publish(self, entity_id: str, body: dict, fingerprint: str):
+        object_id = entity_id.split(".", 1)[-1]
+        attributes = dict(body.get("attributes", {}))
+        config = self.discovery_config(object_id, attributes)
+        config_fingerprint = json.dumps(config, sort_keys=True)
+        try:
+            self._connect()
+            if self.discovery_cache is None or self.discovery_cache.should_send(f"mqtt:{object_id}", config_fingerprint, count=False):
+                self.client.publish(f"{self.discovery_prefix}/sensor/{object_id}/config", json.dumps(config, ensure_ascii=False))
+                self._announced.append((f"mqtt:{object_id}", config_fingerprint))
+            for key in DISCOVERY_ATTRIBUTES:
+                attributes.pop(key, None)
+            self.client.publish(f"{self.base_topic}/{object_id}/state", str(body.get("state")))
+            self.client.publish(f"{self.base_topic}/{object_id}/attributes", json.dumps(attributes, ensure_ascii=False, default=str))
+            self._unacked.append((entity_id, fingerprint))
+        except (OSError, MqttError) as e:
+            metrics.inc("sgcc_ha_push_total", result="failure")
+            if self._unavailable:
+                logging.debug("MQTT broker unavailable, %s will be sent again next run.", entity_id)
+            else:
+                logging.error("MQTT publish of %s failed, it will be sent again next run: %s", entity_id, e)
+
+    def discovery_config(self, object_id: str, attributes: dict) -> dict:
+        user_postfix = object_id.rsplit("_", 1)[-1]
+        config = {
+            "name": object_id,
+            "object_id": object_id,
+            "unique_id": f"{self.base_topic}_{object_id}",
+            "state_topic": f"{self.base_topic}/{object_id}/state",
+            "json_attributes_topic": f"{self.base_topic}/{object_id}/attributes",
+            "device": {
+                "identifiers": [f"{self.base_topic}_{user_postfix}"],
+                "name": f"国家电网 {user_postfix}",
+                "manufacturer": "State Grid",
+            },
+        }
+        for key in DISCOVERY_ATTRIBUTES:
+            if key in attributes:
+                config[key] = attributes[key]
+        return config
+
+    def flush(self):
+        if not self._unacked and not self._announced:
+            return
+        delivered = self.client.wait_for_acks()
+        if delivered:
+            for entity_id, fingerprint in self._unacked:
+                metrics.inc("sgcc_ha_push_total", result="success")
+                if self.on_delivered is not None:
+                    self.on_delivered(entity_id, fingerprint)
+            if self.discovery_cache is not None:
+                for key, config_fingerprint in self._announced:
+                    self.discovery_cache.mark_sent(key, config_fingerprint)
+        else:
+            metrics.inc("sgcc_ha_push_total", len(self._unacked), result="failure")
+            logging.error("MQTT broker did not acknowledge %s sensor updates, they will be sent again next run.", len(self._unacked))
+        self._unacked = []
+        self._announced = []
+
+    def close(self):
+        if self._connected:
+            self.flush()
+            self.client.disconnect()
+            self._connected = False
+
+    def _connect(self):
+        if self._connected:
+            return
+        if self._unavailable:
+            raise MqttError("broker unavailable for the rest of this run")
+        try:
+            self.client.connect()
+        except (OSError, MqttError) as e:
+            self._unavailable = True
+            logging.error(
+                "Failed to connect to MQTT broker %s:%s, the updates of this run will be sent next run: %s",
+                self.client.host, self.client.port, e,
+            )
+            raise
+        self._connected = True
+        logging.info("Connected to MQTT broker %s:%s.", self.client.host, self.client.port)
+
+
+def create_publisher(state_cache, settings) -> Publisher:
+    if settings.HASS_PUBLISHER == "mqtt":
+        return MqttPublisher.from_settings(settings, on_delivered=state_cache.mark_sent, discovery_cache=state_cache)
+    return RestPublisher(on_delivered=state_cache.mark_sent)
@@ -0,0 +1,217 @@
+"""
+Retention, archival and compaction of the usage database.
+
+After a fetch run, maintenance runs in a background thread at most every
+DB_MAINTENANCE_HOURS:
+1. daily readings older than DB_RETENTION_DAYS (0 keeps everything) are
+   written to a compressed archive (csv.gz, or parquet with pyarrow) under
+   DB_ARCHIVE_DIR and then deleted; the rollups keep their totals
+2. the file is compacted: converted once to auto_vacuum=INCREMENTAL, then
+   incremental_vacuum, or a full VACUUM when more than DB_VACUUM_FREE_RATIO
+   of the pages are free; ANALYZE and a WAL checkpoint follow
+3. the bytes reclaimed are logged, exported as metrics and kept in the
+   maintenance_runs table
+
+    python3 retention.py run --db homeassistant.db --force
+    python3 retention.py report --db homeassistant.db
+"""
+
+import argparse
+import gzip
+import importlib.util
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import metrics
+from const import DATA_DIR
+from export_history import iter_rows, write_csv, write_parquet
+
+# the site shows up to 30 days; rows inside that window must stay, otherwise
+# they would be inserted again and counted twice in the rollups
+MIN_RETENTION_DAYS = 60
+
+_lock = threading.Lock()
+
+
+class RetentionPolicy:
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            retention_days=settings.DB_RETENTION_DAYS,
+            archive_format=settings.DB_ARCHIVE_FORMAT,
+            archive_dir=settings.DB_ARCHIVE_DIR or os.path.join(DATA_DIR, "archive"),
+            interval_hours=settings.DB_MAINTENANCE_HOURS,
+            vacuum_free_ratio=settings.DB_VACUUM_FREE_RATIO,
+        )
+
+    def __init__(self, retention_days: int = 0, archive_format: str = "csv", archive_dir: str = "archive",
+                 interval_hours: float = 24, vacuum_free_ratio: float = 0.25):
+        if 0 < retention_days < MIN_RETENTION_DAYS:
+            logging.warning("DB_RETENTION_DAYS=%s is below %s, using %s.", retention_days, MIN_RETENTION_DAYS, MIN_RETENTION_DAYS)
+            retention_days = MIN_RETENTION_DAYS
+        if archive_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+            logging.warning("DB_ARCHIVE_FORMAT=parquet needs pyarrow, archiving as csv.gz instead.")
+            archive_format = "csv"
+        self.retention_days = retention_days
+        self.archive_format = archive_format  # csv, parquet or none (delete without archive)
+        self.archive_dir = archive_dir
+        self.interval_hours = interval_hours
+        self.vacuum_free_ratio = vacuum_free_ratio
+
+
+def database_bytes(path: str) -> int:
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def run_maintenance(path: str, policy: RetentionPolicy, force: bool = False):
+    """Archive, delete and compact; returns the report dict, or None when not due yet."""
+    import sqlite3
+
+    from storage import UserStore
+
+    UserStore(path).close()  # make sure the schema is current
+    db = sqlite3.connect(path, isolation_level=None, timeout=60)
+    try:
+        last = db.execute("SELECT MAX(ran_at) FROM maintenance_runs").fetchone()[0]
+        if not force and last and datetime.now() - datetime.fromisoformat(last) < timedelta(hours=policy.interval_hours):
+            return None
+        start = time.monotonic()
+        bytes_before = database_bytes(path)
+        archived, archive = 0, None
+        if policy.retention_days > 0:
+            cutoff = (date.today() - timedelta(days=policy.retention_days)).isoformat()
+            archived, archive = _archive_and_delete(db, policy, cutoff)
+        vacuum = _compact(db, policy)
+        bytes_after = database_bytes(path)
+        report = {
+            "ran_at": datetime.now().isoformat(timespec="milliseconds"),
+            "archived_rows": archived,
+            "archive": archive,
+            "vacuum": vacuum,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "seconds": round(time.monotonic() - start, 3),
+        }
+        db.execute(
+            "INSERT INTO maintenance_runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            tuple(report.values()),
+        )
+    finally:
+        db.close()
+
+    reclaimed = bytes_before - bytes_after
+    metrics.set_gauge("sgcc_db_size_bytes", bytes_after)
+    metrics.inc("sgcc_db_archived_rows_total", archived)
+    if reclaimed > 0:
+        metrics.inc("sgcc_db_reclaimed_bytes_total", reclaimed)
+    logging.info(
+        "Database maintenance of %s: archived %s daily rows%s, %s vacuum, %.0f KB -> %.0f KB (%.0f KB reclaimed) in %ss.",
+        path, archived, f" to {archive}" if archive else "", vacuum,
+        bytes_before / 1024, bytes_after / 1024, reclaimed / 1024, report["seconds"],
+    )
+    return report
+
+
+def start_maintenance(path: str, policy: RetentionPolicy):
+    """Run maintenance in a background thread unless one is running already."""
+    if not _lock.acquire(blocking=False):
+        return None
+
+    def target():
+        try:
+            run_maintenance(path, policy)
+        except Exception as e:
+            logging.error("Database maintenance of %s failed: %s", path, e)
+        finally:
+            _lock.release()
+
+    thread = threading.Thread(target=target, name="db-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+
+def _archive_and_delete(db, policy: RetentionPolicy, cutoff: str):
+    """Move readings before cutoff to an archive file; the rows are deleted only once the file is complete."""
+    count = db.execute("SELECT COUNT(*) FROM readings WHERE date < ?", (cutoff,)).fetchone()[0]
+    if not count:
+        return 0, None
+    archive = None
+    if policy.archive_format != "none":
+        os.makedirs(policy.archive_dir, exist_ok=True)
+        last_day = (date.fromisoformat(cutoff) - timedelta(days=1)).isoformat()
+        suffix = "parquet" if policy.archive_format == "parquet" else "csv.gz"
+        archive = os.path.join(policy.archive_dir, f"readings_until_{last_day}_{datetime.now():%Y%m%d%H%M%S}.{suffix}")
+        tmp_path = archive + ".tmp"
+        rows = iter_rows(db, kind="daily", date_to=last_day)
+        if policy.archive_format == "parquet":
+            written = write_parquet(rows, tmp_path)
+        else:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as f:
+                written = write_csv(rows, f)
+        os.replace(tmp_path, archive)
+        if written != count:
+            logging.warning("Archived %s daily rows, expected %s.", written, count)
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        deleted = db.execute("DELETE FROM readings WHERE date < ?", (cutoff,)).rowcount
+        db.execute("DELETE FROM unavailable_days WHERE date < ?", (cutoff,))
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    return deleted, archive
+
+
+def _compact(db, policy: RetentionPolicy) -> str:
+    if db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # auto_vacuum can only be switched by a full VACUUM, done once
+        db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        db.execute("VACUUM")
+        mode = "full (converted to incremental)"
+    else:
+        free = db.execute("PRAGMA freelist_count").fetchone()[0]
+        pages = db.execute("PRAGMA page_count").fetchone()[0]
+        if pages and free / pages > policy.vacuum_free_ratio:
+            db.execute("VACUUM")
+            mode = "full"
+        else:
+            db.execute("PRAGMA incremental_vacuum").fetchall()
+            mode = "incremental"
+    db.execute("ANALYZE")
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return mode
+
+
+def print_report(path: str, limit: int = 10):
+    import sqlite3
+
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = db.execute(
+            "SELECT * FROM maintenance_runs ORDER BY ran_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    finally:
+        db.close()
+    print(f"{'ran at':>23} | {'archived':>8} | {'vacuum':>31} | {'before [KB]':>11} | {'after [KB]':>10} | {'reclaimed [KB]':>14}")
+    for ran_at, archived, archive, vacuum, before, after, seconds in rows:
+        print(f"{ran_at:>23} | {archived:>8} | {vacuum:>31} | {before / 1024:>11.0f} | {after / 1024:>10.0f} | {(before - after) / 1024:>14.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retention and compaction of the usage database")
+    parser.add_argument("command", choices=["run", "report"])
+    parser.add_argument("--db", help="database path, default DB_NAME in the data directory")
+    parser.add_argument("--force", action="store_true", help="run even if the last maintenance is recent")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    import settings as config
+
+    settings = config.current()
+    args.db = args.db or os.path.join(DATA_DIR, settings.DB_NAME)
+    if args.command == "run":
+        run_maintenance(args.db, RetentionPolicy.from_settings(settings), force=args.force)
+    print_report(args.db)
@@ -34,8 +34,8 @@ def get_user_ids(driver, wait_time, poll_frequency, retry_limit=3):
     logging.info("Calling get_user_ids from scraper_utils (v2 - el-select)")
     for attempt in range(1, retry_limit + 1):
         try:
-            logging.info(f"Trying to get user IDs, attempt {attempt}...")
-            logging.info(f"Current URL: {driver.current_url}")
+            logging.info("Trying to get user IDs, attempt %s...", attempt)
+            logging.info("Current URL: %s", driver.current_url)
 
             # 1. Wait for el-select to be present
             try:
@@ -44,7 +44,7 @@ def get_user_ids(driver, wait_time, poll_frequency, retry_limit=3):
                 )
             except Exception as wait_e:
                 logging.warning(
-                    f"Wait for el-select failed: {wait_e}. Trying to find by ID span directly."
+                    "Wait for el-select failed: %s. Trying to find by ID span directly.", wait_e
                 )
                 # If select not found, maybe just try to find the ID on page?
                 pass
@@ -73,10 +73,10 @@ def get_user_ids(driver, wait_time, poll_frequency, retry_limit=3):
                     except:
                         pass
             except Exception as e:
-                logging.warning(f"Failed to scrape ID from page text: {e}")
+                logging.warning("Failed to scrape ID from page text: %s", e)
 
             if page_ids:
-                logging.info(f"Found IDs from page text: {page_ids}")
+                logging.info("Found IDs from page text: %s", page_ids)
                 # If we found IDs on page, we might just return them if we assume single user or pre-selected.
                 # However, to be thorough, let's try the dropdown too.
 
@@ -110,23 +110,24 @@ def get_user_ids(driver, wait_time, poll_frequency, retry_limit=3):
                         # If no numbers in dropdown options (e.g. aliases), but we have page_ids,
                         # maybe we can't map them easily without selecting.
                         # For now, if dropdown gives no IDs, we rely on page_ids.
-                        logging.info(f"Dropdown item '{txt}' has no numbers.")
+                        logging.info("Dropdown item '%s' has no numbers.", txt)
             except Exception as e:
-                logging.warning(f"Failed to interact with dropdown: {e}")
+                logging.warning("Failed to interact with dropdown: %s", e)
 
             # Combine results
             # If we found IDs in dropdown, trust them (likely multi-user capable).
             # If not, fall back to page_ids (likely single user or alias mode).
+            # keep the page order, the caller selects users by their index in the dropdown
             if dropdown_ids:
-                return list(set(dropdown_ids))
+                return list(dict.fromkeys(dropdown_ids))
             elif page_ids:
-                return list(set(page_ids))
+                return list(dict.fromkeys(page_ids))
             else:
-                logging.warning(f"Attempt {attempt}: User ID list found empty.")
+                logging.warning("Attempt %s: User ID list found empty.", attempt)
 
         except Exception as e:
             logging.warning(
-                f"Webdriver exception in get_user_ids (attempt {attempt}): {e}"
+                "Webdriver exception in get_user_ids (attempt %s): %s", attempt, e
             )
 
         if attempt < retry_limit:
@@ -135,7 +136,7 @@ def get_user_ids(driver, wait_time, poll_frequency, retry_limit=3):
                 driver.refresh()
                 time.sleep(3)  # Wait for refresh
             except Exception as refresh_error:
-                logging.error(f"Failed to refresh page: {refresh_error}")
+                logging.error("Failed to refresh page: %s", refresh_error)
 
-    logging.error(f"Failed to get user id list after {retry_limit} attempts.")
+    logging.error("Failed to get user id list after %s attempts.", retry_limit)
     return []
@@ -2,21 +2,29 @@ import logging
 import os
 from datetime import datetime,timedelta
 
-import requests
-from sympy import true
-
+import metrics
+import tracing
 from const import *
+from notifier import BalanceNotifier
+from publishers import create_publisher
+from state_cache import StateCache
 
 
 class SensorUpdator:
 
-    def __init__(self):
-        HASS_URL = os.getenv("HASS_URL")
-        HASS_TOKEN = os.getenv("HASS_TOKEN")
-        self.base_url = HASS_URL[:-1] if HASS_URL.endswith("/") else HASS_URL
-        self.token = HASS_TOKEN
-        self.RECHARGE_NOTIFY = os.getenv("RECHARGE_NOTIFY", "false").lower() == "true"
+    def __init__(self, settings):
+        self.RECHARGE_NOTIFY = settings.RECHARGE_NOTIFY
+        # 状态未变化的传感器不重复推送，超过强制刷新间隔（小时）才重新推送，0 表示每次都推送
+        self.state_cache = StateCache(
+            os.path.join(DATA_DIR, settings.HASS_STATE_CACHE_FILE),
+            settings.HASS_FORCE_REFRESH_HOURS * 3600,
+        )
+        # 推送方式由 HASS_PUBLISHER 选择：rest（默认，经持久化队列调用 REST API）或 mqtt（MQTT 自动发现），见 publishers.py
+        self.publisher = create_publisher(self.state_cache, settings)
+        # 余额不足的户号在本次运行结束时合并为一条提醒，后台发送，同一余额不重复提醒，见 notifier.py
+        self.notifier = BalanceNotifier.from_settings(settings) if self.RECHARGE_NOTIFY else None
 
+    @tracing.traced("ha_push")
     def update_one_userid(self, user_id: str, balance: float, last_daily_date: str, last_daily_usage: float, yearly_charge: float, yearly_usage: float, month_charge: float, month_usage: float):
         postfix = f"_{user_id[-4:]}"
         if balance is not None:
@@ -33,7 +41,8 @@ class SensorUpdator:
         if month_charge is not None:
             self.update_month_data(postfix, month_charge)
 
-        logging.info(f"User {user_id} state-refresh task run successfully!")
+        self.publisher.kick()
+        logging.info("User %s state-refresh task run successfully!", user_id)
 
     def update_last_daily_usage(self, postfix: str, last_daily_date: str, sensorState: float):
         sensorName = DAILY_USAGE_SENSOR_NAME + postfix
@@ -50,7 +59,7 @@ class SensorUpdator:
         }
 
         self.send_url(sensorName, request_body)
-        logging.info(f"Homeassistant sensor {sensorName} state updated: {sensorState} kWh")
+        logging.info("Homeassistant sensor %s state updated: %s kWh", sensorName, sensorState)
 
     def update_balance(self, postfix: str, sensorState: float):
         sensorName = BALANCE_SENSOR_NAME + postfix
@@ -67,8 +76,9 @@ class SensorUpdator:
             },
         }
 
-        self.send_url(sensorName, request_body)
-        logging.info(f"Homeassistant sensor {sensorName} state updated: {sensorState} CNY")
+        # last_reset 为当前时间，每次都不同，比较状态时忽略
+        self.send_url(sensorName, request_body, volatile_attributes=("last_reset",))
+        logging.info("Homeassistant sensor %s state updated: %s CNY", sensorName, sensorState)
 
     def update_month_data(self, postfix: str, sensorState: float, usage=False):
         sensorName = (
@@ -93,7 +103,7 @@ class SensorUpdator:
         }
 
         self.send_url(sensorName, request_body)
-        logging.info(f"Homeassistant sensor {sensorName} state updated: {sensorState} {'kWh' if usage else 'CNY'}")
+        logging.info("Homeassistant sensor %s state updated: %s %s", sensorName, sensorState, "kWh" if usage else "CNY")
 
     def update_yearly_data(self, postfix: str, sensorState: float, usage=False):
         sensorName = (
@@ -118,39 +128,63 @@ class SensorUpdator:
             },
         }
         self.send_url(sensorName, request_body)
-        logging.info(f"Homeassistant sensor {sensorName} state updated: {sensorState} {'kWh' if usage else 'CNY'}")
+        logging.info("Homeassistant sensor %s state updated: %s %s", sensorName, sensorState, "kWh" if usage else "CNY")
 
-    def send_url(self, sensorName, request_body):
-        headers = {
-            "Content-Type": "application-json",
-            "Authorization": "Bearer " + self.token,
-        }
-        url = self.base_url + API_PATH + sensorName  # /api/states/<entity_id>
-        try:
-            response = requests.post(url, json=request_body, headers=headers)
-            logging.debug(
-                f"Homeassistant REST API invoke, POST on {url}. response[{response.status_code}]: {response.content}"
-            )
-        except Exception as e:
-            logging.error(f"Homeassistant REST API invoke failed, reason is {e}")
+    def update_derived(self, user_id: str, derived: dict):
+        """推送由历史数据计算的传感器（日均用电、本月预计用电、余额可用天数），不需要额外加载页面"""
+        postfix = f"_{user_id[-4:]}"
+        sensors = (
+            (AVG_7D_USAGE_SENSOR_NAME, "avg_7d_kwh", "kWh", "mdi:chart-line"),
+            (AVG_30D_USAGE_SENSOR_NAME, "avg_30d_kwh", "kWh", "mdi:chart-line"),
+            (PROJECTED_MONTH_USAGE_SENSOR_NAME, "projected_month_kwh", "kWh", "mdi:calendar-month"),
+            (BALANCE_DAYS_SENSOR_NAME, "balance_days", "d", "mdi:timer-sand"),
+        )
+        for name, key, unit, icon in sensors:
+            if derived.get(key) is None:
+                continue
+            sensorName = name + postfix
+            attributes = {
+                "unit_of_measurement": unit,
+                "icon": icon,
+                "state_class": "measurement",
+            }
+            if key == "projected_month_kwh":
+                attributes["month_to_date"] = derived.get("month_to_date_kwh")
+            elif key == "balance_days":
+                attributes["device_class"] = "duration"
+                attributes["price"] = derived.get("price_cny_per_kwh")
+            self.send_url(sensorName, {"state": derived[key], "unique_id": sensorName, "attributes": attributes})
+            logging.info("Homeassistant sensor %s state updated: %s %s", sensorName, derived[key], unit)
+        self.publisher.kick()
+
+    def send_url(self, sensorName, request_body, volatile_attributes=()):
+        """交给推送后端，状态未变化时跳过"""
+        fingerprint = StateCache.fingerprint(request_body, volatile_attributes)
+        if not self.state_cache.should_send(sensorName, fingerprint):
+            metrics.inc("sgcc_ha_updates_total", result="skipped")
+            logging.debug("Homeassistant sensor %s unchanged, skip.", sensorName)
+            return
+        metrics.inc("sgcc_ha_updates_total", result="sent")
+        self.publisher.publish(sensorName, request_body, fingerprint)
+
+    def flush(self):
+        """等待已提交的推送投递完成"""
+        with tracing.span("ha_flush"):
+            self.publisher.flush()
+
+    def close(self):
+        if self.notifier is not None:
+            self.notifier.send()
+        with tracing.span("ha_flush"):
+            self.publisher.close()
+        self.state_cache.save()
+        logging.info(
+            "Homeassistant updates of this run: %s sent, %s skipped as unchanged, %s pending.", self.state_cache.sent, self.state_cache.skipped, self.publisher.pending()
+        )
 
     def balance_notify(self, user_id, balance):
-
-        if self.RECHARGE_NOTIFY :
-            BALANCE = float(os.getenv("BALANCE", 10.0))
-            PUSHPLUS_TOKEN = os.getenv("PUSHPLUS_TOKEN").split(",")        
-            logging.info(f"Check the electricity bill balance. When the balance is less than {BALANCE} CNY, the notification will be sent = {self.RECHARGE_NOTIFY}")
-            if balance < BALANCE :
-                for token in PUSHPLUS_TOKEN:
-                    title = "电费余额不足提醒"
-                    content = (f"您用户号{user_id}的当前电费余额为：{balance}元，请及时充值。" )
-                    url = ("http://www.pushplus.plus/send?token="+ token+ "&title="+ title+ "&content="+ content)
-                    requests.get(url)
-                    logging.info(
-                        f"The current balance of user id {user_id} is {balance} CNY less than {BALANCE} CNY, notice has been sent, please pay attention to check and recharge."
-                    )
-        else :
-            logging.info(
-            f"Check the electricity bill balance, the notification will be sent = {self.RECHARGE_NOTIFY}")
+        if self.notifier is None:
+            logging.info("Check the electricity bill balance, the notification will be sent = %s", self.RECHARGE_NOTIFY)
             return
-
+        logging.info("Check the electricity bill balance. When the balance is less than %s CNY, the notification will be sent = %s", self.notifier.threshold, self.RECHARGE_NOTIFY)
+        self.notifier.check(user_id, balance)
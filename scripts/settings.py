@@ -0,0 +1,360 @@
+"""
+Settings of the daemon, parsed and validated once into a Settings object.
+
+The values come from /data/options.json when running as a Home Assistant
+add-on, else from the environment and the .env file (the environment wins).
+Components take the Settings object in their constructor or from_settings();
+current() returns the active one for command line tools.
+
+SettingsWatcher reloads the source when the file changes or on SIGHUP. The new
+object is only applied when it is valid, subscribers get (old, new) and pick
+up what changed; the browser and the captcha model stay warm. Settings marked
+restart=True (listening sockets, process wide caches) are logged as ignored
+until the next restart.
+
+Developer switches (RECORD_DIR, PROFILE_FETCH, TIMING_LOG_FILE and the site
+URLs) stay plain environment variables.
+"""
+
+import json
+import logging
+import os
+import signal
+import threading
+from datetime import datetime
+
+import pacing
+
+OPTIONS_PATH = "/data/options.json"
+
+
+class SettingsError(ValueError):
+    pass
+
+
+class Field:
+
+    def __init__(self, name: str, kind: str, default, choices=None, minimum=None, maximum=None,
+                 secret: bool = False, restart: bool = False, check=None):
+        self.name = name
+        self.kind = kind  # str, int, float, bool, time (HH:MM), list (comma separated)
+        self.default = default
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+        self.secret = secret
+        self.restart = restart
+        self.check = check  # 额外校验解析后的值，不合法时抛出 ValueError
+
+    def parse(self, raw):
+        value = self._parse(raw)
+        if self.check is not None:
+            try:
+                self.check(value)
+            except ValueError as e:
+                raise SettingsError(f"{self.name}: {e}") from None
+        return value
+
+    def _parse(self, raw):
+        if raw is None or (isinstance(raw, str) and raw.strip() == "" and self.kind != "str"):
+            return self.default
+        if self.kind == "bool":
+            if isinstance(raw, bool):
+                return raw
+            text = str(raw).strip().lower()
+            if text not in ("true", "false", "1", "0", "yes", "no"):
+                raise SettingsError(f"{self.name} must be true or false, got {raw!r}")
+            return text in ("true", "1", "yes")
+        if self.kind in ("int", "float"):
+            try:
+                value = int(raw) if self.kind == "int" else float(raw)
+            except (TypeError, ValueError):
+                raise SettingsError(f"{self.name} must be a number, got {raw!r}") from None
+            if self.minimum is not None and value < self.minimum:
+                raise SettingsError(f"{self.name} must be at least {self.minimum}, got {value}")
+            if self.maximum is not None and value > self.maximum:
+                raise SettingsError(f"{self.name} must be at most {self.maximum}, got {value}")
+            return value
+        if self.kind == "list":
+            items = raw if isinstance(raw, (list, tuple)) else str(raw).split(",")
+            return tuple(str(item).strip() for item in items if str(item).strip())
+        value = str(raw).strip()
+        if self.kind == "time":
+            try:
+                datetime.strptime(value, "%H:%M")
+            except ValueError:
+                raise SettingsError(f"{self.name} must be HH:MM, got {raw!r}") from None
+        if self.choices:
+            match = next((choice for choice in self.choices if choice.lower() == value.lower()), None)
+            if match is None:
+                raise SettingsError(f"{self.name} must be one of {'|'.join(self.choices)}, got {raw!r}")
+            return match
+        return value
+
+
+FIELDS = [
+    # 账号与运行
+    Field("PHONE_NUMBER", "str", ""),
+    Field("PASSWORD", "str", "", secret=True),
+    Field("JOB_START_TIME", "time", "07:00"),
+    Field("RETRY_TIMES_LIMIT", "int", 5, minimum=1, maximum=20),
+    Field("DRIVER_IMPLICITY_WAIT_TIME", "int", 20, minimum=1),
+    Field("LOGIN_EXPECTED_TIME", "int", 10, minimum=1),
+    Field("RETRY_WAIT_TIME_OFFSET_UNIT", "int", 3, minimum=0),
+    Field("IGNORE_USER_ID", "list", ("xxxxx", "xxxxx")),
+    Field("DATA_RETENTION_DAYS", "int", 7, minimum=1),
+    Field("DEBUG_MODE", "bool", False),
+    Field("LOG_LEVEL", "str", "INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")),
+    Field("LOG_FORMAT", "str", "text", choices=("text", "json")),
+    Field("LOG_RATE_LIMIT", "int", 10, minimum=0),
+    # 浏览器
+    Field("BROWSER_RSS_LIMIT_MB", "int", 0, minimum=0),
+    Field("ENABLE_PROFILE_TEMPLATE", "bool", True),
+    Field("FULL_REFRESH_HOURS", "float", 24, minimum=0),
+    # 防风控节奏，见 pacing.py
+    Field("PACING_PROFILE", "str", "normal", choices=("normal", "cautious", "fast", "off")),
+    Field("PACING_DELAYS", "list", (), check=pacing.parse_delays),
+    Field("PACING_ACTIONS_PER_MINUTE", "float", 30, minimum=0),
+    Field("PACING_BURST", "int", 8, minimum=1),
+    # Home Assistant
+    Field("HASS_URL", "str", "http://homeassistant.local:8123/"),
+    Field("HASS_TOKEN", "str", "", secret=True),
+    Field("HASS_PUBLISHER", "str", "rest", choices=("rest", "mqtt")),
+    Field("HASS_PUBLISH_CONCURRENCY", "int", 4, minimum=1),
+    Field("HASS_CONNECT_TIMEOUT", "float", 5, minimum=0.1),
+    Field("HASS_READ_TIMEOUT", "float", 10, minimum=0.1),
+    Field("HASS_FORCE_REFRESH_HOURS", "float", 24, minimum=0),
+    Field("HASS_OUTBOX_MAX_AGE_HOURS", "float", 72, minimum=0),
+    Field("HASS_OUTBOX_BACKOFF_SECONDS", "float", 30, minimum=0),
+    Field("HASS_OUTBOX_BACKOFF_MAX_SECONDS", "float", 3600, minimum=0),
+    Field("ENABLE_STATISTICS_IMPORT", "bool", False),
+    Field("MQTT_HOST", "str", "core-mosquitto"),
+    Field("MQTT_PORT", "int", 1883, minimum=1, maximum=65535),
+    Field("MQTT_CLIENT_ID", "str", "sgcc_electricity"),
+    Field("MQTT_USERNAME", "str", ""),
+    Field("MQTT_PASSWORD", "str", "", secret=True),
+    Field("MQTT_DISCOVERY_PREFIX", "str", "homeassistant"),
+    Field("MQTT_BASE_TOPIC", "str", "sgcc_electricity"),
+    # 余额提醒
+    Field("RECHARGE_NOTIFY", "bool", False),
+    Field("BALANCE", "float", 10.0),
+    Field("PUSHPLUS_TOKEN", "list", (), secret=True),
+    Field("PUSHPLUS_URL", "str", "https://www.pushplus.plus/send"),
+    Field("NOTIFY_WEBHOOK_URL", "str", "", secret=True),
+    Field("NOTIFY_HASS_PERSISTENT", "bool", False),
+    Field("NOTIFY_REPEAT_HOURS", "float", 24, minimum=0),
+    Field("NOTIFY_CONNECT_TIMEOUT", "float", 5, minimum=0.1),
+    Field("NOTIFY_READ_TIMEOUT", "float", 10, minimum=0.1),
+    # 数据库
+    Field("ENABLE_DATABASE_STORAGE", "bool", False),
+    Field("DB_NAME", "str", "homeassistant.db"),
+    Field("DB_RETENTION_DAYS", "int", 0, minimum=0),
+    Field("DB_ARCHIVE_FORMAT", "str", "csv", choices=("csv", "parquet", "none")),
+    Field("DB_ARCHIVE_DIR", "str", ""),
+    Field("DB_MAINTENANCE_HOURS", "float", 24, minimum=0),
+    Field("DB_VACUUM_FREE_RATIO", "float", 0.25, minimum=0, maximum=1),
+    # 调试截图与页面转储
+    Field("ARTIFACT_DIR", "str", "", restart=True),
+    Field("ARTIFACT_MAX_MB", "float", 50, minimum=0, restart=True),
+    Field("ARTIFACT_MAX_AGE_DAYS", "float", 7, minimum=0, restart=True),
+    Field("ARTIFACT_SCREENSHOT_FORMAT", "str", "jpeg", choices=("jpeg", "png"), restart=True),
+    Field("ARTIFACT_SCREENSHOT_MAX_WIDTH", "int", 800, minimum=0, restart=True),
+    # 运行时间
+    Field("ADAPTIVE_SCHEDULE", "bool", False),
+    Field("ADAPTIVE_EARLIEST", "time", "06:00"),
+    Field("ADAPTIVE_LATEST", "time", "22:00"),
+    Field("ADAPTIVE_MARGIN_MINUTES", "float", 10),
+    Field("ADAPTIVE_RETRY_MINUTES", "float", 60, minimum=1),
+    Field("ADAPTIVE_MAX_INTERVAL_HOURS", "float", 24, minimum=1),
+    Field("ADAPTIVE_MIN_SAMPLES", "int", 3, minimum=1),
+    Field("ADAPTIVE_QUANTILE", "float", 0.8, minimum=0, maximum=1),
+    # 控制接口
+    Field("CONTROL_SERVER_PORT", "int", None, minimum=1, maximum=65535, restart=True),
+    Field("CONTROL_SERVER_HOST", "str", "127.0.0.1", restart=True),
+    # 状态文件，相对路径位于数据目录下
+    Field("HASS_STATE_CACHE_FILE", "str", "ha_state_cache.json"),
+    Field("HASS_OUTBOX_FILE", "str", "ha_outbox.db", restart=True),
+    Field("HASS_STATISTICS_STATE_FILE", "str", "ha_statistics_state.json"),
+    Field("NOTIFY_STATE_FILE", "str", "balance_notify_state.json"),
+    Field("PROBE_CACHE_FILE", "str", "probe_cache.json"),
+    Field("PUBLICATION_HISTORY_FILE", "str", "publication_history.json", restart=True),
+    Field("FIREFOX_PROFILE_TEMPLATE", "str", ""),
+]
+
+FIELDS_BY_NAME = {field.name: field for field in FIELDS}
+
+
+class Settings:
+    """Immutable snapshot of every field, read as attributes: settings.RETRY_TIMES_LIMIT."""
+
+    def __init__(self, values: dict, source: str):
+        errors = []
+        for field in FIELDS:
+            try:
+                value = field.parse(values.get(field.name))
+            except SettingsError as e:
+                errors.append(str(e))
+                continue
+            object.__setattr__(self, field.name, value)
+        if errors:
+            raise SettingsError(f"Invalid settings in {source}: " + "; ".join(errors))
+        object.__setattr__(self, "source", source)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are read only, reload them instead")
+
+    @property
+    def hass_base_url(self) -> str:
+        return self.HASS_URL.rstrip("/")
+
+    @property
+    def secrets(self) -> list:
+        values = []
+        for field in FIELDS:
+            if field.secret:
+                value = getattr(self, field.name)
+                values.extend(value if isinstance(value, tuple) else [value])
+        return [value for value in values if value]
+
+    def changed(self, other: "Settings") -> list:
+        """Names of the fields whose value differs from other."""
+        return [field.name for field in FIELDS if getattr(self, field.name) != getattr(other, field.name)]
+
+    def describe(self) -> dict:
+        """Values for logging, secrets masked."""
+        return {
+            field.name: ("******" if field.secret and getattr(self, field.name) else getattr(self, field.name))
+            for field in FIELDS
+        }
+
+    @classmethod
+    def load(cls) -> "Settings":
+        if os.path.isfile(OPTIONS_PATH):
+            with open(OPTIONS_PATH, encoding="utf-8") as f:
+                options = json.load(f)
+            return cls({**os.environ, **options}, OPTIONS_PATH)
+        return cls(_environment(), _dotenv_path() or "environment")
+
+
+# keys load_dotenv copied into os.environ, with the copied value
+_from_dotenv = {}
+
+
+def _dotenv_path():
+    if "PYTHON_IN_DOCKER" in os.environ:
+        return None
+    try:
+        import dotenv
+    except ImportError:
+        # python-dotenv 为可选依赖，未安装时只读取环境变量
+        return None
+    return dotenv.find_dotenv() or None
+
+
+def _environment() -> dict:
+    """The environment over the current .env file, ignoring values copied from an older .env."""
+    path = _dotenv_path()
+    if path is None:
+        return dict(os.environ)
+    import dotenv
+
+    if not _from_dotenv:
+        # 首次加载时同时写入环境变量，供仍直接读取环境变量的开发开关使用
+        for key, value in dotenv.dotenv_values(path).items():
+            if key not in os.environ and value is not None:
+                os.environ[key] = value
+                _from_dotenv[key] = value
+    environment = {key: value for key, value in os.environ.items() if _from_dotenv.get(key) != value}
+    file_values = {key: value for key, value in dotenv.dotenv_values(path).items() if value is not None}
+    return {**file_values, **environment}
+
+
+_current = None
+_subscribers = []
+_lock = threading.Lock()
+
+
+def current() -> Settings:
+    """The active settings, loaded on first use."""
+    global _current
+    with _lock:
+        if _current is None:
+            _current = Settings.load()
+        return _current
+
+
+def subscribe(callback):
+    """callback(old, new) is called on the thread that applies a reload."""
+    _subscribers.append(callback)
+
+
+def reload() -> list:
+    """Load the settings again and notify the subscribers; returns the changed names, raises SettingsError."""
+    global _current
+    new = Settings.load()
+    with _lock:
+        old, _current = _current, new
+    if old is None:
+        return []
+    changed = new.changed(old)
+    if not changed:
+        return []
+    ignored = [name for name in changed if FIELDS_BY_NAME[name].restart]
+    logging.info("Settings reloaded from %s, changed: %s", new.source, ", ".join(changed))
+    if ignored:
+        logging.warning("Changes of %s take effect after a restart.", ", ".join(ignored))
+    for callback in _subscribers:
+        try:
+            callback(old, new)
+        except Exception as e:
+            logging.error("Failed to apply the reloaded settings in %s: %s", getattr(callback, "__qualname__", callback), e)
+    return changed
+
+
+class SettingsWatcher:
+    """Reload on SIGHUP or when the source file changes; poll() runs on the main loop."""
+
+    def __init__(self):
+        self._requested = threading.Event()
+        self._path = OPTIONS_PATH if os.path.isfile(OPTIONS_PATH) else _dotenv_path()
+        self._mtime = self._stat()
+
+    def install(self):
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self._requested.set())
+        return self
+
+    def _stat(self):
+        try:
+            return os.stat(self._path).st_mtime_ns if self._path else None
+        except OSError:
+            return None
+
+    def poll(self) -> bool:
+        """Reload when requested or the file changed; keeps the old settings if the new ones are invalid."""
+        mtime = self._stat()
+        if not self._requested.is_set() and mtime == self._mtime:
+            return False
+        self._requested.clear()
+        self._mtime = mtime
+        try:
+            reload()
+        except (SettingsError, OSError, ValueError) as e:
+            logging.error("Keeping the current settings, the new ones are invalid: %s", e)
+            return False
+        return True
+
+
+def _main():
+    """Print the effective settings, secrets masked: python3 settings.py"""
+    try:
+        settings = current()
+    except SettingsError as e:
+        raise SystemExit(str(e))
+    print(f"# {settings.source}")
+    for name, value in settings.describe().items():
+        print(f"{name}={','.join(value) if isinstance(value, tuple) else value}")
+
+
+if __name__ == "__main__":
+    _main()
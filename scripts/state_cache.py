@@ -0,0 +1,91 @@
+"""
+Persisted cache of the last state published for each Home Assistant entity.
+
+Unchanged sensors are skipped so they neither cost a request nor add a row to
+the HA recorder, unless the last successful send is older than the forced
+refresh interval (REST entities vanish when HA restarts, so they must be
+re-sent eventually).
+
+load_json_state()/save_json_state() read and atomically write the small JSON
+state files kept in the data directory by this and the other modules.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+
+def load_json_state(path: str, what: str) -> dict:
+    """Content of a JSON state file, empty when it is missing or unreadable."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning("Failed to load the %s %s, starting empty: %s", what, path, e)
+        return {}
+
+
+def save_json_state(path: str, data, what: str) -> bool:
+    """Replace a JSON state file atomically; False when it could not be written."""
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        logging.warning("Failed to save the %s %s: %s", what, path, e)
+        return False
+
+
+class StateCache:
+
+    def __init__(self, path: str, force_refresh_seconds: float):
+        self.path = path
+        self.force_refresh_seconds = force_refresh_seconds
+        self.sent = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._entries = load_json_state(path, "sensor state cache")
+        self._dirty = False
+
+    @staticmethod
+    def fingerprint(request_body: dict, volatile_attributes=()) -> str:
+        attributes = {
+            key: value for key, value in request_body.get("attributes", {}).items()
+            if key not in volatile_attributes
+        }
+        return json.dumps([request_body.get("state"), attributes], sort_keys=True, default=str)
+
+    def should_send(self, entity_id: str, fingerprint: str, count: bool = True) -> bool:
+        """True when the state changed or the forced refresh interval has passed; counts the decision."""
+        with self._lock:
+            entry = self._entries.get(entity_id)
+            unchanged = (
+                self.force_refresh_seconds > 0
+                and entry is not None
+                and entry["fingerprint"] == fingerprint
+                and time.time() - entry["sent_at"] < self.force_refresh_seconds
+            )
+            if count:
+                if unchanged:
+                    self.skipped += 1
+                else:
+                    self.sent += 1
+            return not unchanged
+
+    def mark_sent(self, entity_id: str, fingerprint: str):
+        with self._lock:
+            self._entries[entity_id] = {"fingerprint": fingerprint, "sent_at": time.time()}
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            if save_json_state(self.path, self._entries, "sensor state cache"):
+                self._dirty = False
@@ -0,0 +1,451 @@
+"""
+SQLite storage of the scraped data (ENABLE_DATABASE_STORAGE).
+
+All users share typed tables, keyed by user id:
+- readings(user_id, date, usage_kwh)                 daily usage
+- monthly(user_id, month, usage_kwh, charge_cny)     monthly usage and charge
+- accounts(user_id, balance_cny, ...)                latest scalar values
+- rollup_monthly / rollup_yearly(user_id, period, usage_kwh, days)
+  sums of the daily readings, updated by the deltas of the changed readings
+  in the same transaction, see derived_metrics() for the values built on them
+- unavailable_days(user_id, date, marked_at)         days the site did not show
+  although they were in the fetched view, see daily_plan.py; a mark expires
+  after UNAVAILABLE_RECHECK_DAYS so a day published late is fetched again
+- maintenance_runs(ran_at, ...)                      reports of retention.py
+
+The schema version is kept in PRAGMA user_version and upgraded by MIGRATIONS
+when the database is opened; version 1 converts the old per-user
+daily{user_id} / data{user_id} tables in one transaction.
+
+One connection is kept for the whole run, in WAL mode with synchronous=NORMAL,
+so a commit does not wait for a full fsync. All rows of one user are written
+with executemany inside a single transaction, every statement is parameterized.
+
+    python3 storage.py bench --users 1 10 100 --days 30
+"""
+
+import argparse
+import calendar
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from const import DATA_DIR
+from ha_statistics import parse_period_start
+
+ACCOUNT_COLUMNS = (
+    "balance_cny",
+    "last_daily_date",
+    "last_daily_usage_kwh",
+    "yearly_usage_kwh",
+    "yearly_charge_cny",
+)
+# a day marked unavailable is looked for again after this many days
+UNAVAILABLE_RECHECK_DAYS = 3
+# legacy data{user_id} keys -> accounts columns
+LEGACY_ACCOUNT_KEYS = {
+    "balance": "balance_cny",
+    "daily_date": "last_daily_date",
+    "daily_usage": "last_daily_usage_kwh",
+    "yearly_usage": "yearly_usage_kwh",
+    "yearly_charge": "yearly_charge_cny",
+}
+
+
+def to_float(value):
+    """Scraped numbers arrive as text, sometimes padded or "None"."""
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_day(text):
+    start = parse_period_start(str(text)[:10]) if text is not None else None
+    return start.strftime("%Y-%m-%d") if start else None
+
+
+def normalize_month(text):
+    start = parse_period_start(text) if text is not None else None
+    return start.strftime("%Y-%m") if start else None
+
+
+def _create_schema(db):
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS readings (
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            usage_kwh REAL NOT NULL,
+            PRIMARY KEY (user_id, date)) WITHOUT ROWID"""
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS readings_date ON readings (date)")
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS monthly (
+            user_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            usage_kwh REAL,
+            charge_cny REAL,
+            PRIMARY KEY (user_id, month)) WITHOUT ROWID"""
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS monthly_month ON monthly (month)")
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS accounts (
+            user_id TEXT PRIMARY KEY NOT NULL,
+            balance_cny REAL,
+            last_daily_date TEXT,
+            last_daily_usage_kwh REAL,
+            yearly_usage_kwh REAL,
+            yearly_charge_cny REAL,
+            updated_at TEXT NOT NULL)"""
+    )
+
+
+def _migrate_legacy_tables(db):
+    """Move the rows of every daily{user_id} / data{user_id} table into the shared tables and drop them."""
+    tables = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table in tables:
+        match = re.fullmatch(r"daily(\d+)", table)
+        if match:
+            rows = [
+                (match.group(1), normalize_day(day), to_float(usage))
+                for day, usage in db.execute(f'SELECT date, usage FROM "{table}"')
+            ]
+            db.executemany(
+                "INSERT OR REPLACE INTO readings VALUES (?, ?, ?)",
+                [row for row in rows if row[1] is not None and row[2] is not None],
+            )
+            db.execute(f'DROP TABLE "{table}"')
+            logging.info("Migrated %s rows of legacy table %s.", len(rows), table)
+    for table in tables:
+        match = re.fullmatch(r"data(\d+)", table)
+        if not match:
+            continue
+        user_id = match.group(1)
+        account, months = {}, {}
+        for name, value in db.execute(f'SELECT name, value FROM "{table}"'):
+            if name in LEGACY_ACCOUNT_KEYS:
+                column = LEGACY_ACCOUNT_KEYS[name]
+                account[column] = str(value).strip() if column == "last_daily_date" else to_float(value)
+                continue
+            month_match = re.fullmatch(r"(.+?)(usage|charge)", name)
+            month = normalize_month(month_match.group(1)) if month_match else None
+            if month is not None:
+                months.setdefault(month, {})[month_match.group(2)] = to_float(value)
+        db.executemany(
+            "INSERT OR REPLACE INTO monthly VALUES (?, ?, ?, ?)",
+            [(user_id, month, values.get("usage"), values.get("charge")) for month, values in months.items()],
+        )
+        if account:
+            db.execute(
+                "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, *(account.get(column) for column in ACCOUNT_COLUMNS), datetime.now().isoformat(timespec="seconds")),
+            )
+        db.execute(f'DROP TABLE "{table}"')
+        logging.info("Migrated %s months of legacy table %s.", len(months), table)
+
+
+def _schema_v1(db):
+    _create_schema(db)
+    _migrate_legacy_tables(db)
+
+
+def _schema_v2(db):
+    for table, period in (("rollup_monthly", "month"), ("rollup_yearly", "year")):
+        db.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                user_id TEXT NOT NULL,
+                {period} TEXT NOT NULL,
+                usage_kwh REAL NOT NULL,
+                days INTEGER NOT NULL,
+                PRIMARY KEY (user_id, {period})) WITHOUT ROWID"""
+        )
+    db.execute(
+        """INSERT OR REPLACE INTO rollup_monthly
+        SELECT user_id, substr(date, 1, 7), round(SUM(usage_kwh), 3), COUNT(*) FROM readings GROUP BY 1, 2"""
+    )
+    db.execute(
+        """INSERT OR REPLACE INTO rollup_yearly
+        SELECT user_id, substr(date, 1, 4), round(SUM(usage_kwh), 3), COUNT(*) FROM readings GROUP BY 1, 2"""
+    )
+
+
+def _schema_v3(db):
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS unavailable_days (
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (user_id, date)) WITHOUT ROWID"""
+    )
+
+
+def _schema_v4(db):
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS maintenance_runs (
+            ran_at TEXT PRIMARY KEY NOT NULL,
+            archived_rows INTEGER NOT NULL,
+            archive TEXT,
+            vacuum TEXT NOT NULL,
+            bytes_before INTEGER NOT NULL,
+            bytes_after INTEGER NOT NULL,
+            seconds REAL NOT NULL)"""
+    )
+
+
+def _schema_v5(db):
+    # marks without a time expire at once, the day is checked again on the next run
+    db.execute("ALTER TABLE unavailable_days ADD COLUMN marked_at TEXT")
+
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1
+MIGRATIONS = [_schema_v1, _schema_v2, _schema_v3, _schema_v4, _schema_v5]
+
+
+class UserStore:
+
+    @classmethod
+    def open(cls, db_name: str = "homeassistant.db"):
+        return cls(os.path.join(DATA_DIR, db_name))
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self.path = path
+        # isolation_level=None: transactions are opened explicitly
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        logging.info("Database of %s opened, schema version %s.", path, len(MIGRATIONS))
+
+    def save_user(self, user_id: str, daily_rows, monthly_rows, account: dict):
+        """
+        Write one user in one transaction.
+        daily_rows: (date, usage) pairs
+        monthly_rows: (month, usage, charge) triples
+        account: latest values, keys are ACCOUNT_COLUMNS
+        """
+        readings = []
+        for day, usage in daily_rows:
+            row = (user_id, normalize_day(day), to_float(usage))
+            if None in row:
+                logging.debug("The electricity consumption of %s failed to save to the database: %s", day, usage)
+                continue
+            readings.append(row)
+        months = []
+        for month, usage, charge in monthly_rows:
+            normalized = normalize_month(month)
+            if normalized is None:
+                logging.debug("The electricity consumption of %s failed to save to the database, unknown month.", month)
+                continue
+            months.append((user_id, normalized, to_float(usage), to_float(charge)))
+        with self._transaction():
+            readings = self._changed_readings(user_id, readings)
+            self._db.executemany("INSERT OR REPLACE INTO readings VALUES (?, ?, ?)", readings)
+            self._db.executemany("INSERT OR REPLACE INTO monthly VALUES (?, ?, ?, ?)", months)
+            self._db.execute(
+                "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    user_id,
+                    to_float(account.get("balance_cny")),
+                    account.get("last_daily_date"),
+                    to_float(account.get("last_daily_usage_kwh")),
+                    to_float(account.get("yearly_usage_kwh")),
+                    to_float(account.get("yearly_charge_cny")),
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+        logging.info("Saved %s new or changed daily rows and %s months of user %s to the database.", len(readings), len(months), user_id)
+
+    def derived_metrics(self, user_id: str) -> dict:
+        """
+        Values derived from the stored history, reading at most 30 daily rows:
+        7/30-day averages, month to date and projected month total (kWh), and the
+        days until the balance runs out at the 7-day average and the latest price.
+        Missing inputs leave the value out.
+        """
+        latest = self.latest_date(user_id)
+        if latest is None:
+            return {}
+        rows = self._db.execute(
+            "SELECT date, usage_kwh FROM readings WHERE user_id = ? AND date > date(?, '-30 days') ORDER BY date",
+            (user_id, latest),
+        ).fetchall()
+        week_start = (datetime.strptime(latest, "%Y-%m-%d") - timedelta(days=7)).strftime("%Y-%m-%d")
+        week = [usage for day, usage in rows if day > week_start]
+        derived = {
+            "avg_7d_kwh": round(sum(week) / len(week), 2),
+            "avg_30d_kwh": round(sum(usage for _, usage in rows) / len(rows), 2),
+        }
+
+        month_row = self._db.execute(
+            "SELECT usage_kwh FROM rollup_monthly WHERE user_id = ? AND month = ?", (user_id, latest[:7])
+        ).fetchone()
+        if month_row is not None:
+            year, month, day = (int(part) for part in latest.split("-"))
+            remaining_days = calendar.monthrange(year, month)[1] - day
+            derived["month_to_date_kwh"] = round(month_row[0], 2)
+            derived["projected_month_kwh"] = round(month_row[0] + derived["avg_7d_kwh"] * remaining_days, 2)
+
+        price = self._db.execute(
+            """SELECT charge_cny / usage_kwh FROM monthly
+            WHERE user_id = ? AND usage_kwh > 0 AND charge_cny IS NOT NULL ORDER BY month DESC LIMIT 1""",
+            (user_id,),
+        ).fetchone()
+        balance = self._db.execute("SELECT balance_cny FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+        if price and balance and balance[0] is not None and derived["avg_7d_kwh"] > 0:
+            derived["price_cny_per_kwh"] = round(price[0], 4)
+            derived["balance_days"] = round(max(balance[0], 0) / (derived["avg_7d_kwh"] * price[0]), 1)
+        return derived
+
+    def latest_date(self, user_id: str):
+        return self._db.execute("SELECT MAX(date) FROM readings WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def known_dates(self, user_id: str, start: str, end: str) -> set:
+        """Days between start and end (inclusive) that are stored or were recently found unavailable."""
+        recheck_after = (datetime.now() - timedelta(days=UNAVAILABLE_RECHECK_DAYS)).isoformat(timespec="seconds")
+        return {
+            row[0] for row in self._db.execute(
+                """SELECT date FROM readings WHERE user_id = ? AND date BETWEEN ? AND ?
+                UNION SELECT date FROM unavailable_days
+                WHERE user_id = ? AND date BETWEEN ? AND ? AND marked_at >= ?""",
+                (user_id, start, end, user_id, start, end, recheck_after),
+            )
+        }
+
+    def mark_unavailable(self, user_id: str, dates):
+        """Record days missing from a fetched view; marking a day again restarts its expiry."""
+        marked_at = datetime.now().isoformat(timespec="seconds")
+        with self._transaction():
+            self._db.executemany(
+                "INSERT OR REPLACE INTO unavailable_days VALUES (?, ?, ?)", [(user_id, day, marked_at) for day in dates]
+            )
+
+    def close(self):
+        self._db.close()
+
+    # private methods below
+
+    def _changed_readings(self, user_id: str, readings: list) -> list:
+        """Drop unchanged readings and add the deltas of the others to the rollups."""
+        if not readings:
+            return readings
+        days = [row[1] for row in readings]
+        stored = dict(self._db.execute(
+            "SELECT date, usage_kwh FROM readings WHERE user_id = ? AND date BETWEEN ? AND ?",
+            (user_id, min(days), max(days)),
+        ))
+        changed, monthly, yearly = [], {}, {}
+        for row in readings:
+            _, day, usage = row
+            old = stored.get(day)
+            if old == usage:
+                continue
+            changed.append(row)
+            for deltas, period in ((monthly, day[:7]), (yearly, day[:4])):
+                delta = deltas.setdefault(period, [0.0, 0])
+                delta[0] += usage - (old or 0.0)
+                delta[1] += 0 if old is not None else 1
+        for table, period, deltas in (("rollup_monthly", "month", monthly), ("rollup_yearly", "year", yearly)):
+            self._db.executemany(
+                f"""INSERT INTO {table} VALUES (?, ?, round(?, 3), ?)
+                ON CONFLICT(user_id, {period}) DO UPDATE SET
+                    usage_kwh = round(usage_kwh + excluded.usage_kwh, 3),
+                    days = days + excluded.days""",
+                [(user_id, key, usage, count) for key, (usage, count) in deltas.items()],
+            )
+        return changed
+
+    def _migrate(self):
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        for target in range(version, len(MIGRATIONS)):
+            with self._transaction():
+                MIGRATIONS[target](self._db)
+                # PRAGMA does not accept bound parameters, target is an int
+                self._db.execute(f"PRAGMA user_version = {target + 1:d}")
+            logging.info("Database %s migrated to schema version %s.", self.path, target + 1)
+
+    def _transaction(self):
+        return _Transaction(self._db)
+
+
+class _Transaction:
+
+    def __init__(self, db):
+        self._db = db
+
+    def __enter__(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        return self._db
+
+    def __exit__(self, exc_type, exc, tb):
+        self._db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _synthetic_user(index: int, days: int):
+    today = date.today()
+    daily_rows = [((today - timedelta(days=offset)).isoformat(), round(5 + (offset * 7 + index) % 11 * 0.7, 2)) for offset in range(days, 0, -1)]
+    monthly_rows = [(f"2024-{month:02d}", 250.0 + month, 130.0 + month) for month in range(1, 13)]
+    account = {"balance_cny": 58.3, "last_daily_date": daily_rows[-1][0], "last_daily_usage_kwh": daily_rows[-1][1],
+               "yearly_usage_kwh": 3012.0, "yearly_charge_cny": 1830.5}
+    return f"{3100000000 + index}", daily_rows, monthly_rows, account
+
+
+def _legacy_write(path: str, user_id: str, daily_rows, monthly_rows, account: dict):
+    """The previous write path: a connection per user, per-user tables and a commit per row."""
+    import sqlite3
+
+    connection = sqlite3.connect(path)
+    connection.execute(f"CREATE TABLE IF NOT EXISTS daily{user_id} (date DATE PRIMARY KEY NOT NULL, usage REAL NOT NULL)")
+    connection.execute(f"CREATE TABLE IF NOT EXISTS data{user_id} (name TEXT PRIMARY KEY NOT NULL, value TEXT NOT NULL)")
+    values = {"user": user_id}
+    values.update({name: account[column] for name, column in LEGACY_ACCOUNT_KEYS.items()})
+    for month, usage, charge in monthly_rows:
+        values[f"{month}usage"], values[f"{month}charge"] = usage, charge
+    for day, usage in daily_rows:
+        connection.execute(f"INSERT OR REPLACE INTO daily{user_id} VALUES(strftime('%Y-%m-%d','{day}'),{usage});")
+        connection.commit()
+    for name, value in values.items():
+        connection.execute(f"INSERT OR REPLACE INTO data{user_id} VALUES('{name}','{value}');")
+        connection.commit()
+    connection.close()
+
+
+def benchmark(user_counts, days: int):
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"{days} days of history and 12 months per user, database in {tempfile.gettempdir()}")
+    print(f"{'users':>6} | {'legacy [s]':>10} | {'batched [s]':>11} | {'speedup':>7}")
+    for user_count in user_counts:
+        users = [_synthetic_user(index, days) for index in range(user_count)]
+        with tempfile.TemporaryDirectory() as workdir:
+            legacy_path = os.path.join(workdir, "legacy.db")
+            start = time.perf_counter()
+            for user in users:
+                _legacy_write(legacy_path, *user)
+            legacy = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store = UserStore(os.path.join(workdir, "batched.db"))
+            for user in users:
+                store.save_user(*user)
+            store.close()
+            batched = time.perf_counter() - start
+        print(f"{user_count:>6} | {legacy:>10.3f} | {batched:>11.3f} | {legacy / batched:>6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench_parser = subparsers.add_parser("bench", help="compare per-row commits with batched transactions")
+    bench_parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 100])
+    bench_parser.add_argument("--days", type=int, default=30)
+    migrate_parser = subparsers.add_parser("migrate", help="upgrade a database to the current schema")
+    migrate_parser.add_argument("path")
+    args = parser.parse_args()
+    if args.command == "migrate":
+        logging.basicConfig(level=logging.INFO)
+        UserStore(args.path).close()
+    else:
+        benchmark(args.users, args.days)
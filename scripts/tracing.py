@@ -0,0 +1,220 @@
+"""
+Lightweight span API for per-run timing trees and optional profiling.
+
+    with tracing.run("fetch"):
+        with tracing.span("login"):
+            ...
+
+Every finished span is recorded as a phase in metrics.py. Spans opened inside
+a run are collected into a tree that is logged and appended to a JSONL file
+(TIMING_LOG_FILE, default timings.jsonl in DATA_DIR) when the run finishes.
+
+PROFILE_FETCH=cprofile or PROFILE_FETCH=sample profiles the whole run and
+writes the report to DATA_DIR/profiles.
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+import metrics
+from const import DATA_DIR
+
+
+class Span:
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self.duration = None
+        self.children = []
+
+    def finish(self):
+        self.duration = time.monotonic() - self._start
+
+    def to_dict(self) -> dict:
+        node = {"name": self.name, "duration": round(self.duration or 0.0, 4)}
+        if self.attrs:
+            node["attrs"] = self.attrs
+        if self.children:
+            node["children"] = [child.to_dict() for child in self.children]
+        return node
+
+    def format_tree(self, depth: int = 0) -> list:
+        attrs = "".join(f" {key}={value}" for key, value in self.attrs.items())
+        lines = [f"{'  ' * depth}{self.name}{attrs}: {self.duration or 0.0:.2f}s"]
+        for child in self.children:
+            lines.extend(child.format_tree(depth + 1))
+        return lines
+
+
+_local = threading.local()
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_run_id():
+    """Id of the run executing in this thread, None outside a run."""
+    return getattr(_local, "run_id", None)
+
+
+def current_phase():
+    """Name of the innermost open span in this thread, None outside any span."""
+    stack = _stack()
+    return stack[-1].name if stack else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block; nested spans form a tree under the enclosing run."""
+    stack = _stack()
+    current = Span(name, attrs)
+    if stack:
+        stack[-1].children.append(current)
+    stack.append(current)
+    try:
+        yield current
+    finally:
+        stack.pop()
+        current.finish()
+        metrics.observe_phase(name, current.duration)
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapped
+
+    return decorator
+
+
+@contextmanager
+def run(name: str):
+    """Root span of a run: on exit the timing tree is logged and written to the JSONL file."""
+    _local.run_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+    _local.stack = []
+    root = None
+    try:
+        with profile(name), span(name, run_id=_local.run_id) as root:
+            yield root
+    finally:
+        # profile() 进入时出错则没有计时树，不掩盖原来的异常
+        if root is not None:
+            _report(root)
+        _local.run_id = None
+
+
+def _report(root: Span):
+    logging.info("Run timing tree:\n%s", "\n".join(root.format_tree()))
+    timing_file = os.getenv("TIMING_LOG_FILE", "timings.jsonl")
+    if not timing_file:
+        return
+    record = {
+        "run_id": root.attrs.get("run_id"),
+        "started_at": datetime.fromtimestamp(root.started_at).strftime("%Y-%m-%d %H:%M:%S"),
+        "duration": round(root.duration, 4),
+        "tree": root.to_dict(),
+    }
+    try:
+        with open(os.path.join(DATA_DIR, timing_file), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logging.warning("Failed to write timing record to %s: %s", timing_file, e)
+
+
+@contextmanager
+def profile(name: str):
+    """Profile the block with cProfile or the sampling profiler, selected by PROFILE_FETCH."""
+    mode = os.getenv("PROFILE_FETCH", "").lower()
+    if mode not in ("cprofile", "sample"):
+        yield
+        return
+    profile_dir = os.path.join(DATA_DIR, "profiles")
+    os.makedirs(profile_dir, exist_ok=True)
+    prefix = os.path.join(profile_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+    if mode == "cprofile":
+        import cProfile
+        import io
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(prefix + ".prof")
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(40)
+            with open(prefix + ".txt", "w", encoding="utf-8") as f:
+                f.write(report.getvalue())
+            logging.info("cProfile report written to %s.prof and %s.txt", prefix, prefix)
+    else:
+        sampler = StackSampler(threading.get_ident(), float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.01)))
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(prefix + ".folded")
+            logging.info("Sampling profile (%s samples) written to %s.folded", sampler.samples, prefix)
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval from a background thread.
+    The output uses the folded stack format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                frame = frame.f_back
+            self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# the modules in scripts/ import each other as top level modules, like main.py runs them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from fake_hass import FakeHass  # noqa: E402
+
+
+@pytest.fixture
+def hass():
+    server = FakeHass(token="test-token").start()
+    yield server
+    server.stop()
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from adaptive_schedule import AdaptiveScheduler, PublicationHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    return PublicationHistory(str(tmp_path / "publication_history.json"))
+
+
+def _scheduler(history):
+    return AdaptiveScheduler(
+        history, "07:00", earliest="06:00", latest="22:00", margin_minutes=10, retry_minutes=60,
+        max_interval_hours=24, min_samples=3, quantile=0.8,
+    )
+
+
+def test_up_to_date_users_skip_the_rest_of_the_day(history):
+    now = datetime(2024, 6, 30, 9, 0)
+    history.observe("3100000001", "2024-06-29", now.timestamp())
+    assert _scheduler(history).plan(now) == datetime(2024, 7, 1, 7, 0)
+
+
+def test_no_observations_are_not_taken_as_up_to_date(history):
+    # e.g. the first run after installing failed before reading any user
+    now = datetime(2024, 6, 30, 9, 0)
+    assert _scheduler(history).plan(now) == now + timedelta(minutes=60)
+
+
+def test_failed_run_is_retried_even_when_the_data_looked_current(history):
+    now = datetime(2024, 6, 30, 9, 0)
+    history.observe("3100000001", "2024-06-29", now.timestamp())
+    assert _scheduler(history).plan(now, failed=True) == now + timedelta(minutes=60)
+
+
+def test_failed_run_before_the_usual_time_is_retried(history):
+    now = datetime(2024, 6, 30, 6, 30)
+    assert _scheduler(history).plan(now, failed=True) == now + timedelta(minutes=60)
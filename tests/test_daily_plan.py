@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from daily_plan import plan_daily_fetch
+from storage import UNAVAILABLE_RECHECK_DAYS, UserStore
+
+USER_ID = "3100000001"
+LATEST = "2024-06-30"
+
+
+def _day(offset):
+    """The day `offset` days before LATEST."""
+    return (datetime.strptime(LATEST, "%Y-%m-%d") - timedelta(days=offset)).strftime("%Y-%m-%d")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(str(tmp_path / "homeassistant.db"))
+    yield store
+    store.close()
+
+
+def _prepare(store, stored, unavailable=(), marked_days_ago=0):
+    store.save_user(USER_ID, [(_day(offset), 1.0) for offset in stored], [], {})
+    store.mark_unavailable(USER_ID, [_day(offset) for offset in unavailable])
+    marked_at = (datetime.now() - timedelta(days=marked_days_ago)).isoformat(timespec="seconds")
+    store._db.execute("UPDATE unavailable_days SET marked_at = ?", (marked_at,))
+
+
+# stored / unavailable: days before LATEST; LATEST itself is never needed from the table
+CASES = [
+    # name, stored, unavailable, marked days ago, max view, view, missing, lost
+    ("up to date", range(1, 30), (), 0, 30, None, [], 0),
+    ("only the latest day is new", range(1, 40), (), 0, 30, None, [], 0),
+    ("yesterday missing", range(2, 30), (), 0, 30, 7, [1], 0),
+    ("hole inside 7 days", [1, 2, 4, 5, 6] + list(range(7, 30)), (), 0, 30, 7, [3], 0),
+    ("hole older than 7 days", [d for d in range(1, 30) if d != 12], (), 0, 30, 30, [12], 0),
+    ("last run 3 days ago", range(3, 30), (), 0, 30, 7, [2, 1], 0),
+    ("stored history ends before the 30 day view", [35, 36], (), 0, 30, 30, list(range(29, 0, -1)), 5),
+    ("7 day view only, older hole unreachable", [9, 10], (), 0, 7, 7, list(range(6, 0, -1)), 2),
+    ("recently unavailable day is skipped", range(2, 30), [1], 0, 30, None, [], 0),
+    ("expired unavailable mark is fetched again", range(2, 30), [1], UNAVAILABLE_RECHECK_DAYS + 1, 30, 7, [1], 0),
+    ("unavailable mark does not hide other holes", [d for d in range(1, 30) if d not in (5, 20)], [5], 0, 30, 30, [20], 0),
+]
+
+
+@pytest.mark.parametrize(
+    "stored, unavailable, marked_days_ago, max_view, view, missing, lost",
+    [case[1:] for case in CASES],
+    ids=[case[0] for case in CASES],
+)
+def test_plan(store, stored, unavailable, marked_days_ago, max_view, view, missing, lost):
+    _prepare(store, stored, unavailable, marked_days_ago)
+    plan = plan_daily_fetch(store, USER_ID, LATEST, max_view)
+    assert plan.view == view
+    assert plan.missing == [_day(offset) for offset in missing]
+    assert len(plan.lost) == lost
+    assert plan.latest == LATEST
+
+
+def test_empty_store_takes_the_largest_view(store):
+    plan = plan_daily_fetch(store, USER_ID, LATEST, 30)
+    assert plan.view == 30
+    assert plan.missing == [_day(offset) for offset in range(29, -1, -1)]
+    assert plan.lost == []
+
+
+def test_unknown_latest_day_reads_the_largest_allowed_view(store):
+    _prepare(store, range(1, 30))
+    assert plan_daily_fetch(store, USER_ID, None, 30).view == 30
+    assert plan_daily_fetch(store, USER_ID, None, 7).view == 7
+
+
+def test_lost_days_run_from_the_stored_latest_day_to_the_view(store):
+    _prepare(store, [40])
+    plan = plan_daily_fetch(store, USER_ID, LATEST, 30)
+    assert plan.lost == [_day(offset) for offset in range(39, 29, -1)]
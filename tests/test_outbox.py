@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from outbox import Outbox
+
+
+@pytest.fixture
+def outbox(tmp_path, hass):
+    box = Outbox(str(tmp_path / "outbox.db"), hass.url.rstrip("/"), "test-token", concurrency=2,
+                 backoff_base=0.05, backoff_max=1.0, max_age_seconds=3600)
+    yield box
+    box.close()
+
+
+def _row(outbox, entity_id):
+    with outbox._db_lock:
+        return outbox._db.execute(
+            "SELECT body, version, enqueued_at, attempts, next_attempt_at FROM outbox WHERE entity_id = ?", (entity_id,)
+        ).fetchone()
+
+
+def _set_enqueued_at(outbox, entity_id, enqueued_at):
+    with outbox._db_lock:
+        outbox._db.execute("UPDATE outbox SET enqueued_at = ? WHERE entity_id = ?", (enqueued_at, entity_id))
+
+
+def test_newer_value_coalesces_and_restarts_the_age(outbox, hass):
+    hass.available = False
+    outbox.put("sensor.balance", {"state": 10.0})
+    first = _row(outbox, "sensor.balance")
+    time.sleep(0.01)
+    outbox.put("sensor.balance", {"state": 9.5})
+    second = _row(outbox, "sensor.balance")
+
+    assert outbox.depth() == 1
+    assert second[1] == first[1] + 1
+    assert second[2] > first[2]
+
+    hass.available = True
+    assert outbox.replay() == (1, 0)
+    assert hass.states["sensor.balance"]["state"] == 9.5
+    assert hass.requests == 1
+
+
+def test_failed_delivery_backs_off_until_ha_returns(outbox, hass):
+    hass.available = False
+    outbox.put("sensor.balance", {"state": 10.0})
+    outbox.put("sensor.usage", {"state": 3.2})
+
+    assert outbox.replay() == (0, 2)
+    attempts, next_attempt_at = _row(outbox, "sensor.balance")[3:]
+    assert attempts == 1
+    assert next_attempt_at > time.time()
+    # not due yet: nothing is sent
+    assert outbox.replay() == (0, 0)
+
+    time.sleep(0.06)
+    assert outbox.replay() == (0, 2)
+    attempts, next_attempt_at = _row(outbox, "sensor.balance")[3:]
+    assert attempts == 2
+    assert next_attempt_at - time.time() > 0.05  # backoff doubled
+
+    hass.available = True
+    time.sleep(0.11)
+    assert outbox.replay() == (2, 0)
+    assert outbox.depth() == 0
+    assert set(hass.states) == {"sensor.balance", "sensor.usage"}
+
+
+def test_delivery_keeps_a_newer_value_queued_meanwhile(outbox, hass):
+    outbox.put("sensor.balance", {"state": 10.0})
+    stale = outbox._due_rows()[0]
+    outbox.put("sensor.balance", {"state": 9.5})
+
+    outbox._get_executor()
+    assert outbox._deliver(stale)
+    assert hass.states["sensor.balance"]["state"] == 10.0
+    assert outbox.depth() == 1
+    assert _row(outbox, "sensor.balance")[1] == stale[3] + 1
+
+    assert outbox.replay() == (1, 0)
+    assert hass.states["sensor.balance"]["state"] == 9.5
+    assert outbox.depth() == 0
+
+
+def test_updates_older_than_max_age_expire(outbox, hass):
+    outbox.put("sensor.old", {"state": 1})
+    outbox.put("sensor.requeued", {"state": 2})
+    outbox.put("sensor.fresh", {"state": 3})
+    long_ago = time.time() - 2 * outbox.max_age_seconds
+    _set_enqueued_at(outbox, "sensor.old", long_ago)
+    _set_enqueued_at(outbox, "sensor.requeued", long_ago)
+    # a newer value of an entity first queued long ago is fresh again
+    outbox.put("sensor.requeued", {"state": 4})
+
+    assert outbox.replay() == (2, 0)
+    assert outbox.depth() == 0
+    assert "sensor.old" not in hass.states
+    assert hass.states["sensor.requeued"]["state"] == 4
+    assert hass.states["sensor.fresh"]["state"] == 3
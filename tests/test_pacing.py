@@ -0,0 +1,133 @@
+import random
+
+import pytest
+
+import settings as config
+from pacing import KINDS, Pacer, TokenBucket, parse_delays, profile_delays
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.mark.parametrize("items, expected", [
+    ((), {}),
+    (("click=0.8-1.6",), {"click": (0.8, 1.6)}),
+    (("user=12",), {"user": (12.0, 12.0)}),
+    ((" Page = 1-2 ", "type=0"), {"page": (1.0, 2.0), "type": (0.0, 0.0)}),
+])
+def test_parse_delays(items, expected):
+    assert parse_delays(items) == expected
+
+
+@pytest.mark.parametrize("items, error", [
+    (("scroll=1-2",), "unknown pacing kind 'scroll'"),
+    (("click",), "pacing delay of click must be seconds or low-high"),
+    (("click=fast",), "pacing delay of click must be seconds or low-high"),
+    (("click=2-1",), "must satisfy 0 <= low <= high"),
+    (("click=-1",), "pacing delay of click must be seconds or low-high"),
+])
+def test_parse_delays_rejects_bad_entries(items, error):
+    with pytest.raises(ValueError, match=error):
+        parse_delays(items)
+
+
+def test_bad_delays_fail_when_the_settings_are_loaded():
+    with pytest.raises(config.SettingsError, match="PACING_DELAYS: unknown pacing kind"):
+        config.Settings({"PACING_DELAYS": "click=1-2,scroll=3"}, "test")
+    settings = config.Settings({"PACING_DELAYS": "click=1-2", "PACING_PROFILE": "fast"}, "test")
+    pacer = Pacer.from_settings(settings)
+    assert pacer.delays["click"] == (1.0, 2.0)
+    assert pacer.delays["page"] == profile_delays("fast", settings.RETRY_WAIT_TIME_OFFSET_UNIT)["page"]
+
+
+def test_profiles_cover_every_kind_and_scale():
+    for profile in ("normal", "cautious", "fast", "off"):
+        assert set(profile_delays(profile, 3)) == set(KINDS)
+    normal, cautious = profile_delays("normal", 3), profile_delays("cautious", 3)
+    assert cautious["page"] == (2 * normal["page"][0], 2 * normal["page"][1])
+    assert profile_delays("normal", 6)["user"] == (2 * normal["user"][0], 2 * normal["user"][1])
+    assert all(high == 0 for _, high in profile_delays("off", 3).values())
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(60, 2, now=0.0)
+    for _ in range(2):
+        assert bucket.delay(0.0) == 0.0
+        bucket.take(0.0)
+    assert bucket.delay(0.0) == pytest.approx(1.0)
+    assert bucket.delay(0.5) == pytest.approx(0.5)
+    assert bucket.delay(1.0) == pytest.approx(0.0)
+    # refilling stops at the burst size
+    assert bucket.delay(100.0) == 0.0
+    bucket.take(100.0)
+    bucket.take(100.0)
+    assert bucket.delay(100.0) == pytest.approx(1.0)
+
+
+def _pacer(delays, clock, **kwargs):
+    return Pacer(delays, rng=random.Random(1), clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_think_time_stays_within_the_delays():
+    pacer = Pacer({"click": (0.7, 1.5)}, rng=random.Random(1))
+    samples = [pacer.think_time("click") for _ in range(500)]
+    assert min(samples) >= 0.7 and max(samples) <= 1.5
+    assert pacer.think_time("user") == 0.0
+
+
+def test_side_work_after_a_mark_counts_towards_the_think_time():
+    clock = FakeClock()
+    pacer = _pacer({"user": (10.0, 10.0)}, clock)
+    pacer.mark()
+    clock.now += 4.0  # database writes and HA pushes of the previous user
+    assert pacer.pace("user") == pytest.approx(6.0)
+    assert pacer.overlapped == pytest.approx(4.0)
+
+    clock.now += 12.0
+    assert pacer.pace("user") == 0.0
+    assert pacer.slept == pytest.approx(6.0)
+    assert pacer.actions == 2
+
+
+def test_mark_restarts_the_think_time_after_browser_work():
+    clock = FakeClock()
+    pacer = _pacer({"page": (5.0, 5.0)}, clock)
+    pacer.mark()
+    clock.now += 8.0  # page load and waits
+    pacer.mark()
+    assert pacer.pace("page") == pytest.approx(5.0)
+    assert pacer.overlapped == 0.0
+
+
+def test_first_action_waits_its_whole_think_time():
+    clock = FakeClock()
+    pacer = _pacer({"click": (1.0, 1.0)}, clock)
+    assert pacer.pace("click") == pytest.approx(1.0)
+
+
+def test_rate_limit_applies_when_think_times_are_short():
+    clock = FakeClock()
+    pacer = _pacer({"click": (0.0, 0.0)}, clock, actions_per_minute=60, burst=2)
+    waits = [pacer.pace("click") for _ in range(4)]
+    assert waits == [0.0, 0.0, pytest.approx(1.0), pytest.approx(1.0)]
+
+
+def test_off_profile_never_sleeps():
+    settings = config.Settings({"PACING_PROFILE": "off"}, "test")
+    clock = FakeClock()
+    pacer = Pacer.from_settings(settings)
+    pacer._clock, pacer._sleep = clock, clock.sleep
+    for kind in KINDS:
+        assert pacer.pace(kind) == 0.0
+    assert clock.slept == []
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+from probe_cache import ProbeCache
+
+USER_ID = "3100000001"
+# balance, last_daily_date, last_daily_usage, yearly_charge, yearly_usage, month_charge, month_usage
+FULL_FETCH = (58.3, "2024-06-29", 7.2, 1830.5, 3012.0, 120.6, 210.0)
+
+
+@pytest.fixture
+def probe(tmp_path):
+    probe = ProbeCache(str(tmp_path / "probe_cache.json"), 24 * 3600)
+    probe.remember(USER_ID, FULL_FETCH)
+    return probe
+
+
+def test_unchanged_probe_returns_the_last_full_fetch(probe):
+    values = probe.unchanged(USER_ID, 58.3, "2024-06-29", 7.2)
+    assert values is not None
+    assert (values["yearly_charge"], values["yearly_usage"], values["month_charge"], values["month_usage"]) == FULL_FETCH[3:]
+
+
+@pytest.mark.parametrize("balance, last_daily_date, last_daily_usage", [
+    (57.1, "2024-06-29", 7.2),  # balance changed, e.g. after a payment
+    (58.3, "2024-06-30", 7.2),  # a new day was published
+    (58.3, "2024-06-29", 7.5),  # the latest day was corrected
+    (None, "2024-06-29", 7.2),  # balance could not be read
+    (58.3, "2024-06-29", None),  # latest day could not be read
+])
+def test_changed_or_unknown_probe_needs_a_full_fetch(probe, balance, last_daily_date, last_daily_usage):
+    assert probe.unchanged(USER_ID, balance, last_daily_date, last_daily_usage) is None
+
+
+def test_unknown_user_needs_a_full_fetch(probe):
+    assert probe.unchanged("3100000002", 58.3, "2024-06-29", 7.2) is None
+
+
+def test_full_refresh_is_due_after_the_interval(probe):
+    probe._entries[USER_ID]["fetched_at"] = time.time() - 24 * 3600
+    assert probe.unchanged(USER_ID, 58.3, "2024-06-29", 7.2) is None
+
+
+def test_zero_interval_disables_the_probe(tmp_path):
+    probe = ProbeCache(str(tmp_path / "probe_cache.json"), 0)
+    probe.remember(USER_ID, FULL_FETCH)
+    assert probe.unchanged(USER_ID, 58.3, "2024-06-29", 7.2) is None
+
+
+def test_incomplete_fetch_is_not_remembered(tmp_path):
+    probe = ProbeCache(str(tmp_path / "probe_cache.json"), 24 * 3600)
+    probe.remember(USER_ID, (None,) + FULL_FETCH[1:])
+    probe.remember(USER_ID, FULL_FETCH[:2] + (None,) + FULL_FETCH[3:])
+    assert probe.unchanged(USER_ID, 58.3, "2024-06-29", 7.2) is None
+
+
+def test_remembered_values_survive_a_restart(tmp_path, probe):
+    probe.save()
+    reopened = ProbeCache(probe.path, 24 * 3600)
+    assert reopened.unchanged(USER_ID, 58.3, "2024-06-29", 7.2) == probe.unchanged(USER_ID, 58.3, "2024-06-29", 7.2)
+
+
+class _Stub:
+    """Records the calls of the page readers the probe is meant to skip."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append(name)
+        return call
+
+
+def _fetcher(monkeypatch, probe):
+    data_fetcher = pytest.importorskip("data_fetcher")
+    from pacing import Pacer
+
+    class _Wait:
+        def __init__(self, *args):
+            pass
+
+        def until(self, condition):
+            return True
+
+    monkeypatch.setattr(data_fetcher, "WebDriverWait", _Wait)
+    monkeypatch.setattr(data_fetcher.time, "sleep", lambda seconds: None)
+    fetcher = data_fetcher.DataFetcher.__new__(data_fetcher.DataFetcher)
+    fetcher.DRIVER_IMPLICITY_WAIT_TIME = 1
+    fetcher.POLL_FREQUENCY = 0.1
+    fetcher.enable_database_storage = True
+    fetcher._recorder = None
+    fetcher._store = None
+    fetcher._statistics = _Stub()
+    fetcher._probe = probe
+    fetcher._page_loads_saved = 0
+    fetcher._pacer = Pacer({})
+    fetcher._choose_current_userid = lambda driver, index: None
+    fetcher._get_electric_balance = lambda driver: 58.3
+    fetcher._get_yesterday_usage = lambda driver: ("2024-06-29", 7.2)
+    skipped = _Stub()
+    fetcher._get_yearly_data = lambda driver: skipped.calls.append("yearly") or (3100.0, 1900.0)
+    fetcher._get_month_usage = lambda driver: skipped.calls.append("monthly") or (["2024-06"], [220.0], [125.0])
+    fetcher._get_daily_usage_data = lambda driver: skipped.calls.append("daily") or (["2024-06-29"], [7.2])
+    fetcher._save_user_data = lambda *args: skipped.calls.append("save")
+    return fetcher, skipped
+
+
+def test_fetch_skips_the_usage_sections_when_the_probe_hits(monkeypatch, probe):
+    fetcher, skipped = _fetcher(monkeypatch, probe)
+    result = fetcher._get_all_data(_Stub(), USER_ID, 0)
+    assert result == FULL_FETCH
+    # no tabs, no daily table, no database write and no statistics import
+    assert skipped.calls == []
+    assert fetcher._statistics.calls == []
+    assert fetcher._page_loads_saved == 3
+
+
+def test_fetch_reads_everything_when_the_probe_misses(monkeypatch, probe):
+    fetcher, skipped = _fetcher(monkeypatch, probe)
+    fetcher._get_electric_balance = lambda driver: 40.0
+    result = fetcher._get_all_data(_Stub(), USER_ID, 0)
+    assert result == (40.0, "2024-06-29", 7.2, 1900.0, 3100.0, 125.0, 220.0)
+    assert skipped.calls == ["yearly", "monthly", "daily", "save"]
+    assert fetcher._statistics.calls == ["publish"]
+    assert fetcher._page_loads_saved == 0
+    # the new full fetch is what the next probe compares with
+    assert probe.unchanged(USER_ID, 40.0, "2024-06-29", 7.2) is not None
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from fake_mqtt import FakeBroker
+from mqtt_client import MqttClient
+from publishers import MqttPublisher, Publisher
+from state_cache import StateCache
+
+
+def _balance(state):
+    return {
+        "state": state,
+        "unique_id": "sensor.electricity_charge_balance_0000",
+        "attributes": {"unit_of_measurement": "CNY", "icon": "mdi:cash", "device_class": "monetary", "present_date": "2024-05-20"},
+    }
+
+
+def _usage(state):
+    return {
+        "state": state,
+        "unique_id": "sensor.last_electricity_usage_0000",
+        "attributes": {"last_reset": "2024-05-20", "unit_of_measurement": "kWh", "state_class": "measurement"},
+    }
+
+
+def _run(host, port, cache, bodies):
+    """One fetch run: a fresh publisher, send what changed, close; returns the publisher."""
+    publisher = MqttPublisher(MqttClient(host, port, timeout=2), on_delivered=cache.mark_sent, discovery_cache=cache)
+    for entity_id, body in bodies.items():
+        fingerprint = StateCache.fingerprint(body)
+        if cache.should_send(entity_id, fingerprint):
+            publisher.publish(entity_id, body, fingerprint)
+    publisher.close()
+    return publisher
+
+
+@pytest.fixture
+def broker():
+    server = FakeBroker().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return StateCache(str(tmp_path / "ha_state_cache.json"), force_refresh_seconds=3600)
+
+
+def _dead_port():
+    server = FakeBroker()
+    port = server.port
+    server._server.server_close()
+    return port
+
+
+def test_publisher_is_abstract():
+    with pytest.raises(TypeError):
+        Publisher()
+
+
+def test_discovery_config_and_retained_state(broker, cache):
+    _run(broker.host, broker.port, cache, {
+        "sensor.electricity_charge_balance_0000": _balance(58.3),
+        "sensor.last_electricity_usage_0000": _usage(7.2),
+    })
+
+    assert broker.connections == 1
+    config = json.loads(broker.retained["homeassistant/sensor/electricity_charge_balance_0000/config"])
+    assert config["state_topic"] == "sgcc_electricity/electricity_charge_balance_0000/state"
+    assert config["unit_of_measurement"] == "CNY"
+    assert config["device"]["identifiers"] == ["sgcc_electricity_0000"]
+    assert broker.retained[config["state_topic"]] == b"58.3"
+    attributes = json.loads(broker.retained[config["json_attributes_topic"]])
+    assert attributes == {"present_date": "2024-05-20"}
+    assert broker.retained["sgcc_electricity/last_electricity_usage_0000/state"] == b"7.2"
+
+
+def test_discovery_is_announced_once(broker, cache):
+    _run(broker.host, broker.port, cache, {"sensor.electricity_charge_balance_0000": _balance(58.3)})
+    before = broker.messages
+
+    _run(broker.host, broker.port, cache, {"sensor.electricity_charge_balance_0000": _balance(58.3)})
+    assert broker.messages == before  # unchanged: nothing sent
+
+    _run(broker.host, broker.port, cache, {"sensor.electricity_charge_balance_0000": _balance(12.5)})
+    assert broker.messages - before == 2  # state and attributes, no new config
+    assert broker.retained["sgcc_electricity/electricity_charge_balance_0000/state"] == b"12.5"
+
+
+def test_unavailable_broker_is_tried_once_and_updates_are_resent_after_reconnect(broker, cache, monkeypatch):
+    attempts = []
+    connect = MqttClient.connect
+
+    def counting_connect(client):
+        attempts.append((client.host, client.port))
+        return connect(client)
+
+    monkeypatch.setattr(MqttClient, "connect", counting_connect)
+    bodies = {
+        "sensor.electricity_charge_balance_0000": _balance(58.3),
+        "sensor.last_electricity_usage_0000": _usage(7.2),
+    }
+
+    publisher = _run("127.0.0.1", _dead_port(), cache, bodies)
+    assert len(attempts) == 1
+    assert publisher._unavailable
+    assert all(cache.should_send(entity_id, StateCache.fingerprint(body), count=False) for entity_id, body in bodies.items())
+
+    _run(broker.host, broker.port, cache, bodies)
+    assert len(attempts) == 2
+    assert broker.retained["sgcc_electricity/electricity_charge_balance_0000/state"] == b"58.3"
+    assert broker.retained["sgcc_electricity/last_electricity_usage_0000/state"] == b"7.2"
+    assert not any(cache.should_send(entity_id, StateCache.fingerprint(body), count=False) for entity_id, body in bodies.items())
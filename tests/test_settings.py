@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+
+import pytest
+
+import settings as config
+from settings import Field, Settings, SettingsError
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """A clean environment without .env or add-on options; returns the options.json path."""
+    for field in config.FIELDS:
+        monkeypatch.delenv(field.name, raising=False)
+    # 在容器中不读取 .env
+    monkeypatch.setenv("PYTHON_IN_DOCKER", "1")
+    options_path = str(tmp_path / "options.json")
+    monkeypatch.setattr(config, "OPTIONS_PATH", options_path)
+    monkeypatch.setattr(config, "_current", None)
+    monkeypatch.setattr(config, "_subscribers", [])
+    return options_path
+
+
+def _write_options(path, options):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(options, f)
+
+
+@pytest.mark.parametrize("field, raw, expected", [
+    (Field("N", "int", 5, minimum=1, maximum=20), "7", 7),
+    (Field("N", "int", 5, minimum=1, maximum=20), " ", 5),
+    (Field("N", "int", 5, minimum=1, maximum=20), None, 5),
+    (Field("F", "float", 24, minimum=0), "0.5", 0.5),
+    (Field("B", "bool", False), "Yes", True),
+    (Field("B", "bool", True), "0", False),
+    (Field("B", "bool", False), True, True),
+    (Field("T", "time", "07:00"), "18:30", "18:30"),
+    (Field("L", "list", ()), " 1, ,2 ", ("1", "2")),
+    (Field("L", "list", ()), ["1", " 2"], ("1", "2")),
+    (Field("C", "str", "text", choices=("text", "json")), "JSON", "json"),
+    (Field("S", "str", "default"), "", ""),
+])
+def test_field_parses_and_normalizes(field, raw, expected):
+    assert field.parse(raw) == expected
+
+
+@pytest.mark.parametrize("field, raw, error", [
+    (Field("N", "int", 5, minimum=1, maximum=20), "abc", "N must be a number"),
+    (Field("N", "int", 5, minimum=1, maximum=20), "0", "N must be at least 1"),
+    (Field("N", "int", 5, minimum=1, maximum=20), "21", "N must be at most 20"),
+    (Field("N", "int", 5), "1.5", "N must be a number"),
+    (Field("B", "bool", False), "maybe", "B must be true or false"),
+    (Field("T", "time", "07:00"), "7 am", "T must be HH:MM"),
+    (Field("C", "str", "text", choices=("text", "json")), "xml", "C must be one of text|json"),
+])
+def test_field_rejects_invalid_values(field, raw, error):
+    with pytest.raises(SettingsError, match=error):
+        field.parse(raw)
+
+
+def test_all_invalid_values_are_reported_together(env):
+    with pytest.raises(SettingsError) as raised:
+        Settings({"RETRY_TIMES_LIMIT": "50", "MQTT_PORT": "http", "PACING_DELAYS": "click=2-1"}, "test")
+    message = str(raised.value)
+    assert message.startswith("Invalid settings in test: ")
+    for name in ("RETRY_TIMES_LIMIT", "MQTT_PORT", "PACING_DELAYS"):
+        assert name in message
+
+
+def test_settings_are_read_only(env):
+    settings = Settings({}, "test")
+    with pytest.raises(AttributeError):
+        settings.RETRY_TIMES_LIMIT = 1
+
+
+def test_environment_is_used_without_addon_options(env, monkeypatch):
+    monkeypatch.setenv("RETRY_TIMES_LIMIT", "3")
+    settings = Settings.load()
+    assert settings.source == "environment"
+    assert settings.RETRY_TIMES_LIMIT == 3
+
+
+def test_addon_options_override_the_environment(env, monkeypatch):
+    monkeypatch.setenv("RETRY_TIMES_LIMIT", "3")
+    monkeypatch.setenv("HASS_URL", "http://from-env:8123/")
+    _write_options(env, {"RETRY_TIMES_LIMIT": 8, "ENABLE_DATABASE_STORAGE": True, "IGNORE_USER_ID": "1,2"})
+    settings = Settings.load()
+    assert settings.source == env
+    assert settings.RETRY_TIMES_LIMIT == 8
+    assert settings.ENABLE_DATABASE_STORAGE is True
+    assert settings.IGNORE_USER_ID == ("1", "2")
+    # keys the add-on does not set still come from the environment
+    assert settings.hass_base_url == "http://from-env:8123"
+
+
+def test_secrets_and_describe_mask_the_secret_fields(env):
+    settings = Settings({"PASSWORD": "hunter22", "PUSHPLUS_TOKEN": "tok1,tok2", "PHONE_NUMBER": "13800000000"}, "test")
+    assert set(settings.secrets) == {"hunter22", "tok1", "tok2"}
+    described = settings.describe()
+    assert described["PASSWORD"] == "******"
+    assert described["PHONE_NUMBER"] == "13800000000"
+
+
+def test_reload_reports_changes_and_notifies_subscribers(env, caplog):
+    _write_options(env, {"RETRY_TIMES_LIMIT": 5, "HASS_OUTBOX_FILE": "a.db"})
+    first = config.current()
+    calls = []
+    config.subscribe(lambda old, new: calls.append((old, new)))
+
+    _write_options(env, {"RETRY_TIMES_LIMIT": 6, "HASS_OUTBOX_FILE": "b.db"})
+    with caplog.at_level(logging.INFO):
+        changed = config.reload()
+
+    assert sorted(changed) == ["HASS_OUTBOX_FILE", "RETRY_TIMES_LIMIT"]
+    assert calls == [(first, config.current())]
+    assert config.current().RETRY_TIMES_LIMIT == 6
+    assert "Changes of HASS_OUTBOX_FILE take effect after a restart." in caplog.text
+
+
+def test_reload_without_changes_notifies_nobody(env):
+    _write_options(env, {"RETRY_TIMES_LIMIT": 5})
+    config.current()
+    calls = []
+    config.subscribe(lambda old, new: calls.append(new))
+    assert config.reload() == []
+    assert calls == []
+
+
+def test_failing_subscriber_does_not_stop_the_others(env):
+    _write_options(env, {"RETRY_TIMES_LIMIT": 5})
+    config.current()
+    calls = []
+
+    def broken(old, new):
+        raise RuntimeError("boom")
+
+    config.subscribe(broken)
+    config.subscribe(lambda old, new: calls.append(new.RETRY_TIMES_LIMIT))
+    _write_options(env, {"RETRY_TIMES_LIMIT": 7})
+    config.reload()
+    assert calls == [7]
+
+
+def test_watcher_reloads_a_changed_file_and_keeps_valid_settings(env):
+    _write_options(env, {"RETRY_TIMES_LIMIT": 5})
+    config.current()
+    watcher = config.SettingsWatcher()
+    assert watcher.poll() is False
+
+    _write_options(env, {"RETRY_TIMES_LIMIT": 9})
+    os.utime(env, ns=(0, os.stat(env).st_mtime_ns + 1_000_000))
+    assert watcher.poll() is True
+    assert config.current().RETRY_TIMES_LIMIT == 9
+
+    # an invalid file is reported and the running settings stay
+    _write_options(env, {"RETRY_TIMES_LIMIT": 99, "PACING_DELAYS": "click=fast"})
+    os.utime(env, ns=(0, os.stat(env).st_mtime_ns + 2_000_000))
+    assert watcher.poll() is False
+    assert config.current().RETRY_TIMES_LIMIT == 9
+
+
+def test_watcher_reloads_on_request(env):
+    _write_options(env, {"RETRY_TIMES_LIMIT": 5})
+    config.current()
+    watcher = config.SettingsWatcher()
+    watcher._requested.set()
+    assert watcher.poll() is True
@@ -0,0 +1,152 @@
+import sqlite3
+
+import pytest
+
+from storage import MIGRATIONS, UserStore
+
+
+def _legacy_database(path):
+    """A database as written before the shared tables: daily{user_id} and data{user_id} per user, text values."""
+    db = sqlite3.connect(path)
+    for user_id, days in (("3100000001", 40), ("3100000002", 3)):
+        db.execute(f"CREATE TABLE daily{user_id} (date DATE PRIMARY KEY NOT NULL, usage REAL NOT NULL)")
+        db.execute(f"CREATE TABLE data{user_id} (name TEXT PRIMARY KEY NOT NULL, value TEXT NOT NULL)")
+        db.executemany(
+            f"INSERT INTO daily{user_id} VALUES (?, ?)",
+            [(f"2024-01-{day:02d}" if day <= 31 else f"2024-02-{day - 31:02d}", 5.0 + day / 10) for day in range(1, days + 1)],
+        )
+        db.executemany(
+            f"INSERT INTO data{user_id} VALUES (?, ?)",
+            [
+                ("user", user_id),
+                ("balance", " 58.3 "),
+                ("daily_date", " 2024-02-09 "),
+                ("daily_usage", "8.1"),
+                ("yearly_usage", "None"),
+                ("yearly_charge", "1830.5"),
+                ("2024-01usage", " 250.0"),
+                ("2024-01charge", "130.5 "),
+                ("2024-02usage", "120.0"),
+            ],
+        )
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def migrated(tmp_path):
+    path = str(tmp_path / "homeassistant.db")
+    _legacy_database(path)
+    store = UserStore(path)
+    yield store
+    store.close()
+
+
+def test_migration_moves_legacy_tables_into_shared_tables(migrated):
+    db = migrated._db
+    assert db.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not {name for name in tables if name.startswith(("daily3", "data3"))}
+
+    counts = dict(db.execute("SELECT user_id, COUNT(*) FROM readings GROUP BY user_id"))
+    assert counts == {"3100000001": 40, "3100000002": 3}
+    assert db.execute("SELECT COUNT(*) FROM monthly").fetchone()[0] == 4
+
+
+def test_migration_strips_and_converts_legacy_values(migrated):
+    account = migrated._db.execute(
+        """SELECT balance_cny, last_daily_date, last_daily_usage_kwh, yearly_usage_kwh, yearly_charge_cny
+        FROM accounts WHERE user_id = '3100000001'"""
+    ).fetchone()
+    assert account == (58.3, "2024-02-09", 8.1, None, 1830.5)
+    months = migrated._db.execute(
+        "SELECT month, usage_kwh, charge_cny FROM monthly WHERE user_id = '3100000001' ORDER BY month"
+    ).fetchall()
+    assert months == [("2024-01", 250.0, 130.5), ("2024-02", 120.0, None)]
+
+
+def test_migration_backfills_the_rollups(migrated):
+    db = migrated._db
+    monthly = db.execute(
+        "SELECT month, usage_kwh, days FROM rollup_monthly WHERE user_id = '3100000001' ORDER BY month"
+    ).fetchall()
+    january = round(sum(5.0 + day / 10 for day in range(1, 32)), 3)
+    february = round(sum(5.0 + day / 10 for day in range(32, 41)), 3)
+    assert monthly == [("2024-01", january, 31), ("2024-02", february, 9)]
+    assert db.execute(
+        "SELECT usage_kwh, days FROM rollup_yearly WHERE user_id = '3100000001' AND year = '2024'"
+    ).fetchone() == (round(january + february, 3), 40)
+
+
+def test_migration_runs_only_once(tmp_path):
+    path = str(tmp_path / "homeassistant.db")
+    _legacy_database(path)
+    UserStore(path).close()
+    store = UserStore(path)
+    try:
+        assert store._db.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 43
+    finally:
+        store.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(str(tmp_path / "homeassistant.db"))
+    yield store
+    store.close()
+
+
+def _rollups(store, user_id):
+    monthly = store._db.execute(
+        "SELECT month, usage_kwh, days FROM rollup_monthly WHERE user_id = ? ORDER BY month", (user_id,)
+    ).fetchall()
+    yearly = store._db.execute(
+        "SELECT year, usage_kwh, days FROM rollup_yearly WHERE user_id = ? ORDER BY year", (user_id,)
+    ).fetchall()
+    return monthly, yearly
+
+
+def _recomputed(store, user_id):
+    """The rollups as the v2 migration computes them from all readings."""
+    monthly = store._db.execute(
+        """SELECT substr(date, 1, 7), round(SUM(usage_kwh), 3), COUNT(*) FROM readings
+        WHERE user_id = ? GROUP BY 1 ORDER BY 1""", (user_id,)
+    ).fetchall()
+    yearly = store._db.execute(
+        """SELECT substr(date, 1, 4), round(SUM(usage_kwh), 3), COUNT(*) FROM readings
+        WHERE user_id = ? GROUP BY 1 ORDER BY 1""", (user_id,)
+    ).fetchall()
+    return monthly, yearly
+
+
+def test_rollups_follow_new_changed_and_repeated_readings(store):
+    user_id = "3100000001"
+    store.save_user(user_id, [("2023-12-31", 4.0), ("2024-01-01", 5.0), ("2024-01-02", 6.0)], [], {})
+    assert _rollups(store, user_id) == (
+        [("2023-12", 4.0, 1), ("2024-01", 11.0, 2)],
+        [("2023", 4.0, 1), ("2024", 11.0, 2)],
+    )
+
+    # the same rows again add nothing, a corrected day adds its difference, a new day is counted
+    store.save_user(user_id, [("2024-01-01", 5.0), ("2024-01-02", 6.5), ("2024-01-03", "7.25 ")], [], {})
+    assert _rollups(store, user_id) == (
+        [("2023-12", 4.0, 1), ("2024-01", 18.75, 3)],
+        [("2023", 4.0, 1), ("2024", 18.75, 3)],
+    )
+    assert _rollups(store, user_id) == _recomputed(store, user_id)
+
+
+def test_unchanged_readings_are_not_rewritten(store):
+    user_id = "3100000001"
+    rows = [(f"2024-03-{day:02d}", 1.0 + day) for day in range(1, 8)]
+    store.save_user(user_id, rows, [], {})
+    assert store._changed_readings(user_id, [(user_id, day, usage) for day, usage in rows]) == []
+    assert _rollups(store, user_id)[0] == [("2024-03", 35.0, 7)]
+
+
+def test_rollups_are_kept_per_user(store):
+    store.save_user("3100000001", [("2024-05-01", 2.0)], [], {})
+    store.save_user("3100000002", [("2024-05-01", 3.0), ("2024-05-02", 4.0)], [], {})
+    store.save_user("3100000001", [("2024-05-01", 2.5)], [], {})
+    assert _rollups(store, "3100000001")[0] == [("2024-05", 2.5, 1)]
+    assert _rollups(store, "3100000002")[0] == [("2024-05", 7.0, 2)]